@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+"""Simple benchmarks for cssutils using the sheets in ../sheets.
+
+Usage::
+
+    > python benchmark.py [name ...]
+
+where name is one of the benchmarks below, all are run if none is given.
+"""
+import codecs
+import glob
+import os
+import re
+import sys
+import time
+
+import cssutils
+
+SHEETS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      '..', 'sheets')
+
+def sheettext():
+    "Return the text of all sheets in SHEETS as a single string."
+    texts = []
+    for fn in sorted(glob.glob(os.path.join(SHEETS, '*.css'))):
+        texts.append(codecs.open(fn, encoding='utf-8', errors='replace').read())
+    return u'\n'.join(texts)
+
+def timed(func, *args, **kwargs):
+    "Return seconds used to call func(*args, **kwargs)."
+    start = time.time()
+    func(*args, **kwargs)
+    return time.time() - start
+
+def tokenize():
+    """Tokenizing should scale linearly with the size of the input."""
+    text = sheettext()
+    tokenizer = cssutils.tokenize2.Tokenizer()
+    def run(text):
+        for token in tokenizer.tokenize(text, fullsheet=True):
+            pass
+    print 'tokenize'
+    base = None
+    for factor in (1, 2, 4, 8):
+        t = timed(run, text * factor)
+        if base is None:
+            base = t
+        print '  %8d chars: %.3fs (x%.1f)' % (len(text) * factor, t, t / base)
+
+def linecol():
+    """Tokenizing with and without lazy line and col."""
+    text = sheettext() * 4
+    def run(tokenizer):
+        for token in tokenizer.tokenize(text, fullsheet=True):
+            pass
+    print 'linecol'
+    for lazy in (False, True):
+        tokenizer = cssutils.tokenize2.Tokenizer(lazyLineCol=lazy)
+        print '  lazyLineCol=%-5s: %.3fs' % (lazy, timed(run, tokenizer))
+
+def pickle():
+    """Loading a pickled sheet compared to parsing the text again."""
+    import cPickle
+    text = sheettext()
+    cssutils.log.setLevel(100) # 100 > CRITICAL, ignore all messages
+    parser = cssutils.CSSParser()
+    sheet = [None]
+    def parse():
+        sheet[0] = parser.parseString(text)
+    print 'pickle'
+    print '  parse: %.3fs' % timed(parse)
+    data = [None]
+    def dumps():
+        data[0] = cPickle.dumps(sheet[0], cPickle.HIGHEST_PROTOCOL)
+    print '  dumps: %.3fs' % timed(dumps)
+    print '  loads: %.3fs' % timed(cPickle.loads, data[0])
+    print '  %d chars of CSS, %d bytes pickled' % (len(text), len(data[0]))
+
+def sizeof(obj):
+    """Return (objects, bytes) of all objects reachable from obj (but not
+    of classes, modules and functions), each counted once."""
+    import gc
+    import types
+    skip = (type, types.ModuleType, types.FunctionType, types.MethodType,
+            types.BuiltinFunctionType)
+    seen = set()
+    objects = size = 0
+    todo = [obj]
+    while todo:
+        obj = todo.pop()
+        if id(obj) in seen or isinstance(obj, skip):
+            continue
+        seen.add(id(obj))
+        objects += 1
+        size += sys.getsizeof(obj)
+        todo.extend(gc.get_referents(obj))
+    return objects, size
+
+def memory():
+    """Approximate size of all objects of the parsed sheets per rule."""
+    cssutils.log.setLevel(100)
+    sheet = cssutils.CSSParser().parseString(sheettext())
+    rules = 0
+    todo = list(sheet.cssRules)
+    while todo:
+        rule = todo.pop()
+        rules += 1
+        todo.extend(getattr(rule, 'cssRules', ()))
+    objects, size = sizeof(sheet)
+    print 'memory'
+    print '  %d rules, %d objects, %d bytes (%d bytes per rule)' % (
+        rules, objects, size, size / rules)
+
+def interning():
+    """Size of the parsed largest sheets with and without interning of
+    identifiers and other values."""
+    cssutils.log.setLevel(100)
+    print 'interning'
+    names = sorted(glob.glob(os.path.join(SHEETS, '*.css')),
+                   key=os.path.getsize, reverse=True)[:4]
+    for fn in names:
+        text = codecs.open(fn, encoding='utf-8', errors='replace').read()
+        print '  %s (%d chars)' % (os.path.basename(fn), len(text))
+        for internValues in (False, True):
+            parser = cssutils.CSSParser(internValues=internValues)
+            print '    internValues=%-5s: %d objects, %d bytes' % (
+                (internValues,) + sizeof(parser.parseString(text)))
+
+def normalize():
+    """How often the fast paths of normalizing names and of replacing
+    unicode escapes are taken while parsing (the memo of normalized names
+    is used only if values are interned)."""
+    from cssutils import helper
+    text = sheettext()
+    cssutils.log.setLevel(100)
+    print 'normalize'
+    for internValues in (False, True):
+        parser = cssutils.CSSParser(internValues=internValues)
+        helper.resetStats()
+        helper.countStats = True
+        try:
+            t = timed(parser.parseString, text)
+        finally:
+            helper.countStats = False
+        print '  internValues=%-5s: %.3fs' % (internValues, t)
+        for key in sorted(helper.stats):
+            print '    %-18s: %6d' % (key, helper.stats[key])
+
+def validate():
+    """Parsing with and without memoized validation results, validating
+    serialized values by regex or matching the values directly and
+    validating (mostly invalid) values with and without prefilters."""
+    text = sheettext()
+    cssutils.log.setLevel(100)
+    profile = cssutils.profile
+    print 'validate'
+    for cacheSize in (0, 10000):
+        profile.cacheSize = cacheSize
+        profile._cache.clear()
+        profile.hits = profile.misses = 0
+        t = timed(cssutils.CSSParser().parseString, text)
+        print '  cacheSize=%-5d: %.3fs (%d hits, %d misses)' % (
+            cacheSize, t, profile.hits, profile.misses)
+    parser = cssutils.CSSParser(lazyValidation=True)
+    print '  lazyValidation : %.3fs' % timed(parser.parseString, text)
+
+    sheet = parser.parseString(text)
+    properties = [p for rule in sheet.cssRules if hasattr(rule, 'style')
+                    for p in rule.style.getProperties(all=True)
+                    if p.name in profile.knownNames]
+    profile.cacheSize = 0
+    def run(values):
+        for property, value in zip(properties, values):
+            profile.validateWithProfile(property.name, value)
+    print '  %d properties, without memo:' % len(properties)
+    print '    regex on text : %.3fs' % timed(run,
+                                  [p.value for p in properties])
+    print '    incl. serialization : %.3fs' % timed(lambda: run(
+                                  [p.value for p in properties]))
+    print '    match values  : %.3fs' % timed(run,
+                                  [p.propertyValue for p in properties])
+
+    values = sorted(set([p.value for p in properties]), key=len)[-300:]
+    validators = [validator for name in sorted(profile._index)
+                            for p, validator in profile._index[name]]
+    def check(validate):
+        for validator in validators:
+            for value in values:
+                validate(validator, value)
+    print '  %d values for all %d validators:' % (len(values),
+                                                   len(validators))
+    print '    regex only    : %.3fs' % timed(check,
+                                  lambda validator, value: validator.match(value))
+    print '    prefiltered   : %.3fs' % timed(check,
+                                  lambda validator, value: validator(value))
+
+def allocations():
+    """Number of production objects (Prod, Sequence and Choice) created
+    while parsing."""
+    from cssutils import prodparser
+    classes = (prodparser.Prod, prodparser.Sequence, prodparser.Choice,
+               cssutils.css.PropertyValue, cssutils.css.Value)
+    counts = dict.fromkeys(classes, 0)
+    inits = dict([(cls, cls.__dict__['__init__']) for cls in classes])
+    def counting(cls):
+        def __init__(self, *args, **kwargs):
+            if cls is type(self) or cls is cssutils.css.Value:
+                counts[cls] += 1
+            inits[cls](self, *args, **kwargs)
+        return __init__
+    cssutils.log.setLevel(100)
+    text = sheettext()
+    for cls in classes:
+        cls.__init__ = counting(cls)
+    try:
+        t = timed(cssutils.CSSParser(lazyValidation=True).parseString, text)
+    finally:
+        for cls in classes:
+            cls.__init__ = inits[cls]
+    print 'allocations'
+    print '  parse: %.3fs' % t
+    for cls in classes:
+        print '  %-14s: %d' % (cls.__name__, counts[cls])
+
+def values():
+    """Parsing all property values of the sheets again, mostly the time
+    used by ProdParser."""
+    cssutils.log.setLevel(100)
+    sheet = cssutils.CSSParser(lazyValidation=True).parseString(sheettext())
+    texts = [p.propertyValue.cssText for rule in sheet.cssRules
+                                     if hasattr(rule, 'style')
+                                     for p in rule.style.getProperties(all=True)]
+    def run():
+        for text in texts:
+            cssutils.css.PropertyValue(text)
+    print 'values'
+    print '  %d values: %.3fs' % (len(texts), min([timed(run)
+                                                   for i in range(5)]))
+
+def textedit():
+    """Changing a single value in the text of the sheets with
+    CSSStyleSheet.applyTextEdit compared to setting the whole text again."""
+    cssutils.log.setLevel(100)
+    text = sheettext()
+    sheet = cssutils.CSSParser(keepSource=True).parseString(text)
+    start = text.index(u'{', len(text) // 2) + 1
+    def edit():
+        for replacement in (u' ', u''):
+            sheet.applyTextEdit(start, start + 1 - len(replacement),
+                                replacement)
+    print 'textedit'
+    print '  parse         : %.3fs' % timed(cssutils.parseString, text)
+    print '  applyTextEdit : %.3fs' % min([timed(edit) for i in range(5)])
+
+def ruleat():
+    """Finding the rule at 1000 offsets of the sheets with
+    CSSStyleSheet.ruleAt compared to checking the source spans of all
+    top-level rules."""
+    cssutils.log.setLevel(100)
+    text = sheettext()
+    sheet = cssutils.parseString(text)
+    offsets = range(0, len(text), len(text) // 1000)
+    def scan():
+        for offset in offsets:
+            for rule in sheet.cssRules:
+                start, end = rule.sourceSpan or (0, 0)
+                if start <= offset < end:
+                    break
+    def ruleAt():
+        for offset in offsets:
+            sheet.ruleAt(offset)
+    print 'ruleat'
+    print '  %d rules' % len(sheet.cssRules)
+    print '  index  : %.3fs' % timed(sheet.ruleAt, 0)
+    print '  scan   : %.3fs' % timed(scan)
+    print '  ruleAt : %.3fs' % timed(ruleAt)
+
+def selectorindex():
+    """Finding the style rules for the classes of all selectors of the
+    sheets with CSSStyleSheet.rulesForClass compared to matching the
+    selectorText of all style rules."""
+    cssutils.log.setLevel(100)
+    sheet = cssutils.parseString(sheettext())
+    rules = [r for r in sheet.cssRules if r.type == r.STYLE_RULE]
+    texts = [(r, r.selectorText) for r in rules]
+    classes = set()
+    for rule, text in texts:
+        classes.update(re.findall(r'\.([\w-]+)', text))
+    classes = sorted(classes)
+    def scan():
+        for name in classes:
+            [r for r, text in texts if u'.' + name in text]
+    def rulesForClass():
+        for name in classes:
+            sheet.rulesForClass(name)
+    print 'selectorindex'
+    print '  %d rules, %d classes' % (len(rules), len(classes))
+    print '  index         : %.3fs' % timed(sheet.rulesForClass, u'x')
+    print '  scan          : %.3fs' % timed(scan)
+    print '  rulesForClass : %.3fs' % timed(rulesForClass)
+
+def write():
+    """Serializing the sheets with CSSStyleSheet.writeTo compared to
+    cssText, the size of the largest text written at once is the one of the
+    largest rule."""
+    cssutils.log.setLevel(100)
+    sheet = cssutils.parseString(sheettext())
+    class Stream(object):
+        size = largest = 0
+        def write(self, data):
+            self.size += len(data)
+            self.largest = max(self.largest, len(data))
+    stream = Stream()
+    print 'write'
+    print '  cssText : %.3fs' % timed(lambda: sheet.cssText)
+    print '  writeTo : %.3fs' % timed(sheet.writeTo, stream)
+    print '  %d bytes, largest write %d bytes' % (stream.size, stream.largest)
+
+def textcache():
+    """Serializing the sheets again without changes returns the cached
+    text, after changing a single property only the texts of its rule and
+    of the sheet are built again."""
+    cssutils.log.setLevel(100)
+    sheet = cssutils.parseString(sheettext())
+    rules = [r for r in sheet.cssRules if r.type == r.STYLE_RULE]
+    rule = rules[len(rules) // 2]
+    print 'textcache'
+    print '  first   : %.3fs' % timed(lambda: sheet.cssText)
+    print '  again   : %.3fs' % timed(lambda: sheet.cssText)
+    rule.style.setProperty('color', 'red')
+    print '  changed : %.3fs' % timed(lambda: sheet.cssText)
+
+def serializer():
+    """Throughput of CSSSerializer.do_CSSStyleRule and
+    do_css_CSSStyleDeclaration (not cached, see textcache) which call
+    Out.append for each token, with default and minified preferences."""
+    cssutils.log.setLevel(100)
+    sheet = cssutils.parseString(sheettext())
+    rules = [r for r in sheet.cssRules if r.type == r.STYLE_RULE]
+    styles = [r.style for r in rules]
+    ser = cssutils.CSSSerializer()
+    def run(method, objs):
+        for i in range(5):
+            for obj in objs:
+                method(obj)
+    print 'serializer'
+    print '  %d style rules x 5' % len(rules)
+    for name in ('useDefaults', 'useMinified'):
+        getattr(ser.prefs, name)()
+        print '  %s' % name
+        print '    do_CSSStyleRule            : %.3fs' % timed(
+            run, ser.do_CSSStyleRule, rules)
+        print '    do_css_CSSStyleDeclaration : %.3fs' % timed(
+            run, ser.do_css_CSSStyleDeclaration, styles)
+
+def minify():
+    """Minifying a sheet with MinifyingSerializer compared to CSSSerializer
+    with minified preferences, no cached texts are used."""
+    from cssutils.util import _TextCache
+    cssutils.log.setLevel(100)
+    sheet = cssutils.parseString(sheettext())
+    minified = cssutils.CSSSerializer()
+    minified.prefs.useMinified()
+    def run(ser):
+        cssutils.setSerializer(ser)
+        for i in range(3):
+            _TextCache.invalidate()
+            text = sheet.cssText
+        run.size = len(text)
+    oldser = cssutils.ser
+    print 'minify'
+    print '  %d rules x 3' % len(sheet.cssRules)
+    try:
+        for ser in (minified, cssutils.serialize.MinifyingSerializer()):
+            print '  %-20s: %.3fs' % (ser.__class__.__name__, timed(run, ser)),
+            print '%d bytes' % run.size
+    finally:
+        cssutils.setSerializer(oldser)
+
+def minifytext():
+    """Minifying a text with cssutils.minify which only tokenizes it
+    compared to csscombine(minify=True) which parses and serializes it."""
+    from cssutils.script import csscombine
+    cssutils.log.setLevel(100)
+    text = sheettext()
+    def run(func, *args, **kwargs):
+        run.size = len(func(*args, **kwargs))
+    print 'minifytext'
+    print '  %d chars' % len(text)
+    for name, func, kwargs in (
+            ('csscombine', csscombine, {'cssText': text}),
+            ('minify', cssutils.minify, {'cssText': text}),
+            ('minify(rewrite=True)', cssutils.minify, {'cssText': text,
+                                                       'rewrite': True})):
+        print '  %-20s: %.3fs' % (name, timed(run, func, **kwargs)),
+        print '%d chars' % run.size
+
+BENCHMARKS = ['tokenize', 'linecol', 'pickle', 'memory', 'interning',
+              'normalize', 'validate', 'allocations', 'values', 'textedit',
+              'ruleat', 'selectorindex', 'write', 'textcache', 'serializer',
+              'minify', 'minifytext']
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        globals()[name]()
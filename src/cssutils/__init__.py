@@ -96,7 +96,9 @@ VERSION = '0.9.8dev'
 __version__ = '%s $Id$' % VERSION
 
 import codec
+import codecs
 import os.path
+import re
 import urllib
 import urlparse
 import xml.dom
@@ -104,12 +106,14 @@ import xml.dom
 # order of imports is important (partly circular)
 from . import util
 import errorhandler
+import tokenize2
 log = errorhandler.ErrorHandler()
 
 import css
 import stylesheets
 from parse import CSSParser
 
+import serialize
 from serialize import CSSSerializer
 ser = CSSSerializer()
 
@@ -181,6 +185,10 @@ def parseUrl(*a, **k):
     return CSSParser().parseUrl(*a, **k)
 parseUrl.__doc__ = CSSParser.parseUrl.__doc__
 
+def parseFiles(filenames, **k):
+    return CSSParser().parseMany(filenames, files=True, **k)
+parseFiles.__doc__ = CSSParser.parseMany.__doc__
+
 def parseStyle(cssText, encoding='utf-8'):
     """Parse given `cssText` which is assumed to be the content of
     a HTML style attribute.
@@ -387,6 +395,169 @@ def resolveImports(sheet, target=None):
 
     return target
 
+# tokens which may be continued by name chars, may end with an escape
+_NAMED = frozenset(['IDENT', 'DIMENSION', 'HASH', 'NUMBER', 'UNICODE-RANGE',
+                    'ATKEYWORD', 'FONT_FACE_SYM', 'IMPORT_SYM', 'MEDIA_SYM',
+                    'NAMESPACE_SYM', 'PAGE_SYM', 'VARIABLES_SYM'])
+
+# a single whitespace after a hex escape belongs to the escape
+_hexescaped = re.compile(ur'(?<!\\)(?:\\\\)*\\[0-9a-fA-F]{1,6}$').search
+
+def _glued(name, before, after):
+    """Would the last token `name` of text `before` and the first token of
+    `after` be tokenized differently if written without anything in
+    between?"""
+    a, b = before[-1], after[0]
+    namechar = b.isalnum() or b in u'-_\\' or b > u'\x7f'
+    if name in _NAMED:
+        return namechar or b == u'(' or (
+               name == 'NUMBER' and b in u'.%') or (
+               name == 'IDENT' and a in u'uU' and b == u'+') or (
+               name == 'UNICODE-RANGE' and b == u'?')
+    else:
+        return (a in u'#@-' and namechar) or (
+                a == u'.' and b.isdigit()) or (
+                a == u'/' and b == u'*') or (
+                a in u'|~^$*' and b == u'=') or (
+                a == u'<' and b == u'!') or (
+                a in u'!-' and b == u'-') or (
+                a == u'-' and b == u'>')
+
+def minify(cssText, encoding=None, rewrite=False):
+    """Return `cssText` minified as a unicode string.
+
+    `cssText` is only tokenized without building a
+    :class:`~cssutils.css.CSSStyleSheet`. All comments are removed and
+    whitespace is kept (as a single space) only where needed, everything
+    else including any invalid CSS is written as it is. Two tokens only
+    separated by comments keep an empty comment ``/**/`` if needed. This is
+    about 10 times faster than ``csscombine(minify=True)``.
+
+    :param cssText:
+        the CSS to minify, a (byte) string is decoded like in
+        :meth:`CSSParser.parseString`
+    :param encoding:
+        used to decode `cssText` if given as a (byte) string
+    :param rewrite:
+        if ``True`` `cssText` is parsed and serialized with a
+        :class:`~cssutils.serialize.MinifyingSerializer` instead which also
+        rewrites values (e.g. ``0px`` => ``0``) and removes empty rules and
+        everything cssutils is not able to parse
+    """
+    if isinstance(cssText, str):
+        cssText = codecs.getdecoder('css')(cssText, encoding=encoding)[0]
+
+    if rewrite:
+        sheet = CSSParser(parseComments=False).parseString(cssText)
+        oldser = ser
+        setSerializer(serialize.MinifyingSerializer())
+        try:
+            return sheet.cssText.decode(sheet.encoding)
+        finally:
+            setSerializer(oldser)
+
+    # whitespace before or after these chars is never needed, more in
+    # blocks of declarations and in parenthesis of @media and @import rules
+    after, before = u'{};,>~(', u'{};,>~)'
+    declafter, declbefore = after + u':!/=', before + u':!/='
+    queryafter, querybefore = after + u':', before + u':'
+
+    def sourced(tokens):
+        "Yield (name, text in cssText) of tokens, values have escapes resolved"
+        name = None
+        for nextname, value, line, offset in tokens:
+            if name is not None:
+                yield name, cssText[pos:offset]
+            name, pos = nextname, offset
+
+    out = []
+    lastname = None # of the last token in out
+    skipped = [] # whitespace and comments since the last token
+    decls = [False] # stack, True if in a block of declarations
+    start = None # name of the first token of the current statement
+    level = 0 # of parenthesis
+    space = gap = False # whitespace or comments since last token
+
+    tokenizer = tokenize2.Tokenizer(lazyLineCol=True, internValues=False)
+    for name, text in sourced(tokenizer.tokenize(cssText, fullsheet=True)):
+        if 'S' == name:
+            space = gap = True
+            skipped.append(text)
+            continue
+        elif name in ('COMMENT', 'BOM'):
+            gap = True
+            skipped.append(text)
+            continue
+        elif 'URI' == name:
+            i = text.index(u'(') + 1
+            uri = text[i:-1].strip(u' \t\r\n\f')
+            if not uri.endswith(u'\\'):
+                text = u'%s%s)' % (text[:i], uri)
+
+        indecls = decls[-1]
+        if indecls and out:
+            # empty declarations
+            if u';' == text and out[-1] in (u';', u'{'):
+                continue
+            elif u'}' == text and out[-1] == u';':
+                del out[-1]
+
+        if gap and out:
+            if indecls:
+                dropafter, dropbefore = declafter, declbefore
+            elif level and start in ('MEDIA_SYM', 'IMPORT_SYM'):
+                dropafter, dropbefore = queryafter, querybefore
+            else:
+                dropafter, dropbefore = after, before
+            a, b = out[-1][-1], text[0]
+            if 'INVALID' == lastname or u'\\' == out[-1]:
+                # needs the newline or is an escape
+                out.extend(skipped)
+            elif (space and not (
+                    a in dropafter or b in dropbefore or
+                    # selector combinator
+                    u'+' in (a, b) and not level and not indecls)
+                  ) or _glued(lastname, out[-1], text) or (
+                    # U+ of UNICODE-RANGE
+                    u'+' == out[-1] and len(out) > 1 and
+                    out[-2][-1] in u'uU' and (b.isalnum() or b == u'?')):
+                if not space:
+                    # comments only, e.g. "a/**/b" is not "a b"
+                    out.append(u'/**/')
+                elif _hexescaped(out[-1]):
+                    out.append(u'  ')
+                else:
+                    out.append(u' ')
+        space = gap = False
+        del skipped[:]
+        out.append(text)
+        lastname = name
+
+        if start is None and not indecls:
+            start = name
+        if 'CHAR' == name:
+            if u'{' == text:
+                decls.append(indecls or start not in ('MEDIA_SYM',
+                                                      'ATKEYWORD'))
+                start, level = None, 0
+            elif u'}' == text:
+                if len(decls) > 1:
+                    del decls[-1]
+                start, level = None, 0
+            elif u';' == text:
+                start = None
+            elif u'(' == text:
+                level += 1
+            elif u')' == text and level:
+                level -= 1
+        elif 'FUNCTION' == name:
+            level += 1
+
+    if 'INVALID' == lastname:
+        # else completed to a STRING
+        out.extend(skipped)
+    return u''.join(out)
+
 
 if __name__ == '__main__':
     print __doc__
@@ -0,0 +1,186 @@
+"""Persistent cache of parsed style sheets, see :class:`SheetCache`."""
+__all__ = ['SheetCache']
+__docformat__ = 'restructuredtext'
+__version__ = '$Id$'
+
+import cPickle as pickle
+import cssutils
+import hashlib
+import os
+import tempfile
+import zlib
+
+class SheetCache(object):
+    """
+    A cache of parsed :class:`~cssutils.css.CSSStyleSheet` objects stored in
+    a directory. Used by a :class:`~cssutils.CSSParser` if given as its
+    `cache` parameter::
+
+        parser = cssutils.CSSParser(cache=SheetCache('/tmp/csscache'))
+
+    Entries are keyed by a hash of the decoded CSS text and all settings
+    which may change the parsed result (see ``CSSParser.parseString``). A
+    sheet found in the cache is simply unpickled, neither tokenizing nor
+    validating is done so no messages are logged for it again. Sheets with
+    @import rules are not cached at all as the imported sheets may have
+    been changed since.
+
+    Several processes may use the same directory. Entries are written to a
+    temporary file first which is then renamed and entries removed by
+    another process are simply not found.
+
+    .. warning::
+        Entries are unpickled so anyone who may write to the directory may
+        run any code in the processes using the cache. Use a directory
+        only trusted users (or processes) may write to.
+    """
+    suffix = '.csscache'
+
+    def __init__(self, path, maxSize=None, maxEntries=None):
+        """
+        :param path:
+            directory used for the cache, is created if not present
+        :param maxSize:
+            maximum size of all entries in bytes or ``None`` for no limit
+        :param maxEntries:
+            maximum number of entries or ``None`` for no limit
+
+        If one of the limits is exceeded the least recently used entries
+        are removed.
+        """
+        self.path = path
+        self.maxSize = maxSize
+        self.maxEntries = maxEntries
+        self.hits = self.misses = 0
+        # (size, number) of all entries as far as known, see _evict
+        self._total = None
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                # may have been created by another process meanwhile
+                if not os.path.isdir(path):
+                    raise
+
+    def __repr__(self):
+        return "cssutils.cache.%s(path=%r, maxSize=%r, maxEntries=%r)" % (
+                self.__class__.__name__, self.path, self.maxSize,
+                self.maxEntries)
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + self.suffix)
+
+    def _entries(self):
+        "Return list of (mtime, size, filename) of all entries, oldest first."
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith(self.suffix):
+                filename = os.path.join(self.path, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    # removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, filename))
+        entries.sort()
+        return entries
+
+    def key(self, cssText, settings):
+        """
+        Return key for (unicode) `cssText` parsed with `settings` which must
+        be a tuple with a stable ``repr``.
+        """
+        h = hashlib.sha1(cssText.encode('utf-8'))
+        h.update(repr(settings))
+        return h.hexdigest()
+
+    def get(self, key):
+        "Return the sheet cached for `key` or ``None``."
+        filename = self._filename(key)
+        try:
+            f = open(filename, 'rb')
+            try:
+                data = f.read()
+            finally:
+                f.close()
+            sheet = pickle.loads(zlib.decompress(data))
+        except Exception, e:
+            # not present, removed meanwhile or a broken entry
+            self.misses += 1
+            return None
+
+        try:
+            # mark as recently used
+            os.utime(filename, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return sheet
+
+    def set(self, key, sheet):
+        "Store `sheet` for `key` and remove old entries if needed."
+        try:
+            data = zlib.compress(pickle.dumps(sheet, pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, TypeError), e:
+            cssutils.log.warn(u'SheetCache: Cannot cache sheet: %s' % e,
+                              neverraise=True)
+            return
+
+        fd, tempname = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(tempname, self._filename(key))
+        except (IOError, OSError), e:
+            # e.g. on Windows rename fails if the entry exists already
+            try:
+                os.remove(tempname)
+            except OSError:
+                pass
+        else:
+            self._evict(len(data))
+
+    def _exceeded(self, size, number):
+        "Is a limit exceeded by `number` entries of `size` bytes?"
+        return ((self.maxSize is not None and size > self.maxSize) or
+                (self.maxEntries is not None and number > self.maxEntries))
+
+    def _evict(self, added):
+        """
+        Remove least recently used entries until all limits are met after
+        an entry of `added` bytes has been written. All entries are only
+        listed if a limit may be exceeded by the entries known so far (an
+        entry replaced or removed by another process is counted until
+        then).
+        """
+        if self.maxSize is None and self.maxEntries is None:
+            self._total = None
+            return
+        if self._total is not None:
+            size, number = self._total
+            self._total = size + added, number + 1
+            if not self._exceeded(*self._total):
+                return
+        entries = self._entries()
+        size = sum([entry[1] for entry in entries])
+        while entries and self._exceeded(size, len(entries)):
+            mtime, entrysize, filename = entries.pop(0)
+            try:
+                os.remove(filename)
+            except OSError:
+                # removed by another process
+                pass
+            size -= entrysize
+        self._total = size, len(entries)
+
+    def clear(self):
+        "Remove all entries."
+        self._total = None
+        for mtime, size, filename in self._entries():
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
@@ -69,7 +69,7 @@ class CSSCharsetRule(cssrule.CSSRule):
 
     def _getCssText(self):
         """The parsable textual representation."""
-        return cssutils.ser.do_CSSCharsetRule(self)
+        return self._cachedText('do_CSSCharsetRule')
 
     def _setCssText(self, cssText):
         """
@@ -148,6 +148,7 @@ class CSSCharsetRule(cssrule.CSSRule):
                                 % encoding)
             else:
                 self._encoding = encoding.lower()
+                self._changed()
 
     encoding = property(lambda self: self._encoding, _setEncoding,
         doc=u"(DOM)The encoding information used in this @charset rule.")
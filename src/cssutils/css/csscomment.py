@@ -43,7 +43,7 @@ class CSSComment(cssrule.CSSRule):
 
     def _getCssText(self):
         """Return serialized property cssText."""
-        return cssutils.ser.do_CSSComment(self)
+        return self._cachedText('do_CSSComment')
 
     def _setCssText(self, cssText):
         """
@@ -75,6 +75,7 @@ class CSSComment(cssrule.CSSRule):
                 error=xml.dom.InvalidModificationErr)
         else:
             self._cssText = self._tokenvalue(commenttoken)
+            self._changed()
 
     cssText = property(_getCssText, _setCssText,
         doc=u"The parsable textual representation of this rule.")
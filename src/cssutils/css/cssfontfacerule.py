@@ -64,7 +64,7 @@ class CSSFontFaceRule(cssrule.CSSRule):
 
     def _getCssText(self):
         """Return serialized property cssText."""
-        return cssutils.ser.do_CSSFontFaceRule(self)
+        return self._cachedText('do_CSSFontFaceRule')
 
     def _setCssText(self, cssText):
         """
@@ -156,6 +156,7 @@ class CSSFontFaceRule(cssrule.CSSRule):
         else:
             style._parentRule = self
             self._style = style
+        self._changed()
 
     style = property(lambda self: self._style, _setStyle,
                      doc=u"(DOM) The declaration-block of this rule set, "
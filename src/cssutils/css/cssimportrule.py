@@ -91,7 +91,7 @@ class CSSImportRule(cssrule.CSSRule):
 
     def _getCssText(self):
         """Return serialized property cssText."""
-        return cssutils.ser.do_CSSImportRule(self)
+        return self._cachedText('do_CSSImportRule')
 
     def _setCssText(self, cssText):
         """
@@ -316,11 +316,21 @@ class CSSImportRule(cssrule.CSSRule):
                 self.hrefFound = True
             
         self._styleSheet = importedSheet   
+        self._changed()
 
     _href = None # needs to be set 
     href = property(lambda self: self._href, _setHref,
                     doc=u"Location of the style sheet to be imported.")
 
+    def _setHreftype(self, hreftype):
+        self._hreftype = hreftype
+        self._changed()
+
+    hreftype = property(lambda self: self._hreftype, _setHreftype,
+                        doc=u"(cssutils) ``'string'`` or ``'uri'``, how "
+                            u"href is serialized if preference "
+                            u"``importHrefFormat`` is not set.")
+
     def _setMedia(self, media):
         """
         :param media:
@@ -346,6 +356,7 @@ class CSSImportRule(cssrule.CSSRule):
             # if no media until now add after href
             self.seq.insert(ihref+1, 
                             self._media, 'media', None, None)
+        self._changed()
         
     media = property(lambda self: self._media, _setMedia,
                      doc=u"(DOM) A list of media types for this rule "
@@ -367,6 +378,7 @@ class CSSImportRule(cssrule.CSSRule):
                 if 'name' == typ:
                     self._seq[i] = (name, typ, item.line, item.col)
                     break
+            self._changed()
                 
             # set title of imported sheet
             if self.styleSheet:
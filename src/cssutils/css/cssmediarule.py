@@ -45,6 +45,10 @@ class CSSMediaRule(cssrule.CSSRule):
         """Generator iterating over these rule's cssRules."""
         for rule in self._cssRules:
             yield rule
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cssRules = self._cssRules
             
     def __repr__(self):
         return u"cssutils.css.%s(mediaText=%r)" % (
@@ -68,6 +72,10 @@ class CSSMediaRule(cssrule.CSSRule):
             rule._parentRule = self
             
         self._cssRules = cssRules
+        self._changed()
+        if self.parentStyleSheet is not None:
+            # built again at next use
+            self.parentStyleSheet._selectorIndex = None
 
     cssRules = property(lambda self: self._cssRules, _setCssRules,
             "All Rules in this style sheet, a "
@@ -75,7 +83,7 @@ class CSSMediaRule(cssrule.CSSRule):
 
     def _getCssText(self):
         """Return serialized property cssText."""
-        return cssutils.ser.do_CSSMediaRule(self)
+        return self._cachedText('do_CSSMediaRule')
 
     def _setCssText(self, cssText):
         """
@@ -139,6 +147,7 @@ class CSSMediaRule(cssrule.CSSRule):
             
             # name (optional)
             name = None
+            badname = False
             nameseq = self._tempSeq()
             if self._prods.STRING == self._type(end):
                 name = self._stringtokenvalue(end)
@@ -152,25 +161,88 @@ class CSSMediaRule(cssrule.CSSRule):
                                                    {})
                 if not wellformed:
                     ok = False
+                    badname = True
+
+            def nameerror():
+                # logged when cssText has been read as it is included
+                if badname:
                     self._log.error(u'CSSMediaRule: Syntax Error: %s' % 
                                     self._valuestr(cssText))
-                    
 
             # check for {
             if u'{' != self._tokenvalue(end):
+                nameerror()
                 self._log.error(u'CSSMediaRule: No "{" found: %s' % 
                                 self._valuestr(cssText))
                 return
             
-            # cssRules
-            cssrulestokens, braceOrEOF = self._tokensupto2(tokenizer, 
-                                               mediaendonly=True,
-                                               separateEnd=True)
+            # cssRules, parsed in place and checked for the end afterwards
+            cssrules = self._tokensview(tokenizer, mediaendonly=True,
+                                        separateEnd=True)
+
+            # for closures: must be a mutable
+            new = {'wellformed': True }
+
+            def COMMENT(expected, seq, token, tokenizer=None):
+                self.insertRule(cssutils.css.CSSComment([token],
+                                                        parentRule=self,
+                                                        parentStyleSheet=self.parentStyleSheet))
+                return expected
+
+            def ruleset(expected, seq, token, tokenizer):
+                rule = cssutils.css.CSSStyleRule(parentRule=self,
+                                                 parentStyleSheet=self.parentStyleSheet)
+                ruletokens = self._tokensview(tokenizer, token)
+                rule.cssText = ruletokens
+                ruletokens.drain()
+                if rule.wellformed:
+                    self.insertRule(rule)
+                return expected
+
+            def atrule(expected, seq, token, tokenizer):
+                # TODO: get complete rule!
+                tokens = self._tokensview(tokenizer, token)
+                atval = self._tokenvalue(token)
+                if atval in ('@charset ', '@font-face', '@import', 
+                             '@namespace', '@page', '@media', '@variables'):
+                    self._log.error(u'CSSMediaRule: This rule is not '
+                                    u'allowed in CSSMediaRule - ignored: '
+                                    u'%s.' % self._valuestr(tokens),
+                                    token = token, 
+                                    error=xml.dom.HierarchyRequestErr)
+                else:
+                    rule = cssutils.css.CSSUnknownRule(tokens,
+                                                       parentRule=self, 
+                                    parentStyleSheet=self.parentStyleSheet)
+                    tokens.drain()
+                    if rule.wellformed:
+                        self.insertRule(rule)
+                return expected
+
+            self.cssRules = cssutils.css.CSSRuleList()
+            seq = [] # not used really
+
+            wellformed, expected = self._parse(None,
+                                               seq,
+                                               cssrules, {
+                                                 'COMMENT': COMMENT,
+                                                 'CHARSET_SYM': atrule,
+                                                 'FONT_FACE_SYM': atrule,
+                                                 'IMPORT_SYM': atrule,
+                                                 'NAMESPACE_SYM': atrule,
+                                                 'PAGE_SYM': atrule,
+                                                 'MEDIA_SYM': atrule,
+                                                 'ATKEYWORD': atrule
+                                               }, 
+                                               default=ruleset,
+                                               new=new)
+
+            braceOrEOF = cssrules.end
             nonetoken = self._nexttoken(tokenizer, None)
+            nameerror()
             if 'EOF' == self._type(braceOrEOF):
                 # HACK!!!
-                # TODO: Not complete, add EOF to rule and } to @media
-                cssrulestokens.append(braceOrEOF)
+                # TODO: Not complete, EOF has been added to the last rule
                 braceOrEOF = ('CHAR', '}', 0, 0)
                 self._log.debug(u'CSSMediaRule: Incomplete, adding "}".', 
                                 token=braceOrEOF, neverraise=True)
@@ -178,67 +250,12 @@ class CSSMediaRule(cssrule.CSSRule):
             if u'}' != self._tokenvalue(braceOrEOF):
                 self._log.error(u'CSSMediaRule: No "}" found.', 
                                 token=braceOrEOF)
+                self._cssRules = oldCssRules
             elif nonetoken:
                 self._log.error(u'CSSMediaRule: Trailing content found.',
                                 token=nonetoken)
-            else:                
-                # for closures: must be a mutable
-                new = {'wellformed': True }
-                                   
-                def COMMENT(expected, seq, token, tokenizer=None):
-                    self.insertRule(cssutils.css.CSSComment([token],
-                                                            parentRule=self,
-                                                            parentStyleSheet=self.parentStyleSheet))
-                    return expected
-
-                def ruleset(expected, seq, token, tokenizer):
-                    rule = cssutils.css.CSSStyleRule(parentRule=self,
-                                                     parentStyleSheet=self.parentStyleSheet)
-                    rule.cssText = self._tokensupto2(tokenizer, token)
-                    if rule.wellformed:
-                        self.insertRule(rule)
-                    return expected
-        
-                def atrule(expected, seq, token, tokenizer):
-                    # TODO: get complete rule!
-                    tokens = self._tokensupto2(tokenizer, token)
-                    atval = self._tokenvalue(token)
-                    if atval in ('@charset ', '@font-face', '@import', 
-                                 '@namespace', '@page', '@media', '@variables'):
-                        self._log.error(u'CSSMediaRule: This rule is not '
-                                        u'allowed in CSSMediaRule - ignored: '
-                                        u'%s.' % self._valuestr(tokens),
-                                        token = token, 
-                                        error=xml.dom.HierarchyRequestErr)
-                    else:
-                        rule = cssutils.css.CSSUnknownRule(tokens,
-                                                           parentRule=self, 
-                                        parentStyleSheet=self.parentStyleSheet)
-                        if rule.wellformed:
-                            self.insertRule(rule)
-                    return expected
-                
-                # save for possible reset
-                oldCssRules = self.cssRules
-                
-                self.cssRules = cssutils.css.CSSRuleList()
-                seq = [] # not used really
-                
-                tokenizer = (t for t in cssrulestokens) # TODO: not elegant!
-                wellformed, expected = self._parse(braceOrEOF, 
-                                                   seq, 
-                                                   tokenizer, {
-                                                     'COMMENT': COMMENT,
-                                                     'CHARSET_SYM': atrule,
-                                                     'FONT_FACE_SYM': atrule,
-                                                     'IMPORT_SYM': atrule,
-                                                     'NAMESPACE_SYM': atrule,
-                                                     'PAGE_SYM': atrule,
-                                                     'MEDIA_SYM': atrule,
-                                                     'ATKEYWORD': atrule
-                                                   }, 
-                                                   default=ruleset,
-                                                   new=new)
+                self._cssRules = oldCssRules
+            else:
                 ok = ok and wellformed
                 
             if ok:
@@ -259,6 +276,7 @@ class CSSMediaRule(cssrule.CSSRule):
                 name = None
 
             self._name = name
+            self._changed()
         else:
             self._log.error(u'CSSImportRule: Not a valid name: %s' % name)
 
@@ -277,6 +295,7 @@ class CSSMediaRule(cssrule.CSSRule):
         else:
             media._parentRule = self
             self._media = media
+        self._changed()
         
         # NOT IN @media seq at all?!
 #        # update seq
@@ -326,12 +345,19 @@ class CSSMediaRule(cssrule.CSSRule):
                                            % index)
 
         try:
-            self._cssRules[index]._parentRule = None # detach
+            rule = self._cssRules[index]
+            rule._changed()
+            rule._parentRule = None # detach
             del self._cssRules[index] # remove from @media
         except IndexError:
             raise xml.dom.IndexSizeErr(u'CSSMediaRule: %s is not a valid index '
                                        u'in the rulelist of length %i' 
                                        % (index, self._cssRules.length))
+        else:
+            self._changed()
+            selectorIndex = self.__selectorIndex()
+            if selectorIndex is not None:
+                selectorIndex.remove(rule)
 
     def add(self, rule):
         """Add `rule` to end of this mediarule. 
@@ -396,6 +422,8 @@ class CSSMediaRule(cssrule.CSSRule):
                 self._log.error(u'CSSMediaRule: Invalid Rule: %s' % rule)
                 return
             rule = tempsheet.cssRules[0]
+            # not parsed from the text of the sheet of this rule
+            rule._span = None
             
         elif isinstance(rule, cssutils.css.CSSRuleList):
             # insert all rules
@@ -423,8 +451,17 @@ class CSSMediaRule(cssrule.CSSRule):
         self._cssRules.insert(index, rule)
         rule._parentRule = self
         rule._parentStyleSheet = self.parentStyleSheet
+        rule._changed()
+        self._changed()
+        selectorIndex = self.__selectorIndex()
+        if selectorIndex is not None:
+            selectorIndex.add(rule)
         return index
 
+    def __selectorIndex(self):
+        "Index of the sheet, see CSSStyleSheet.rulesForClass."
+        return getattr(self.parentStyleSheet, '_selectorIndex', None)
+
     type = property(lambda self: self.MEDIA_RULE, 
                     doc=u"The type of this rule, as defined by a CSSRule "
                         u"type constant.")
@@ -95,9 +95,14 @@ class CSSNamespaceRule(cssrule.CSSRule):
                 self.prefix,
                 id(self))
 
+    def _changed(self):
+        "The text of all selectors may depend on namespaces."
+        cssutils.util._TextCache.invalidate()
+        super(CSSNamespaceRule, self)._changed()
+
     def _getCssText(self):
         """Return serialized property cssText"""
-        return cssutils.ser.do_CSSNamespaceRule(self)
+        return self._cachedText('do_CSSNamespaceRule')
 
     def _setCssText(self, cssText):
         """
@@ -248,6 +253,7 @@ class CSSNamespaceRule(cssrule.CSSRule):
                 self._seq.replace(i, namespaceURI, 'namespaceURI')
                 self._seq._readonly = True
                 break
+        self._changed()
 
     def _setPrefix(self, prefix=None):
         """
@@ -283,6 +289,7 @@ class CSSNamespaceRule(cssrule.CSSRule):
 
         # set new prefix
         self._prefix = prefix
+        self._changed()
 
     prefix = property(lambda self: self._prefix, _setPrefix,
                       doc=u"Prefix used for the defined namespace.")
@@ -155,7 +155,7 @@ class CSSPageRule(cssrule.CSSRule):
 
     def _getCssText(self):
         """Return serialized property cssText."""
-        return cssutils.ser.do_CSSPageRule(self)
+        return self._cachedText('do_CSSPageRule')
 
     def _setCssText(self, cssText):
         """
@@ -252,6 +252,7 @@ class CSSPageRule(cssrule.CSSRule):
         wellformed, newseq = self.__parseSelectorText(selectorText)
         if wellformed:
             self._selectorText = newseq
+            self._changed()
 
     selectorText = property(_getSelectorText, _setSelectorText,
                             doc=u"(DOM) The parsable textual representation of "
@@ -268,6 +269,7 @@ class CSSPageRule(cssrule.CSSRule):
         else:
             style._parentRule = self
             self._style = style
+        self._changed()
             
     style = property(lambda self: self._style, _setStyle,
                      doc=u"(DOM) The declaration-block of this rule set, "
@@ -54,12 +54,16 @@ class CSSRule(cssutils.util.Base2):
                     VARIABLES_RULE: u'VARIABLES_RULE'
                     }
 
+    # serialized text is cached, see _BaseClass._cachedText
+    _stop = -1
+
     def __init__(self, parentRule=None, parentStyleSheet=None, readonly=False):
         """Set common attributes for all rules."""
         super(CSSRule, self).__init__()
         self._parent = parentRule
         self._parentRule = parentRule
         self._parentStyleSheet = parentStyleSheet
+        self._span = None
         self._setSeq(self._tempSeq())
         # must be set after initialization of #inheriting rule is done
         self._readonly = False
@@ -69,6 +73,7 @@ class CSSRule(cssutils.util.Base2):
         if not self.atkeyword or (self._normalize(akw) ==
                                   self._normalize(self.atkeyword)):
             self._atkeyword = akw
+            self._changed()
         else:
             self._log.error(u'%s: Invalid atkeyword for this rule: %r' %
                             (self._normalize(self.atkeyword), akw),
@@ -95,12 +100,22 @@ class CSSRule(cssutils.util.Base2):
               Raised if the rule is readonly.
         """
         self._checkReadonly()
+        if isinstance(cssText, cssutils.util._TokenView):
+            # known when all tokens of the rule have been read
+            cssText.spanOf(self)
+        else:
+            self._span = self._tokensSpan(cssText)
 
     cssText = property(lambda self: u'', _setCssText,
                        doc=u"(DOM) The parsable textual representation of the "
                            u"rule. This reflects the current state of the rule "
                            u"and not its initial value.")
 
+    def _parentNode(self):
+        if self._parentRule is not None:
+            return self._parentRule
+        return self._parentStyleSheet
+
     parent = property(lambda self: self._parent,
                       doc=u"The Parent Node of this CSSRule or None.")
 
@@ -120,6 +135,11 @@ class CSSRule(cssutils.util.Base2):
     parentStyleSheet = property(_getParentStyleSheet,
                                 doc=u"The style sheet that contains this rule.")
 
+    sourceSpan = property(lambda self: self._getSourceSpan(self.parentRule),
+                          doc=u"``(start, end)`` offsets of this rule in the "
+                              u"text of its style sheet or ``None`` if it "
+                              u"has not been parsed as part of it.")
+
     type = property(lambda self: self.UNKNOWN_RULE,
                     doc=u"The type of this rule, as defined by a CSSRule "
                         u"type constant.")
@@ -27,6 +27,10 @@ class CSSRuleList(list):
             'Must be implemented by class using an instance of this class.')
     
     append = extend = __setitem__ = __setslice__ = __notimplemented
+
+    def __reduce__(self):
+        "Methods set by the owning class are not pickled but set again by it."
+        return (_newCSSRuleList, (list(self),))
     
     def item(self, index):
         """(DOM) Retrieve a CSS rule by ordinal `index`. The order in this
@@ -51,3 +55,9 @@ class CSSRuleList(list):
         for r in self:
             if r.type == type:
                 yield r 
+
+def _newCSSRuleList(rules):
+    "Return new CSSRuleList containing `rules`, used for unpickling."
+    rulelist = CSSRuleList()
+    list.extend(rulelist, rules)
+    return rulelist
@@ -94,6 +94,9 @@ class CSSStyleDeclaration(CSS2Properties, cssutils.util.Base2):
     
         [Property: Value Priority?;]* [Property: Value Priority?]?
     """
+    # serialized text is cached, see _BaseClass._cachedText
+    _stop = -1
+
     def __init__(self, cssText=u'', parentRule=None, readonly=False):
         """
         :param cssText:
@@ -172,7 +175,7 @@ class CSSStyleDeclaration(CSS2Properties, cssutils.util.Base2):
         known = ['_tokenizer', '_log', '_ttypes',
                  '_seq', 'seq', 'parentRule', '_parentRule', 'cssText',
                  'valid', 'wellformed',
-                 '_readonly', '_profiles']
+                 '_readonly', '_profiles', '_cache', '_stop']
         known.extend(CSS2Properties._properties)
         if n in known:
             super(CSSStyleDeclaration, self).__setattr__(n, v)
@@ -264,7 +267,7 @@ class CSSStyleDeclaration(CSS2Properties, cssutils.util.Base2):
 
     def _getCssText(self):
         """Return serialized property cssText."""
-        return cssutils.ser.do_css_CSSStyleDeclaration(self)
+        return self._cachedText('do_css_CSSStyleDeclaration')
 
     def _setCssText(self, cssText):
         """Setting this attribute will result in the parsing of the new value
@@ -340,6 +343,9 @@ class CSSStyleDeclaration(CSS2Properties, cssutils.util.Base2):
         """
         return cssutils.ser.do_css_CSSStyleDeclaration(self, separator)
 
+    def _parentNode(self):
+        return self._parentRule
+
     def _setParentRule(self, parentRule):
         self._parentRule = parentRule
 #        for x in self.children():
@@ -607,6 +613,7 @@ class CSSStyleDeclaration(CSS2Properties, cssutils.util.Base2):
                 self.seq._readonly = False
                 self.seq.append(newp, 'Property')
                 self.seq._readonly = True
+                self._changed()
 
     def item(self, index):
         """(DOM) Retrieve the properties that have been explicitly set in
@@ -63,7 +63,7 @@ class CSSStyleRule(cssrule.CSSRule):
 
     def _getCssText(self):
         """Return serialized property cssText."""
-        return cssutils.ser.do_CSSStyleRule(self)
+        return self._cachedText('do_CSSStyleRule')
 
     def _setCssText(self, cssText):
         """
@@ -179,6 +179,7 @@ class CSSStyleRule(cssrule.CSSRule):
         self._checkReadonly()
         selectorList._parentRule = self
         self._selectorList = selectorList
+        self._selectorsChanged()
 
     _selectorList = None
     selectorList = property(lambda self: self._selectorList, _setSelectorList,
@@ -206,6 +207,15 @@ class CSSStyleRule(cssrule.CSSRule):
         sl = SelectorList(selectorText=selectorText, parentRule=self)
         if sl.wellformed:
             self._selectorList = sl
+            self._selectorsChanged()
+
+    def _selectorsChanged(self):
+        """Drop the cached text and update the index of the sheet, see
+        CSSStyleSheet.rulesForClass."""
+        self._changed()
+        sheet = self.parentStyleSheet
+        if sheet is not None and sheet._selectorIndex is not None:
+            sheet._selectorIndex.update(self)
 
     selectorText = property(lambda self: self._selectorList.selectorText,
                             _setSelectorText,
@@ -223,6 +233,7 @@ class CSSStyleRule(cssrule.CSSRule):
         else:
             style._parentRule = self
             self._style = style
+        self._changed()
 
     style = property(lambda self: self._style, _setStyle,
                      doc=u"(DOM) The declaration-block of this rule set.")
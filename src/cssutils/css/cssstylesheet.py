@@ -12,12 +12,254 @@ __docformat__ = 'restructuredtext'
 __version__ = '$Id$'
 
 from cssutils.helper import Deprecated
+from cssutils.tokenize2 import Tokenizer, _LineIndex
 from cssutils.util import _Namespaces, _SimpleNamespaces, _readUrl
 from cssrule import CSSRule
 from cssvariablesdeclaration import CSSVariablesDeclaration
+import array
+import bisect
 import cssutils.stylesheets
+import re
+import sys
 import xml.dom
 
+class _Source(object):
+    """
+    The text a sheet has been parsed from and the top-level items found in
+    it, used by :meth:`CSSStyleSheet.applyTextEdit`. An item is what the
+    sheet parser handles at once: a rule, a comment, whitespace or some
+    invalid content.
+
+    For each item the offset of its first token in `text`, the name of this
+    token, the state of the parser (``expected``) before it and the index
+    of its first rule in ``cssRules`` are kept. ``indexes`` is ``None`` if
+    the rules of the sheet have been changed otherwise since.
+
+    ``ruleIndex`` holds the source spans of all rules of the sheet in
+    document order for :meth:`CSSStyleSheet.ruleAt`, it is built at first
+    use after each change.
+
+    The text and items are only kept if the sheet has been parsed by
+    ``CSSParser(keepSource=True)``, otherwise the source of a sheet is
+    replaced by an empty one as soon as the source spans are known.
+    """
+    _newline = re.compile(u'\n').finditer
+
+    def __init__(self, text=None):
+        self.text = text
+        # settings of the tokenizer used for text
+        self.doComments = True
+        self.internValues = True
+        self.fullsheet = False
+        # line of each item or 0 if offsets holds the actual offset and
+        # not the col, converted at first use (see resolve)
+        self.lines = array.array('l')
+        self.offsets = array.array('l')
+        self.names = []
+        self.expected = []
+        self.indexes = array.array('l')
+        self.ruleIndex = None
+
+    def setText(self, text, tokenizer, fullsheet):
+        "Set `text` which has been tokenized by `tokenizer`."
+        self.text = text
+        self.doComments = tokenizer._doComments
+        self.internValues = tokenizer._internValues
+        self.fullsheet = fullsheet
+
+    def add(self, token, expected, index):
+        "Add item starting with `token`."
+        line = token[2]
+        if isinstance(line, _LineIndex):
+            line = 0
+        self.lines.append(line)
+        self.offsets.append(token[3])
+        self.names.append(token[0])
+        self.expected.append(expected)
+        self.indexes.append(index)
+
+    def newlines(self):
+        "Return offsets of all newlines in text."
+        return [m.start() for m in self._newline(self.text)]
+
+    def resolve(self):
+        "Return offsets of all items, computed from line and col once."
+        if self.lines is not None:
+            if max(self.lines or [0]) > 1:
+                newlines = self.newlines()
+            offsets = self.offsets
+            for i, line in enumerate(self.lines):
+                if line == 1:
+                    offsets[i] -= 1
+                elif line:
+                    offsets[i] += newlines[line - 2]
+            self.lines = None
+        return self.offsets
+
+    def tokenizer(self):
+        """Return tokenizer with the settings used for text but yielding the
+        offset of each token as col."""
+        return Tokenizer(doComments=self.doComments, lazyLineCol=True,
+                         internValues=self.internValues)
+
+    def tokenize(self, text, start=0):
+        "Tokenize `text` beginning at offset `start` like the text before."
+        return self.tokenizer().tokenize(text, fullsheet=self.fullsheet,
+                                         start=start)
+
+    def splice(self, first, last, items, delta, rulesdelta):
+        """Replace items `first` to `last` by new `items` and shift the
+        offsets and indexes of the following ones."""
+        self.offsets[first:] = items.resolve() + array.array('l',
+                               [offset + delta
+                                for offset in self.offsets[last:]])
+        self.indexes[first:] = array.array('l',
+                               list(items.indexes) +
+                               [i + rulesdelta for i in self.indexes[last:]])
+        self.names[first:last] = items.names
+        self.expected[first:last] = items.expected
+
+
+class _SelectorIndex(object):
+    """
+    All style rules of a sheet (also those in @media rules) by the keys of
+    the rightmost compound selector of each of their selectors, used by
+    :meth:`CSSStyleSheet.rulesForClass` etc. Keys are ``u'#id'``,
+    ``u'.class'`` and the lowercase element name or ``u'*'`` if a compound
+    has none. Simple selectors in ``:not()`` are not used.
+
+    ``rules`` maps each key to the rules in document order and ``keys``
+    each rule to its keys. ``paths`` caches the indexes of rules, it is
+    cleared if a rule has been removed or inserted before other rules but
+    not if one has been appended.
+    """
+    _combinators = frozenset(['descendant', 'child', 'adjacent-sibling',
+                              'following-sibling'])
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.rules = {}
+        self.keys = {}
+        self.paths = {}
+        for rule in self.styleRules(sheet.cssRules):
+            # already in document order
+            keys = self.keys[rule] = self.keysOf(rule)
+            for key in keys:
+                self.rules.setdefault(key, []).append(rule)
+
+    def styleRules(self, rules):
+        "Generator of all style rules in `rules` in document order."
+        for rule in rules:
+            if rule.type == rule.STYLE_RULE:
+                yield rule
+            elif rule.type == rule.MEDIA_RULE:
+                for r in self.styleRules(rule.cssRules):
+                    yield r
+
+    def keysOf(self, rule):
+        "Return the set of keys of style `rule`."
+        keys = set()
+        for selector in rule.selectorList:
+            compound, tag, negation = [], u'*', False
+            for item in selector.seq:
+                type_ = item.type
+                if type_ == 'negation-start':
+                    negation = True
+                elif type_ == 'negation-end':
+                    negation = False
+                elif negation:
+                    continue
+                elif type_ in self._combinators:
+                    compound, tag = [], u'*'
+                elif type_ in ('id', 'class'):
+                    compound.append(item.value)
+                elif type_ in ('type-selector', 'universal'):
+                    tag = item.value[1].lower()
+            keys.update(compound)
+            keys.add(tag)
+        return keys
+
+    def siblings(self, rule):
+        "The list `rule` is in (if it is in the sheet)."
+        if rule.parentRule is None:
+            return self.sheet.cssRules
+        return rule.parentRule.cssRules
+
+    def path(self, rule):
+        "Indexes of `rule` (and its @media rule) in document order."
+        path = self.paths.get(rule)
+        if path is None:
+            rules = self.siblings(rule)
+            if rules and rules[-1] is rule:
+                # appended mostly
+                index = len(rules) - 1
+            else:
+                index = rules.index(rule)
+            path = (index,)
+            if rule.parentRule is not None:
+                path = self.path(rule.parentRule) + path
+            self.paths[rule] = path
+        return path
+
+    def insert(self, rule, path):
+        "Insert style `rule` at `path` into the lists of its keys."
+        if rule in self.keys:
+            # already indexed
+            return
+        keys = self.keys[rule] = self.keysOf(rule)
+        for key in keys:
+            rules = self.rules.setdefault(key, [])
+            lo, hi = 0, len(rules)
+            if rules and self.path(rules[-1]) < path:
+                # appended mostly
+                lo = hi
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.path(rules[mid]) < path:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            rules.insert(lo, rule)
+
+    def discard(self, rule):
+        "Remove style `rule` from the lists of its keys."
+        for key in self.keys.pop(rule, ()):
+            rules = self.rules[key]
+            rules.remove(rule)
+            if not rules:
+                del self.rules[key]
+
+    def add(self, rule):
+        "Add all style rules in `rule` which are in the sheet."
+        rules = self.siblings(rule)
+        if rule not in self.paths and not (rules and rules[-1] is rule):
+            # indexes of the following rules have changed
+            self.paths = {}
+        try:
+            self.path(rule)
+        except ValueError:
+            # not in the sheet
+            return
+        for rule in self.styleRules([rule]):
+            self.insert(rule, self.path(rule))
+
+    def remove(self, rule):
+        "Remove all style rules in `rule`."
+        self.paths = {}
+        for rule in self.styleRules([rule]):
+            self.discard(rule)
+
+    def update(self, rule):
+        "Selectors of style `rule` have been changed."
+        if rule in self.keys and self.keys[rule] != self.keysOf(rule):
+            self.discard(rule)
+            self.insert(rule, self.path(rule))
+
+    def get(self, key):
+        "Return a new list of the rules with `key`."
+        return list(self.rules.get(key, ()))
+
+
 class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
     """CSSStyleSheet represents a CSS style sheet.
 
@@ -32,6 +274,13 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
     ``cssRules``
         All Rules in this style sheet, a :class:`~cssutils.css.CSSRuleList`.
     """
+    # see rulesForClass, built at first use
+    _selectorIndex = None
+    # if the text is kept for applyTextEdit, see CSSParser(keepSource=True)
+    _keepSource = False
+    # serialized text is cached, see _BaseClass._cachedText
+    _stop = -1
+
     def __init__(self, href=None, media=None, title=u'', disabled=None,
                  ownerNode=None, parentStyleSheet=None, readonly=False,
                  ownerRule=None):
@@ -43,6 +292,7 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
                 ownerNode, parentStyleSheet)
 
         self._ownerRule = ownerRule
+        self._source = None
         self.cssRules = cssutils.css.CSSRuleList()
         self._namespaces = _Namespaces(parentStyleSheet=self, log=self._log)
         self._variables = CSSVariablesDeclaration()
@@ -57,6 +307,19 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         for rule in self._cssRules:
             yield rule
 
+    def __getstate__(self):
+        "The fetcher which may be any callable is not pickled."
+        state = self.__dict__.copy()
+        state['_fetcher'] = None
+        state['_selectorIndex'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cssRules = self._cssRules
+        # not set in sheets pickled by older versions
+        self._source = state.get('_source')
+
     def __repr__(self):
         if self.media:
             mediaText = self.media.mediaText
@@ -112,6 +375,18 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
             rule._parentStyleSheet = self
 
         self._cssRules = cssRules
+        self._selectorIndex = None
+        self._rulesChanged(cssRules)
+        self._changed()
+
+    def _rulesChanged(self, rules=()):
+        """Rules do not match the source text anymore (see applyTextEdit),
+        new `rules` have not been parsed from it."""
+        if self._source is not None:
+            self._source.indexes = None
+            self._source.ruleIndex = None
+            for rule in rules:
+                rule._span = None
 
     cssRules = property(lambda self: self._cssRules, _setCssRules,
                         u"All Rules in this style sheet, a "
@@ -119,7 +394,20 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
 
     def _getCssText(self):
         "Textual representation of the stylesheet (a byte string)."
-        return cssutils.ser.do_CSSStyleSheet(self)
+        return self._cachedText('do_CSSStyleSheet')
+
+    def writeTo(self, stream, encoding=None):
+        """Write the same bytes as :attr:`cssText` to the file-like object
+        `stream` without building the whole text at once, see
+        :meth:`cssutils.serialize.CSSSerializer.write`.
+
+        :param stream:
+            object with a ``write`` method which accepts byte strings, e.g.
+            a file opened in binary mode
+        :param encoding:
+            encoding to use instead of :attr:`encoding` of this sheet
+        """
+        cssutils.ser.write(self, stream, encoding)
 
     def _setCssText(self, cssText):
         """Parse `cssText` and overwrites the whole stylesheet.
@@ -140,6 +428,54 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         cssText, namespaces = self._splitNamespacesOff(cssText)
         tokenizer = self._tokenize2(cssText)
 
+        # save for possible reset
+        oldCssRules = self.cssRules
+        oldNamespaces = self._namespaces
+        oldSource = self._source
+
+        self._source = None
+        self.cssRules = cssutils.css.CSSRuleList()
+        # simple during parse
+        self._namespaces = namespaces
+        self._variables = CSSVariablesDeclaration()
+
+        if isinstance(cssText, basestring):
+            source = _Source(cssText)
+        else:
+            # text of tokens is set by CSSParser
+            source = _Source()
+        wellformed, expected = self._parseItems(tokenizer, 0, source)
+
+        if wellformed:
+            self._source = source
+            if source.text is not None:
+                self._resolveSpans(self._cssRules)
+                self._dropSourceText()
+            # use proper namespace object
+            self._namespaces = _Namespaces(parentStyleSheet=self, log=self._log)
+            self._cleanNamespaces()
+
+        else:
+            # reset
+            self._cssRules = oldCssRules
+            self._namespaces = oldNamespaces
+            self._source = oldSource
+            self._updateVariables()
+            self._cleanNamespaces()
+
+    cssText = property(_getCssText, _setCssText,
+            "Textual representation of the stylesheet (a byte string)")
+
+    def _parseItems(self, tokenizer, expected, source, stop=None):
+        """
+        Parse all top-level items of `tokenizer` into cssRules beginning
+        with parser state `expected` and add each item to `source` (see
+        ``applyTextEdit``). If given `stop` is called with the first token
+        of each item and the parser state and parsing stops as soon as it
+        returns ``True``.
+
+        Returns ``(wellformed, expected)``.
+        """
         def S(expected, seq, token, tokenizer=None):
             # @charset must be at absolute beginning of style sheet
             return max(1, expected)
@@ -153,7 +489,9 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         def charsetrule(expected, seq, token, tokenizer):
             # parse and consume tokens in any case
             rule = cssutils.css.CSSCharsetRule(parentStyleSheet=self)
-            rule.cssText = self._tokensupto2(tokenizer, token)
+            ruletokens = self._tokensview(tokenizer, token)
+            rule.cssText = ruletokens
+            ruletokens.drain()
 
             if expected > 0:
                 self._log.error(u'CSSStylesheet: CSSCharsetRule only allowed '
@@ -168,7 +506,9 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         def importrule(expected, seq, token, tokenizer):
             # parse and consume tokens in any case
             rule = cssutils.css.CSSImportRule(parentStyleSheet=self)
-            rule.cssText = self._tokensupto2(tokenizer, token)
+            ruletokens = self._tokensview(tokenizer, token)
+            rule.cssText = ruletokens
+            ruletokens.drain()
 
             if expected > 1:
                 self._log.error(u'CSSStylesheet: CSSImportRule not allowed '
@@ -181,9 +521,10 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
 
         def namespacerule(expected, seq, token, tokenizer):
             # parse and consume tokens in any case
-            rule = cssutils.css.CSSNamespaceRule(cssText=self._tokensupto2(tokenizer,
-                                                                           token),
+            ruletokens = self._tokensview(tokenizer, token)
+            rule = cssutils.css.CSSNamespaceRule(cssText=ruletokens,
                                                  parentStyleSheet=self)
+            ruletokens.drain()
 
             if expected > 2:
                 self._log.error(u'CSSStylesheet: CSSNamespaceRule not allowed '
@@ -206,7 +547,9 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         def variablesrule(expected, seq, token, tokenizer):
             # parse and consume tokens in any case
             rule = cssutils.css.CSSVariablesRule(parentStyleSheet=self)
-            rule.cssText = self._tokensupto2(tokenizer, token)
+            ruletokens = self._tokensview(tokenizer, token)
+            rule.cssText = ruletokens
+            ruletokens.drain()
 
             if expected > 2:
                 self._log.error(u'CSSStylesheet: CSSVariablesRule not allowed '
@@ -221,7 +564,9 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         def fontfacerule(expected, seq, token, tokenizer):
             # parse and consume tokens in any case
             rule = cssutils.css.CSSFontFaceRule(parentStyleSheet=self)
-            rule.cssText = self._tokensupto2(tokenizer, token)
+            ruletokens = self._tokensview(tokenizer, token)
+            rule.cssText = ruletokens
+            ruletokens.drain()
             if rule.wellformed:
                 self.insertRule(rule)
             return 3
@@ -229,7 +574,9 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         def mediarule(expected, seq, token, tokenizer):
             # parse and consume tokens in any case
             rule = cssutils.css.CSSMediaRule(parentStyleSheet=self)
-            rule.cssText = self._tokensupto2(tokenizer, token)
+            ruletokens = self._tokensview(tokenizer, token)
+            rule.cssText = ruletokens
+            ruletokens.drain()
             if rule.wellformed:
                 self.insertRule(rule)
             return 3
@@ -237,7 +584,9 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         def pagerule(expected, seq, token, tokenizer):
             # parse and consume tokens in any case
             rule = cssutils.css.CSSPageRule(parentStyleSheet=self)
-            rule.cssText = self._tokensupto2(tokenizer, token)
+            ruletokens = self._tokensview(tokenizer, token)
+            rule.cssText = ruletokens
+            ruletokens.drain()
             if rule.wellformed:
                 self.insertRule(rule)
             return 3
@@ -246,9 +595,10 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
             # parse and consume tokens in any case
             self._log.warn(u'CSSStylesheet: Unknown @rule found.',
                            token, neverraise=True)
-            rule = cssutils.css.CSSUnknownRule(self._tokensupto2(tokenizer,
-                                                                 token),
+            ruletokens = self._tokensview(tokenizer, token)
+            rule = cssutils.css.CSSUnknownRule(ruletokens,
                                                parentStyleSheet=self)
+            ruletokens.drain()
             if rule.wellformed:
                 self.insertRule(rule)
 
@@ -257,54 +607,121 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         def ruleset(expected, seq, token, tokenizer):
             # parse and consume tokens in any case
             rule = cssutils.css.CSSStyleRule(parentStyleSheet=self)
-            rule.cssText = self._tokensupto2(tokenizer, token)
+            ruletokens = self._tokensview(tokenizer, token)
+            rule.cssText = ruletokens
+            ruletokens.drain()
             if rule.wellformed:
                 self.insertRule(rule)
             return 3
 
-        # save for possible reset
-        oldCssRules = self.cssRules
-        oldNamespaces = self._namespaces
-
-        self.cssRules = cssutils.css.CSSRuleList()
-        # simple during parse
-        self._namespaces = namespaces
-        self._variables = CSSVariablesDeclaration()
+        def item(production):
+            "Record each item in source before parsing it."
+            def parse(expected, seq, token, tokenizer=None):
+                if stop is not None and stop(token, expected):
+                    stopped.append(token)
+                    return expected
+                source.add(token, expected, len(self._cssRules))
+                return production(expected, seq, token, tokenizer)
+            return parse
+
+        if stop is not None:
+            stopped = []
+            def tokens(tokenizer):
+                "End tokenizer if stopped."
+                for token in tokenizer:
+                    yield token
+                    if stopped:
+                        break
+            tokenizer = tokens(tokenizer)
 
         # not used?!
         newseq = []
 
+        # whitespace is not an item, the next item simply starts after it
         # ['CHARSET', 'IMPORT', ('VAR', NAMESPACE'), ('PAGE', 'MEDIA', ruleset)]
-        wellformed, expected = self._parse(0, newseq, tokenizer,
+        return self._parse(expected, newseq, tokenizer,
             {'S': S,
-             'COMMENT': COMMENT,
-             'CDO': lambda *ignored: None,
-             'CDC': lambda *ignored: None,
-             'CHARSET_SYM': charsetrule,
-             'FONT_FACE_SYM': fontfacerule,
-             'IMPORT_SYM': importrule,
-             'NAMESPACE_SYM': namespacerule,
-             'PAGE_SYM': pagerule,
-             'MEDIA_SYM': mediarule,
-             'VARIABLES_SYM': variablesrule,
-             'ATKEYWORD': unknownrule
+             'COMMENT': item(COMMENT),
+             'CDO': item(lambda *ignored: None),
+             'CDC': item(lambda *ignored: None),
+             'CHARSET_SYM': item(charsetrule),
+             'FONT_FACE_SYM': item(fontfacerule),
+             'IMPORT_SYM': item(importrule),
+             'NAMESPACE_SYM': item(namespacerule),
+             'PAGE_SYM': item(pagerule),
+             'MEDIA_SYM': item(mediarule),
+             'VARIABLES_SYM': item(variablesrule),
+             'ATKEYWORD': item(unknownrule)
              },
-             default=ruleset)
-
-        if wellformed:
-            # use proper namespace object
-            self._namespaces = _Namespaces(parentStyleSheet=self, log=self._log)
-            self._cleanNamespaces()
+             default=item(ruleset))
 
-        else:
-            # reset
-            self._cssRules = oldCssRules
-            self._namespaces = oldNamespaces
-            self._updateVariables()
-            self._cleanNamespaces()
+    def _resolveSpans(self, rules):
+        """
+        Convert the source spans of all `rules` (just parsed from the text
+        of the sheet) and their parts to ``(start, end)`` offsets. Spans of
+        top-level rules are absolute, all others are relative to the start
+        of the rule they are part of so only the top-level rules after an
+        edit need to be shifted.
+        """
+        text = self._source.text
+        newlines = []
+        def offset(position):
+            if not isinstance(position, tuple):
+                return position
+            line, col = position
+            if line == 1:
+                return col - 1
+            if not newlines:
+                newlines.extend(self._source.newlines())
+            return newlines[line - 2] + col
+
+        def resolve(part, base):
+            "Convert span of `part` relative to `base`, return its start."
+            start, last, value = part._span
+            start, end = offset(start), offset(last)
+            if text.startswith(value, end):
+                end += len(value)
+            else:
+                # unescaped, length in text is known after tokenizing again
+                tokens = self._source.tokenize(text, end)
+                tokens.next()
+                end = len(text)
+                for token in tokens:
+                    end = token[3]
+                    break
+            part._span = start - base, end - base
+            return start
 
-    cssText = property(_getCssText, _setCssText,
-            "Textual representation of the stylesheet (a byte string)")
+        def resolverule(rule, base):
+            if rule._span is None:
+                return
+            start = resolve(rule, base)
+            for selector in getattr(rule, 'selectorList', ()):
+                if selector._span is not None:
+                    resolve(selector, start)
+            style = getattr(rule, 'style', None)
+            if style is not None:
+                for property in style.getProperties(all=True):
+                    if property._span is not None:
+                        resolve(property, start)
+            for child in getattr(rule, 'cssRules', ()):
+                resolverule(child, start)
+
+        for rule in rules:
+            resolverule(rule, 0)
+
+    def _setSourceText(self, text, tokenizer, fullsheet):
+        """Set `text` the sheet has just been parsed from with `tokenizer`
+        (used by CSSParser) and convert the source spans."""
+        self._source.setText(text, tokenizer, fullsheet)
+        self._resolveSpans(self._cssRules)
+        self._dropSourceText()
+
+    def _dropSourceText(self):
+        """Replace the source by an empty one unless it should be kept, the
+        spans of all rules are kept anyway."""
+        if not self._keepSource:
+            self._source = _Source()
 
     def _resolveImport(self, url):
         """Read (encoding, enctype, decodedContent) from `url` for @import
@@ -397,6 +814,8 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         """Updates self._variables, called when @import or @variables rules
         is added to sheet.
         """
+        # resolved variables are part of the text of other rules
+        cssutils.util._TextCache.invalidate()
         for r in self.cssRules.rulesOfType(CSSRule.IMPORT_RULE):
             s = r.styleSheet
             if s:
@@ -422,6 +841,158 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         """
         return self.insertRule(rule, index=None, inOrder=True)
 
+    def applyTextEdit(self, start, end, replacement):
+        """Replace the text from offset `start` to offset `end` of the text
+        this sheet has been parsed from by `replacement` and update the
+        sheet as if the whole new text had been parsed.
+
+        Only the top-level rules (so also a whole @media rule) from the one
+        the edit starts in up to the first one which starts at the same
+        (shifted) offset as before are parsed again and replaced in
+        ``cssRules``. All other rules are kept so the time needed depends
+        on the size of the edited rules and not the size of the sheet.
+        :attr:`variables` are updated if @import or @variables rules are
+        edited.
+
+        The whole new text is parsed again if a @namespace rule is edited
+        (as it may change the meaning of all selectors) or if ``cssRules``
+        has been changed otherwise since the sheet has been parsed.
+
+        :param start:
+            offset of the first character to replace
+        :param end:
+            offset after the last character to replace, use ``start`` to
+            insert `replacement`
+        :param replacement:
+            the new text, use ``u''`` to delete the text
+        :exceptions:
+            - :exc:`~xml.dom.IndexSizeErr`:
+              Raised if `start` and `end` are not offsets in the text.
+            - :exc:`~xml.dom.InvalidStateErr`:
+              Raised if the sheet has not been parsed from a text by a
+              ``CSSParser(keepSource=True)``. Other sheets do not keep the
+              text they have been parsed from.
+            - :exc:`~xml.dom.NoModificationAllowedErr`:
+              Raised if this style sheet is readonly.
+        """
+        self._checkReadonly()
+        source = self._source
+        if source is None or source.text is None:
+            raise xml.dom.InvalidStateErr(
+                u'CSSStyleSheet: Sheet has not been parsed from a text.')
+        text = source.text
+        if not 0 <= start <= end <= len(text):
+            raise xml.dom.IndexSizeErr(
+                u'CSSStyleSheet: Invalid text range %s to %s for a text with '
+                u'a length of %s.' % (start, end, len(text)))
+        newtext = text[:start] + replacement + text[end:]
+        if source.indexes is None:
+            self.__parseAgain(newtext, source)
+            return
+
+        offsets = source.resolve()
+        # parse again from the item the edit starts in
+        first = bisect.bisect_right(offsets, start) - 1
+        if first < 0:
+            # before first item, e.g. whitespace
+            first, begin, expected, index = 0, 0, 0, 0
+        else:
+            begin = offsets[first]
+            expected = source.expected[first]
+            index = source.indexes[first]
+        if 'NAMESPACE_SYM' in source.names[first:bisect.bisect_left(
+                                                          offsets, end, first)]:
+            self.__parseAgain(newtext, source)
+            return
+
+        # until an item starts at an old item after the edit again
+        delta = len(replacement) - (end - start)
+        resync = []
+        def stop(token, expected):
+            if 'NAMESPACE_SYM' == token[0]:
+                # may only be parsed together with all other rules
+                resync.append(None)
+                return True
+            offset = token[3] - delta
+            if offset >= end:
+                i = bisect.bisect_left(offsets, offset, first)
+                if i < len(offsets) and offsets[i] == offset and\
+                   source.expected[i] == expected:
+                    resync.append(i)
+                    return True
+            return False
+
+        # parse into a new list which starts with the preceding rules as
+        # these are checked on insert, namespaces are simple during parse
+        items = _Source()
+        cssRules, namespaces = self._cssRules, self._namespaces
+        selectorIndex, self._selectorIndex = self._selectorIndex, None
+        self._namespaces = _SimpleNamespaces(self._log,
+                                             dict(namespaces.items()))
+        self._cssRules = cssutils.css.CSSRuleList()
+        list.extend(self._cssRules, cssRules[:index])
+        self._source = None
+        try:
+            self._parseItems(source.tokenize(newtext, begin), expected, items,
+                             stop)
+        except Exception, e:
+            self._cssRules, self._namespaces = cssRules, namespaces
+            self._source = source
+            self._selectorIndex = selectorIndex
+            self._variables = CSSVariablesDeclaration()
+            self._updateVariables()
+            raise
+        rules = self._cssRules[index:]
+        self._cssRules, self._namespaces = cssRules, namespaces
+        self._source = source
+        self._selectorIndex = selectorIndex
+
+        if resync:
+            last = resync[0]
+        else:
+            last = len(offsets)
+        if last is None or 'NAMESPACE_SYM' in source.names[first:last]:
+            self.__parseAgain(newtext, source)
+            return
+
+        if last < len(offsets):
+            ruleEnd = source.indexes[last]
+        else:
+            ruleEnd = len(cssRules)
+        removed = cssRules[index:ruleEnd]
+        for rule in removed:
+            rule._changed()
+        list.__setitem__(cssRules, slice(index, ruleEnd), rules)
+        for rule in removed:
+            rule._parentStyleSheet = None # detach
+        self._changed()
+        if self._selectorIndex is not None:
+            for rule in removed:
+                self._selectorIndex.remove(rule)
+            for rule in rules:
+                self._selectorIndex.add(rule)
+        source.splice(first, last, items, delta, len(rules) - len(removed))
+        source.text = newtext
+        source.ruleIndex = None
+        self._resolveSpans(rules)
+        if delta:
+            # spans of all parts are relative to their rule
+            for rule in cssRules[index + len(rules):]:
+                if rule._span is not None:
+                    rule._span = rule._span[0] + delta, rule._span[1] + delta
+
+        types = set(rule.type for rule in removed + rules)
+        if CSSRule.IMPORT_RULE in types or CSSRule.VARIABLES_RULE in types:
+            self._variables = CSSVariablesDeclaration()
+            self._updateVariables()
+
+    def __parseAgain(self, text, source):
+        "Parse the whole `text` with the settings used for `source` before."
+        tokenizer = source.tokenizer()
+        self._setCssText(tokenizer.tokenize(text, fullsheet=source.fullsheet))
+        if self._source is not source:
+            self._setSourceText(text, tokenizer, source.fullsheet)
+
     def deleteRule(self, index):
         """Delete rule at `index` from the style sheet.
 
@@ -474,8 +1045,12 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
                         u'used, cannot remove.')
                     return
 
+            rule._changed()
             rule._parentStyleSheet = None # detach
             del self._cssRules[index] # delete from StyleSheet
+            self._rulesChanged()
+            if self._selectorIndex is not None:
+                self._selectorIndex.remove(rule)
 
     def insertRule(self, rule, index=None, inOrder=False, _clean=True):
         """
@@ -746,8 +1321,9 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
         # all other where order is not important
         else:
             if inOrder:
-                # simply add to end as no specific order
-                self._cssRules.append(rule)
+                # simply add to end as no specific order, cssRules.append
+                # would call insertRule again
+                list.append(self._cssRules, rule)
                 index = len(self._cssRules) - 1
             else:
                 for r in self._cssRules[index:]:
@@ -763,6 +1339,15 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
 
         # post settings
         rule._parentStyleSheet = self
+        self._rulesChanged([rule])
+        # text of selectors depends on the namespaces of the sheet
+        if rule.MEDIA_RULE == rule.type:
+            for r in rule:
+                r._changed()
+        rule._changed()
+        self._changed()
+        if self._selectorIndex is not None:
+            self._selectorIndex.add(rule)
 
         if rule.IMPORT_RULE == rule.type and not rule.hrefFound:
             # try loading the imported sheet which has new relative href now
@@ -770,6 +1355,135 @@ class CSSStyleSheet(cssutils.stylesheets.StyleSheet):
 
         return index
 
+    def ruleAt(self, offset):
+        """Return the innermost rule which source span (see ``sourceSpan``
+        of each rule) contains `offset` of the text this sheet has been
+        parsed from, e.g. a style rule inside of an @media rule.
+
+        The spans of all rules are indexed at first use (and again after the
+        rules have been changed) so the rule is found in O(log n).
+
+        :param offset:
+            offset in the text, :meth:`applyTextEdit` keeps the rules and
+            the text in sync
+        :returns:
+            the rule or ``None`` if no rule (e.g. only whitespace) has been
+            parsed from the text at `offset` or the sheet has not been
+            parsed from a text at all
+        """
+        source = self._source
+        if source is None:
+            return None
+        if source.ruleIndex is None:
+            source.ruleIndex = self.__ruleIndex()
+        starts, ends, rules, parents = source.ruleIndex
+        i = bisect.bisect_right(starts, offset) - 1
+        while i >= 0:
+            if offset < ends[i]:
+                return rules[i]
+            i = parents[i]
+        return None
+
+    def __rulesFor(self, key):
+        if self._selectorIndex is None:
+            self._selectorIndex = _SelectorIndex(self)
+        return self._selectorIndex.get(key)
+
+    def rulesForClass(self, className):
+        """Return a list of all style rules (also those in @media rules) in
+        document order with a selector whose rightmost compound selector
+        contains class `className`, e.g. for ``u'b'`` the rules of
+        ``a .b``, ``a.b`` or ``.a.b:hover`` but not of ``.b a`` or
+        ``:not(.b)``. These are the rules which may match an element with
+        this class.
+
+        An index of all style rules is built at first use of this method,
+        :meth:`rulesForId` or :meth:`rulesForTag` (in O(n)) and then kept
+        up to date by :meth:`insertRule`, :meth:`deleteRule` (also of
+        @media rules), :meth:`applyTextEdit` and by setting ``selectorText``
+        or ``selectorList`` of a style rule or ``selectorText`` of its
+        :class:`~cssutils.css.SelectorList`. It is discarded if the whole
+        sheet or an @media rule is parsed again.
+
+        :param className:
+            name of the class without the ``.``
+        """
+        return self.__rulesFor(u'.' + className)
+
+    def rulesForId(self, id):
+        """Return a list of all style rules in document order with a
+        selector whose rightmost compound selector contains `id`, see
+        :meth:`rulesForClass`.
+
+        :param id:
+            the id without the ``#``
+        """
+        return self.__rulesFor(u'#' + id)
+
+    def rulesForTag(self, tagName):
+        """Return a list of all style rules in document order with a
+        selector whose rightmost compound selector has element name
+        `tagName` (case-insensitive), see :meth:`rulesForClass`. Compound
+        selectors without an element name like ``.a`` or ``*.a`` are found
+        for ``u'*'`` only.
+
+        :param tagName:
+            local name of the element (namespaces are not used) or ``u'*'``
+        """
+        return self.__rulesFor(tagName.lower())
+
+    def __ruleIndex(self):
+        """Return ``(starts, ends, rules, parents)`` of all rules with a
+        source span in document order, parents are the indexes of the rule
+        each rule is contained in (or -1)."""
+        starts, ends = array.array('l'), array.array('l')
+        rules, parents = [], array.array('l')
+        def add(rule, base, parent, parentEnd):
+            span = rule._span
+            if span is None or len(span) != 2:
+                return
+            start, end = base + span[0], base + span[1]
+            if starts and start < starts[-1] or end > parentEnd:
+                # not parsed from the text of this rule, ignored
+                return
+            i = len(rules)
+            starts.append(start)
+            ends.append(end)
+            rules.append(rule)
+            parents.append(parent)
+            for child in getattr(rule, 'cssRules', ()):
+                add(child, start, i, end)
+
+        for rule in self._cssRules:
+            add(rule, 0, -1, sys.maxint)
+        return starts, ends, rules, parents
+
+    def validate(self):
+        """Validate all properties of this sheet which have not been validated
+        yet because the sheet has been parsed with
+        ``CSSParser(lazyValidation=True)``. Messages are reported exactly as
+        if the properties had been validated while parsing. Imported sheets
+        are not validated.
+
+        :returns:
+            ``True`` if all properties validated now are valid
+        """
+        def styleDeclarations(base):
+            "recursive generator to find all CSSStyleDeclarations"
+            if hasattr(base, 'cssRules'):
+                for rule in base.cssRules:
+                    for s in styleDeclarations(rule):
+                        yield s
+            elif hasattr(base, 'style'):
+                yield base.style
+
+        valid = True
+        for style in styleDeclarations(self):
+            for p in style.getProperties(all=True):
+                if p.validationPending:
+                    valid = p.validate() and valid
+        return valid
+
     ownerRule = property(lambda self: self._ownerRule,
                          doc=u'A ref to an @import rule if it is imported, '
                              u'else ``None``.')
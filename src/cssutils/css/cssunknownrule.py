@@ -43,7 +43,7 @@ class CSSUnknownRule(cssrule.CSSRule):
 
     def _getCssText(self):
         """Return serialized property cssText."""
-        return cssutils.ser.do_CSSUnknownRule(self)
+        return self._cachedText('do_CSSUnknownRule')
 
     def _setCssText(self, cssText):
         """
@@ -11,6 +11,7 @@ __docformat__ = 'restructuredtext'
 __version__ = '$Id$'
 
 from cssutils.prodparser import *
+from value import _parse
 import cssutils
 import cssutils.helper
 import math
@@ -70,51 +71,12 @@ class CSSValue(cssutils.util._NewBase):
                            self.cssText, 
                            id(self))
 
-    def _setCssText(self, cssText):
-        """
-        Format::
-
-            unary_operator
-              : '-' | '+'
-              ;
-            operator
-              : '/' S* | ',' S* | /* empty */
-              ;
-            expr
-              : term [ operator term ]*
-              ;
-            term
-              : unary_operator?
-                [ NUMBER S* | PERCENTAGE S* | LENGTH S* | EMS S* | EXS S* | 
-                  ANGLE S* | TIME S* | FREQ S* ]
-              | STRING S* | IDENT S* | URI S* | hexcolor | function
-              | UNICODE-RANGE S*
-              ;
-            function
-              : FUNCTION S* expr ')' S*
-              ;
-            /*
-             * There is a constraint on the color that it must
-             * have either 3 or 6 hex-digits (i.e., [0-9a-fA-F])
-             * after the "#"; e.g., "#000" is OK, but "#abcd" is not.
-             */
-            hexcolor
-              : HASH S*
-              ;
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing, ``parent()`` returns the
+        value currently parsed (see ``cssutils.css.value._parse``)."""
+        types = cssutils.cssproductions.CSSProductions
 
-        :exceptions:
-            - :exc:`~xml.dom.SyntaxErr`:
-              Raised if the specified CSS string value has a syntax error
-              (according to the attached property) or is unparsable.
-            - :exc:`~xml.dom.InvalidModificationErr`:
-              TODO: Raised if the specified CSS string value represents a 
-              different type of values than the values allowed by the CSS 
-              property.
-            - :exc:`~xml.dom.NoModificationAllowedErr`:
-              Raised if this value is readonly.
-        """
-        self._checkReadonly()
-        
         # used as operator is , / or S
         nextSor = u',/'
         
@@ -129,7 +91,7 @@ class CSSValue(cssutils.util._NewBase):
                       PreDef.unicode_range(nextSor=nextSor),
                       # special case IE only expression
                       Prod(name='expression',
-                           match=lambda t, v: t == self._prods.FUNCTION and (
+                           match=lambda t, v: t == types.FUNCTION and (
                               cssutils.helper.normalize(v) in (u'expression(',
                                                                u'alpha(',
                                                                u'blur(',
@@ -150,7 +112,7 @@ class CSSValue(cssutils.util._NewBase):
                            toSeq=lambda t, tokens: (ExpressionValue._functionName,
                                                     ExpressionValue(
                                             cssutils.helper.pushtoken(t, tokens),
-                                            parent=self)
+                                            parent=parent())
                                                     )
                       ),
                       # CSS Variable var(
@@ -158,7 +120,7 @@ class CSSValue(cssutils.util._NewBase):
                                       toSeq=lambda t, tokens: ('CSSVariable',
                                                                CSSVariable(
                                         cssutils.helper.pushtoken(t, tokens), 
-                                        parent=self)
+                                        parent=parent())
                                                                )
                       ),
                       # calc(
@@ -166,7 +128,7 @@ class CSSValue(cssutils.util._NewBase):
                                   toSeq=lambda t, tokens: (CalcValue._functionName,
                                                            CalcValue(
                                         cssutils.helper.pushtoken(t, tokens), 
-                                        parent=self)
+                                        parent=parent())
                                                            )
                       ),
 # TODO:
@@ -189,7 +151,7 @@ class CSSValue(cssutils.util._NewBase):
                                       toSeq=lambda t, tokens: ('FUNCTION',
                                                                CSSFunction(
                                         cssutils.helper.pushtoken(t, tokens),
-                                        parent=self)
+                                        parent=parent())
                                                                )
                       )
         )
@@ -200,22 +162,66 @@ class CSSValue(cssutils.util._NewBase):
                                       toSeq=lambda t, tokens: ('operator', t[1])),
                           optional=True)
         # CSSValue PRODUCTIONS
-        valueprods = Sequence(term,
-                              Sequence(operator, # mayEnd this Sequence if whitespace
-                                                                             
-                                       # TODO: only when setting via other class
-                                       # used by variabledeclaration currently
-                                       PreDef.char('END', ';',
-                                                   stopAndKeep=True,
-                                                   optional=True),
-                                       
-                                       term,
-                                       minmax=lambda: (0, None))) 
+        return Sequence(term,
+                        Sequence(operator, # mayEnd this Sequence if whitespace
+                                                                       
+                                 # TODO: only when setting via other class
+                                 # used by variabledeclaration currently
+                                 PreDef.char('END', ';',
+                                             stopAndKeep=True,
+                                             optional=True),
+                                 
+                                 term,
+                                 minmax=lambda: (0, None)))
+
+    def _setCssText(self, cssText):
+        """
+        Format::
+
+            unary_operator
+              : '-' | '+'
+              ;
+            operator
+              : '/' S* | ',' S* | /* empty */
+              ;
+            expr
+              : term [ operator term ]*
+              ;
+            term
+              : unary_operator?
+                [ NUMBER S* | PERCENTAGE S* | LENGTH S* | EMS S* | EXS S* | 
+                  ANGLE S* | TIME S* | FREQ S* ]
+              | STRING S* | IDENT S* | URI S* | hexcolor | function
+              | UNICODE-RANGE S*
+              ;
+            function
+              : FUNCTION S* expr ')' S*
+              ;
+            /*
+             * There is a constraint on the color that it must
+             * have either 3 or 6 hex-digits (i.e., [0-9a-fA-F])
+             * after the "#"; e.g., "#000" is OK, but "#abcd" is not.
+             */
+            hexcolor
+              : HASH S*
+              ;
+
+        :exceptions:
+            - :exc:`~xml.dom.SyntaxErr`:
+              Raised if the specified CSS string value has a syntax error
+              (according to the attached property) or is unparsable.
+            - :exc:`~xml.dom.InvalidModificationErr`:
+              TODO: Raised if the specified CSS string value represents a 
+              different type of values than the values allowed by the CSS 
+              property.
+            - :exc:`~xml.dom.NoModificationAllowedErr`:
+              Raised if this value is readonly.
+        """
+        self._checkReadonly()
+
         # parse
-        wellformed, seq, store, notused = ProdParser().parse(cssText,
-                                                             u'CSSValue',
-                                                             valueprods,
-                                                             keepS=True)
+        wellformed, seq, store, notused = _parse(self, cssText, u'CSSValue',
+                                                 keepS=True)
         if wellformed:
             # - count actual values and set firstvalue which is used later on
             # - combine comma separated list, e.g. font-family to a single item
@@ -918,9 +924,10 @@ class CSSFunction(CSSPrimitiveValue):
             self.cssText = cssText
         self._readonly = readonly
     
-    def _productiondefinition(self):
+    @classmethod
+    def _productions(cls, parent):
         """Return definition used for parsing."""
-        types = self._prods # rename!
+        types = cssutils.cssproductions.CSSProductions
         
         value = Sequence(PreDef.unary(),
                          Prod(name='PrimitiveValue',
@@ -961,10 +968,9 @@ class CSSFunction(CSSPrimitiveValue):
     def _setCssText(self, cssText):
         self._checkReadonly()
         # store: colorType, parts
-        wellformed, seq, store, unusedtokens = ProdParser().parse(cssText,
-                                                                  self._functionName,
-                                                                  self._productiondefinition(),
-                                                                  keepS=True)
+        wellformed, seq, store, unusedtokens = _parse(self, cssText,
+                                                      self._functionName,
+                                                      keepS=True)
         if wellformed:
             # combine +/- and following CSSPrimitiveValue, remove S
             newseq = self._tempSeq()
@@ -1040,9 +1046,10 @@ class RGBColor(CSSFunction):
                 self.cssText,
                 id(self))
     
-    def _setCssText(self, cssText):
-        self._checkReadonly()
-        types = self._prods # rename!
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing."""
+        types = cssutils.cssproductions.CSSProductions
         valueProd = Prod(name='value',
                      match=lambda t, v: t in (types.NUMBER, types.PERCENTAGE),
                      toSeq=lambda t, v: (CSSPrimitiveValue, CSSPrimitiveValue(v)),
@@ -1062,19 +1069,21 @@ class RGBColor(CSSFunction):
                                       minmax=lambda: (2, 3)),
                              PreDef.funcEnd()
                             )
-        colorprods = Choice(funccolor,
-                            PreDef.hexcolor('colorType'),
-                            Prod(name='named color',
-                                 match=lambda t, v: t == types.IDENT,
-                                 toStore='colorType'
-                                 )
-                            )     
+        return Choice(funccolor,
+                      PreDef.hexcolor('colorType'),
+                      Prod(name='named color',
+                           match=lambda t, v: t == types.IDENT,
+                           toStore='colorType'
+                           )
+                      )
+
+    def _setCssText(self, cssText):
+        self._checkReadonly()
         # store: colorType, parts
-        wellformed, seq, store, unusedtokens = ProdParser().parse(cssText,
-                                                            u'RGBColor',
-                                                            colorprods,
-                                                            keepS=True,
-                                                            store={'parts': []})
+        wellformed, seq, store, unusedtokens = _parse(self, cssText,
+                                                      u'RGBColor',
+                                                      keepS=True,
+                                                      store={'parts': []})
         
         if wellformed:
             self.wellformed = True
@@ -1098,9 +1107,10 @@ class CalcValue(CSSFunction):
     """Calc Function"""
     _functionName = u'Function calc()'
     
-    def _productiondefinition(self):
+    @classmethod
+    def _productions(cls, parent):
         """Return defintion used for parsing."""
-        types = self._prods # rename!
+        types = cssutils.cssproductions.CSSProductions
         
         def toSeq(t, tokens):
             "Do not normalize function name!"
@@ -1111,7 +1121,7 @@ class CalcValue(CSSFunction):
                                   toSeq=toSeq
                              ),
                              Sequence(Choice(Prod(name='nested function',
-                                                  match=lambda t, v: t == self._prods.FUNCTION,
+                                                  match=lambda t, v: t == types.FUNCTION,
                                                   toSeq=lambda t, tokens: (CSSFunction._functionName,
                                                                            CSSFunction(cssutils.helper.pushtoken(t,
                                                                                                                  tokens)))
@@ -1139,9 +1149,10 @@ class ExpressionValue(CSSFunction):
     Used for expressions and ``alpha(opacity=100)`` currently."""
     _functionName = u'Expression (IE only)'
     
-    def _productiondefinition(self):
+    @classmethod
+    def _productions(cls, parent):
         """Return defintion used for parsing."""
-        types = self._prods # rename!
+        types = cssutils.cssproductions.CSSProductions
         
         def toSeq(t, tokens):
             "Do not normalize function name!"
@@ -1152,7 +1163,7 @@ class ExpressionValue(CSSFunction):
                                   toSeq=toSeq
                              ),
                              Sequence(Choice(Prod(name='nested function',
-                                                  match=lambda t, v: t == self._prods.FUNCTION,
+                                                  match=lambda t, v: t == types.FUNCTION,
                                                   toSeq=lambda t, tokens: (ExpressionValue._functionName,
                                                                            ExpressionValue(cssutils.helper.pushtoken(t,
                                                                                                                  tokens)))
@@ -1202,23 +1213,25 @@ class CSSVariable(CSSValue):
                 self.value,
                 id(self)) 
     
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing."""
+        types = cssutils.cssproductions.CSSProductions
+        
+        return Sequence(Prod(name='var',
+                             match=lambda t, v: t == types.FUNCTION 
+                        ),
+                        PreDef.ident(toStore='ident'),
+                        PreDef.funcEnd(stop=True))
+
     def _setCssText(self, cssText):
         self._checkReadonly()
 
-        types = self._prods # rename!
-        
-        funcProds = Sequence(Prod(name='var',
-                                  match=lambda t, v: t == types.FUNCTION 
-                             ),
-                             PreDef.ident(toStore='ident'),
-                             PreDef.funcEnd(stop=True))
-        
         # store: name of variable
         store = {'ident': None}
-        wellformed, seq, store, unusedtokens = ProdParser().parse(cssText,
-                                                                  u'CSSVariable',
-                                                                  funcProds,
-                                                                  keepS=True)
+        wellformed, seq, store, unusedtokens = _parse(self, cssText,
+                                                      u'CSSVariable',
+                                                      keepS=True)
         if wellformed:
             self._name = store['ident'].value
             self._setSeq(seq)
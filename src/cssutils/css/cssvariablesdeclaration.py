@@ -7,11 +7,14 @@ __version__ = '$Id: cssstyledeclaration.py 1819 2009-08-01 20:52:43Z cthedot $'
 
 from cssutils.prodparser import *
 from cssutils.helper import normalize
-from value import PropertyValue
+from value import PropertyValue, _parse
 import cssutils
 import itertools
 import xml.dom
 
+# used by setVariable
+_variableName = Sequence(PreDef.ident())
+
 class CSSVariablesDeclaration(cssutils.util._NewBase):
     """The CSSVariablesDeclaration interface represents a single block of
     variable declarations. 
@@ -52,6 +55,14 @@ class CSSVariablesDeclaration(cssutils.util._NewBase):
         return u"cssutils.css.%s(cssText=%r)" % (self.__class__.__name__,
                                                  self.cssText)
 
+    def _parentNode(self):
+        return self._parentRule
+
+    def _changed(self):
+        "Variables may be used in the text of all rules of a sheet."
+        cssutils.util._TextCache.invalidate()
+        super(CSSVariablesDeclaration, self)._changed()
+
     def __str__(self):
         return u"<cssutils.css.%s object length=%r at 0x%x>" % (
                 self.__class__.__name__,
@@ -92,6 +103,32 @@ class CSSVariablesDeclaration(cssutils.util._NewBase):
         """Return serialized property cssText."""
         return cssutils.ser.do_css_CSSVariablesDeclaration(self)
 
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing, ``parent()`` returns the
+        declaration currently parsed (see ``cssutils.css.value._parse``)."""
+        vardeclaration = Sequence(
+            PreDef.ident(),
+            PreDef.char(u':', u':', toSeq=False),
+            #PreDef.S(toSeq=False, optional=True),
+            Prod(name=u'term', match=lambda t, v: True,
+                 toSeq=lambda t, tokens: (u'value', 
+                                          PropertyValue(itertools.chain([t], 
+                                                                        tokens), 
+                                          parent=parent())
+                 )
+            )            
+        )
+        return Sequence(vardeclaration,                         
+                        Sequence(PreDef.S(optional=True),
+                                 PreDef.char(u';', u';', toSeq=False),
+                                 PreDef.S(optional=True),
+                                 vardeclaration,
+                                 minmax=lambda: (0, None)),
+                        PreDef.S(optional=True),
+                        PreDef.char(u';', u';', toSeq=False, optional=True) 
+                        )
+
     def _setCssText(self, cssText):
         """Setting this attribute will result in the parsing of the new value
         and resetting of all the properties in the declaration block
@@ -125,32 +162,9 @@ class CSSVariablesDeclaration(cssutils.util._NewBase):
         """
         self._checkReadonly()
 
-        vardeclaration = Sequence(
-            PreDef.ident(),
-            PreDef.char(u':', u':', toSeq=False),
-            #PreDef.S(toSeq=False, optional=True),
-            Prod(name=u'term', match=lambda t, v: True,
-                 toSeq=lambda t, tokens: (u'value', 
-                                          PropertyValue(itertools.chain([t], 
-                                                                        tokens), 
-                                          parent=self)
-                 )
-            )            
-        )
-        prods = Sequence(vardeclaration,                         
-                         Sequence(PreDef.S(optional=True),
-                                  PreDef.char(u';', u';', toSeq=False),
-                                  PreDef.S(optional=True),
-                                  vardeclaration,
-                                  minmax=lambda: (0, None)),
-                         PreDef.S(optional=True),
-                         PreDef.char(u';', u';', toSeq=False, optional=True) 
-                         )
         # parse
         wellformed, seq, store, notused = \
-            ProdParser().parse(cssText, 
-                               u'CSSVariableDeclaration',
-                               prods)
+            _parse(self, cssText, u'CSSVariableDeclaration')
         if wellformed:
             newseq = self._tempSeq()
             newvars = {}
@@ -245,6 +259,7 @@ class CSSVariablesDeclaration(cssutils.util._NewBase):
                         del self.seq[i]
             self.seq._readonly = True
             del self._vars[normalname]
+            self._changed()
 
         return r.cssText
 
@@ -270,7 +285,7 @@ class CSSVariablesDeclaration(cssutils.util._NewBase):
         wellformed, seq, store, unused = \
             ProdParser().parse(normalize(variableName),
                                u'variableName',
-                               Sequence(PreDef.ident()))
+                               _variableName)
         if not wellformed:
             self._log.error(u'Invalid variableName: %r: %r'
                             % (variableName, value))
@@ -303,6 +318,7 @@ class CSSVariablesDeclaration(cssutils.util._NewBase):
                     self.seq.append([variableName, v], 'var')                
                 self.seq._readonly = True
                 self._vars[variableName] = v
+                self._changed()
                 
     def item(self, index):
         """Used to retrieve the variables that have been explicitly set in
@@ -77,7 +77,7 @@ class CSSVariablesRule(cssrule.CSSRule):
 
     def _getCssText(self):
         """Return serialized property cssText."""
-        return cssutils.ser.do_CSSVariablesRule(self)
+        return self._cachedText('do_CSSVariablesRule')
 
     def _setCssText(self, cssText):
         """
@@ -183,6 +183,7 @@ class CSSVariablesRule(cssrule.CSSRule):
         else:
             variables._parentRule = self
             self._variables = variables
+        self._changed()
 
     variables = property(lambda self: self._variables, _setVariables,
                          doc=u"(DOM) The variables of this rule set, a "
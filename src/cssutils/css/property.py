@@ -6,6 +6,7 @@ __version__ = '$Id$'
 from cssutils.helper import Deprecated
 from value import PropertyValue
 import cssutils
+import logging
 import xml.dom
 
 class Property(cssutils.util.Base):
@@ -43,6 +44,13 @@ class Property(cssutils.util.Base):
           ;
 
     """
+    __slots__ = ('seqs', 'wellformed', '_mediaQuery', '_parent',
+                 '__nametoken', '_name', '_literalname', '_priority',
+                 '_literalpriority', '_validationPending', '_span')
+
+    # set by CSSParser(lazyValidation=True) while parsing
+    _lazyValidation = False
+
     def __init__(self, name=None, value=None, priority=u'',
                  _mediaQuery=False, parent=None):
         """
@@ -64,10 +72,12 @@ class Property(cssutils.util.Base):
         self.wellformed = False
         self._mediaQuery = _mediaQuery
         self.parent = parent
+        self._span = None
 
         self.__nametoken = None
         self._name = u''
         self._literalname = u''
+        self._validationPending = False
         self.seqs[1] = PropertyValue(parent=self)
         if name:
             self.name = name
@@ -108,6 +118,8 @@ class Property(cssutils.util.Base):
             - :exc:`~xml.dom.NoModificationAllowedErr`:
               Raised if the rule is readonly.
         """
+        if not self._mediaQuery:
+            self._span = self._tokensSpan(cssText)
         # check and prepare tokenlists for setting
         tokenizer = self._tokenize2(cssText)
         nametokens = self._tokensupto2(tokenizer, propertynameendonly=True)
@@ -153,7 +165,11 @@ class Property(cssutils.util.Base):
                 self.priority = prioritytokens
 
                 # also invalid values are set!
-                self.validate()
+                if self._lazyValidation:
+                    # done on first access of valid or sheet.validate()
+                    self._validationPending = True
+                else:
+                    self.validate()
 
         else:
             self._log.error(u'Property: No property name found: %r.' %
@@ -209,6 +225,7 @@ class Property(cssutils.util.Base):
             self._literalname = new['literalname']
             self._name = self._normalize(self._literalname)
             self.seqs[0] = newseq
+            self._changed()
 
 #            # validate
             if self._name not in cssutils.profile.knownNames:
@@ -245,6 +262,7 @@ class Property(cssutils.util.Base):
         """
         if self._mediaQuery and not cssText:
             self.seqs[1] = PropertyValue(parent=self)
+            self._changed()
         else:
             self.seqs[1].cssText = cssText
             self.wellformed = self.wellformed and self.seqs[1].wellformed
@@ -347,6 +365,7 @@ class Property(cssutils.util.Base):
             self._literalpriority = new['literalpriority']
             self._priority = self._normalize(self.literalpriority)
             self.seqs[2] = newseq
+            self._changed()
             # validate priority
             if self._priority not in (u'', u'important'):
                 self._log.error(u'Property: No CSS priority value: %r.' %
@@ -358,6 +377,9 @@ class Property(cssutils.util.Base):
     literalpriority = property(lambda self: self._literalpriority,
         doc="Readonly literal (not normalized) priority of this property")
 
+    def _parentNode(self):
+        return self._parent
+
     def _setParent(self, parent):
         self._parent = parent
 
@@ -365,6 +387,11 @@ class Property(cssutils.util.Base):
         doc="The Parent Node (normally a CSSStyledeclaration) of this "
             "Property")
 
+    sourceSpan = property(lambda self: self._getSourceSpan(
+                              getattr(self.parent, 'parentRule', None)),
+        doc="``(start, end)`` offsets of this Property in the text of its "
+            "style sheet or ``None`` if it has not been parsed as part of it.")
+
     def validate(self):
         """Validate value against `profiles` which are checked dynamically.
         properties in e.g. @font-face rules are checked against
@@ -421,7 +448,12 @@ class Property(cssutils.util.Base):
             ERROR   Property: Invalid value for "CSS Color Module Level 3/CSS Level 2.1" property: 4 [3:9: color]
             WARNING Property: Not valid for profile "CSS Level 2.1" but valid "CSS Color Module Level 3" value: rgba(1, 2, 3, 4)  [4:9: color]
             DEBUG   Property: Found valid "CSS Level 2.1" value: red [5:9: color]
+
+        If parsed with ``CSSParser(lazyValidation=True)`` this is not done
+        while parsing but on first access of :attr:`valid` or by
+        :meth:`~cssutils.css.CSSStyleSheet.validate` of the sheet.
         """
+        self._validationPending = False
         valid = False
 
         profiles = None
@@ -436,9 +468,9 @@ class Property(cssutils.util.Base):
                     profiles = [cssutils.profile.CSS3_FONT_FACE]
                 #TODO: same for @page
 
-        if self.name and self.value:
+        cv = self.propertyValue
+        if self.name and cv.length:
             
-            cv = self.propertyValue
             # TODO
 #            if cv.cssValueType == cv.CSS_VARIABLE and not cv.value:
 #                # TODO: false alarms too! 
@@ -449,7 +481,7 @@ class Property(cssutils.util.Base):
                 # add valid, matching, validprofiles...
                 valid, matching, validprofiles = \
                     cssutils.profile.validateWithProfile(self.name,
-                                                         self.value,
+                                                         cv,
                                                          profiles)
 
                 if not valid:
@@ -473,7 +505,8 @@ class Property(cssutils.util.Base):
                                    neverraise=True)
                     valid = False
 
-                elif valid:
+                elif self._log.getEffectiveLevel() <= logging.DEBUG:
+                    # value serialized only if needed
                     self._log.debug(u'Property: Found valid "%s" value: %s'
                                    % (u'/'.join(validprofiles), self.value),
                                    token = self.__nametoken,
@@ -487,6 +520,10 @@ class Property(cssutils.util.Base):
     valid = property(validate, doc=u"Check if value of this property is valid "
                                    u"in the properties context.")
 
+    validationPending = property(lambda self: self._validationPending,
+        doc=u"``True`` if parsed with ``CSSParser(lazyValidation=True)`` and "
+            u"not validated yet.")
+
 
     @Deprecated(u'Use ``property.propertyValue`` instead.')
     def _getCSSValue(self):
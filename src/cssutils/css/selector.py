@@ -99,6 +99,9 @@ class Selector(cssutils.util.Base2):
           ;
 
     """
+    __slots__ = ('_seq', '_readonly', '__namespaces', '_element', '_parent',
+                 '_specificity', '_span')
+
     def __init__(self, selectorText=None, parent=None,
                  readonly=False):
         """
@@ -116,6 +119,7 @@ class Selector(cssutils.util.Base2):
         self._element = None
         self._parent = parent
         self._specificity = (0, 0, 0, 0)
+        self._span = None
         
         if selectorText:
             self.selectorText = selectorText
@@ -138,6 +142,9 @@ class Selector(cssutils.util.Base2):
                                               self._getUsedNamespaces(),
                                               id(self))
 
+    def _parentNode(self):
+        return self._parent
+
     def _getUsedUris(self):
         "Return list of actually used URIs in this Selector."
         uris = set()
@@ -180,6 +187,12 @@ class Selector(cssutils.util.Base2):
                       doc=u"(DOM) The SelectorList that contains this Selector "
                           u"or None if this Selector is not attached to a "
                           u"SelectorList.")
+
+    sourceSpan = property(lambda self: self._getSourceSpan(
+                              getattr(self.parent, 'parentRule', None)),
+                          doc=u"``(start, end)`` offsets of this Selector in "
+                              u"the text of its style sheet or ``None`` if it "
+                              u"has not been parsed as part of it.")
                 
     def _getSelectorText(self):
         """Return serialized format."""
@@ -206,6 +219,7 @@ class Selector(cssutils.util.Base2):
         
         # might be (selectorText, namespaces)
         selectorText, namespaces = self._splitNamespacesOff(selectorText)
+        self._span = self._tokensSpan(selectorText)
 
         try:
             # uses parent stylesheets namespaces if available, 
@@ -784,6 +798,10 @@ class Selector(cssutils.util.Base2):
                 self._setSeq(newseq)
                 # filter that only used ones are kept
                 self.__namespaces = self._getUsedNamespaces()
+                if self._parent is not None and \
+                   self._parent.parentRule is not None:
+                    # update the index of the sheet like SelectorList does
+                    self._parent.parentRule._selectorsChanged()
 
     selectorText = property(_getSelectorText, _setSelectorText,
                             doc=u"(DOM) The parsable textual representation of "
@@ -67,6 +67,12 @@ class SelectorList(cssutils.util.Base, cssutils.util.ListSeq):
         newSelector = self.__prepareset(newSelector)
         if newSelector:
             self.seq[index] = newSelector
+            self.__changed()
+
+    def __delitem__(self, index):
+        "Overwrite ListSeq.__delitem__"
+        del self.seq[index]
+        self.__changed()
 
     def __prepareset(self, newSelector, namespaces=None):
         "Used by appendSelector and __setitem__"
@@ -92,6 +98,9 @@ class SelectorList(cssutils.util.Base, cssutils.util.ListSeq):
                 namespaces.update(selector._namespaces)
             return namespaces
 
+    def _parentNode(self):
+        return self._parentRule
+
     def _getUsedUris(self):
         "Used by CSSStyleSheet to check if @namespace rules are needed"
         uris = set()
@@ -149,6 +158,7 @@ class SelectorList(cssutils.util.Base, cssutils.util.ListSeq):
                 if s.selectorText != newSelector.selectorText:
                     self.seq.append(s)
             self.seq.append(newSelector)
+            self.__changed()
             return newSelector
 
     def _getSelectorText(self):
@@ -216,6 +226,12 @@ class SelectorList(cssutils.util.Base, cssutils.util.ListSeq):
                             self._valuestr(selectorText))
         if wellformed:
             self.seq = newseq
+            self.__changed()
+
+    def __changed(self):
+        "Selectors have been changed."
+        if self._parentRule is not None:
+            self._parentRule._selectorsChanged()
 
     selectorText = property(_getSelectorText, _setSelectorText,
                             doc=u"(cssutils) The textual representation of the "
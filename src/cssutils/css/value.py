@@ -36,6 +36,8 @@ class PropertyValue(cssutils.util._NewBase):
     - get a Value item by index or use ``PropertyValue[index]``
     - find out the number of values defined (unstructured)
     """
+    __slots__ = ('_seq', '_readonly', 'parent', 'wellformed')
+
     def __init__(self, cssText=None, parent=None, readonly=False):
         """
         :param cssText:
@@ -69,6 +71,9 @@ class PropertyValue(cssutils.util._NewBase):
         for item in self.__items():
             yield item
             
+    def _parentNode(self):
+        return self.parent
+
     def __repr__(self):
         return u"cssutils.css.%s(%r)" % (self.__class__.__name__,
                                          self.cssText)
@@ -83,7 +88,42 @@ class PropertyValue(cssutils.util._NewBase):
         if seq is None:
             seq = self.seq
         return (x.value for x in seq if isinstance(x.value, Value))
-    
+
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing, ``parent()`` returns the
+        value currently parsed (see ``_parse``)."""
+        # used as operator is , / or S
+        nextSor = u',/'
+        term = Choice(_ColorProd(parent, nextSor),
+                      _DimensionProd(parent, nextSor),
+                      _URIProd(parent, nextSor),
+                      _ValueProd(parent, nextSor),
+#                      _CalcValueProd(parent, nextSor),
+#                      _Rect(parent, nextSor),
+                      # all other functions
+                      _CSSVariableProd(parent, nextSor),
+                      _MSValueProd(parent, nextSor),
+                      _CSSFunctionProd(parent, nextSor)
+                      )
+        operator = Choice(PreDef.S(toSeq=False),
+                          PreDef.char('comma', ',',
+                                      toSeq=lambda t, tokens: ('operator', t[1])),
+                          PreDef.char('slash', '/',
+                                      toSeq=lambda t, tokens: ('operator', t[1])),
+                          optional=True)
+        return Sequence(term,
+                        Sequence(# mayEnd this Sequence if whitespace
+                                 operator,
+                                 # TODO: only when setting via other class
+                                 # used by variabledeclaration currently
+                                 PreDef.char('END', ';',
+                                             stopAndKeep=True,
+                                             optional=True),
+                                 # TODO: } and !important ends too!
+                                 term,
+                                 minmax=lambda: (0, None)))
+
     def _setCssText(self, cssText):
         if type(cssText) in (int, float):
                 cssText = unicode(cssText) # if it is a number
@@ -130,41 +170,9 @@ class PropertyValue(cssutils.util._NewBase):
               Raised if this value is readonly.
         """
         self._checkReadonly()
-        
-        # used as operator is , / or S
-        nextSor = u',/'
-        term = Choice(_ColorProd(self, nextSor),
-                      _DimensionProd(self, nextSor),
-                      _URIProd(self, nextSor),
-                      _ValueProd(self, nextSor),
-#                      _CalcValueProd(self, nextSor),
-#                      _Rect(self, nextSor),
-                      # all other functions
-                      _CSSVariableProd(self, nextSor),
-                      _MSValueProd(self, nextSor),
-                      _CSSFunctionProd(self, nextSor)                      
-                      )
-        operator = Choice(PreDef.S(toSeq=False),
-                          PreDef.char('comma', ',',
-                                      toSeq=lambda t, tokens: ('operator', t[1])),
-                          PreDef.char('slash', '/',
-                                      toSeq=lambda t, tokens: ('operator', t[1])),
-                          optional=True)
-        prods = Sequence(term,
-                         Sequence(# mayEnd this Sequence if whitespace
-                                  operator, 
-                                  # TODO: only when setting via other class
-                                  # used by variabledeclaration currently
-                                  PreDef.char('END', ';',
-                                              stopAndKeep=True,
-                                              optional=True),
-                                  # TODO: } and !important ends too!
-                                  term,
-                                  minmax=lambda: (0, None))) 
+
         # parse
-        ok, seq, store, unused = ProdParser().parse(cssText,
-                                                    u'PropertyValue',
-                                                    prods)
+        ok, seq, store, unused = _parse(self, cssText, u'PropertyValue')
         # must be at least one value!
         ok = ok and len(list(self.__items(seq))) > 0
         if ok:
@@ -222,17 +230,27 @@ class Value(cssutils.util._NewBase):
     FUNCTION = u'FUNCTION'
     VARIABLE = u'VARIABLE'
     
-    _type = None
-    _value = u''
-    
+    __slots__ = ('_seq', '_readonly', 'parent', 'wellformed', '_type',
+                 '_value')
+
     def __init__(self, cssText=None, parent=None, readonly=False):
         super(Value, self).__init__()
         
         self.parent = parent
+        self._type = None
+        self._value = u''
+        self._setDefaults()
         
         if cssText:
             self.cssText = cssText
 
+    def _setDefaults(self):
+        "Set initial values of attributes of subclasses before parsing."
+        pass
+
+    def _parentNode(self):
+        return self.parent
+
     def __repr__(self):
         return u"cssutils.css.%s(%r)" % (self.__class__.__name__,
                                          self.cssText)
@@ -243,15 +261,20 @@ class Value(cssutils.util._NewBase):
                   self.type, self.value, self.cssText,
                   id(self))
 
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing, ``parent()`` returns the
+        value currently parsed (see ``_parse``)."""
+        return Choice(PreDef.hexcolor(stop=True),
+                      PreDef.ident(stop=True),
+                      PreDef.string(stop=True),
+                      PreDef.unicode_range(stop=True),
+                      )
+
     def _setCssText(self, cssText):
         self._checkReadonly()
-
-        prods = Choice(PreDef.hexcolor(stop=True),
-                       PreDef.ident(stop=True),
-                       PreDef.string(stop=True),
-                       PreDef.unicode_range(stop=True),
-                       )
-        ok, seq, store, unused = ProdParser().parse(cssText, u'Value', prods)
+        
+        ok, seq, store, unused = _parse(self, cssText, u'Value')
         if ok:
             # only 1 value anyway!
             self._type = seq[0].type
@@ -272,6 +295,7 @@ class Value(cssutils.util._NewBase):
     def _setValue(self, value):
         # TODO: check!
         self._value = value
+        self._changed()
 
     value = property(lambda self: self._value, _setValue, 
                      doc=u"Actual value if possible: An int or float or else "
@@ -286,11 +310,11 @@ class ColorValue(Value):
     """
     type = Value.COLOR_VALUE
     # hexcolor, FUNCTION?
-    _colorType = None
-    _red = 0
-    _green = 0
-    _blue = 0
-    _alpha = 0
+    __slots__ = ('_colorType', '_red', '_green', '_blue', '_alpha')
+
+    def _setDefaults(self):
+        self._colorType = None
+        self._red = self._green = self._blue = self._alpha = 0
     
     COLORS = {u'transparent': (0,0,0, 0),
               u'black': (0,0,0, 1.0),
@@ -319,21 +343,23 @@ class ColorValue(Value):
                   self.colorType, self.red, self.green, self.blue, self.alpha,
                   id(self))
     
-    def _setCssText(self, cssText):
-        self._checkReadonly()
-        types = self._prods # rename!
-
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing, ``parent()`` returns the
+        value currently parsed (see ``_parse``)."""
+        types = cls._prods # rename!
+        
         component = Choice(PreDef.unary(toSeq=lambda t, tokens: (t[0], 
                             DimensionValue(pushtoken(t, tokens),
-                            parent=self)
+                            parent=parent())
                            )),
                            PreDef.number(toSeq=lambda t, tokens: (t[0], 
                             DimensionValue(pushtoken(t, tokens),
-                            parent=self)
+                            parent=parent())
                            )),
                            PreDef.percentage(toSeq=lambda t, tokens: (t[0], 
                             DimensionValue(pushtoken(t, tokens),
-                            parent=self)
+                            parent=parent())
                            ))
                    )
         noalp = Sequence(Prod(name='FUNCTION',
@@ -362,18 +388,19 @@ class ColorValue(Value):
                           )
         namedcolor = Prod(name='Named Color',
                      match=lambda t, v: t == 'IDENT' and (
-                                        normalize(v) in self.COLORS.keys()
+                                        normalize(v) in parent().COLORS
                                         ),
                      stop=True)
-        
-        prods = Choice(PreDef.hexcolor(stop=True), 
-                       namedcolor, 
-                       noalp, 
-                       witha)
-        
-        ok, seq, store, unused = ProdParser().parse(cssText, 
-                                                    self.type,
-                                                    prods)
+
+        return Choice(PreDef.hexcolor(stop=True), 
+                      namedcolor, 
+                      noalp, 
+                      witha)
+
+    def _setCssText(self, cssText):
+        self._checkReadonly()
+
+        ok, seq, store, unused = _parse(self, cssText, self.type)
         if ok:
             t, v = seq[0].type, seq[0].value
             if u'IDENT' == t:
@@ -382,8 +409,8 @@ class ColorValue(Value):
                 if len(v) == 4:
                     # HASH #rgb
                     rgba = (int(2*v[1], 16),
-                            int(2*v[1], 16),
-                            int(2*v[1], 16), 
+                            int(2*v[2], 16),
+                            int(2*v[3], 16), 
                             1.0)
                 else:
                     # HASH #rrggbb
@@ -468,8 +495,10 @@ class DimensionValue(Value):
     Covers DIMENSION, PERCENTAGE or NUMBER values.
     """
     __reNumDim = re.compile(ur'^(\d*\.\d+|\d+)(.*)$', re.I | re.U | re.X)
-    _dimension = None
-    _sign = None
+    __slots__ = ('_dimension', '_sign')
+
+    def _setDefaults(self):
+        self._dimension = self._sign = None
     
     def __str__(self):
         return u"<cssutils.css.%s object type=%s value=%r dimension=%r cssText=%r at 0x%x>"\
@@ -477,18 +506,21 @@ class DimensionValue(Value):
                   self.type, self.value, self.dimension, self.cssText,
                   id(self))
 
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing, ``parent()`` returns the
+        value currently parsed (see ``_parse``)."""
+        return Sequence(PreDef.unary(),
+                        Choice(PreDef.dimension(stop=True),
+                               PreDef.number(stop=True),
+                               PreDef.percentage(stop=True)
+                               )
+                        )
+
     def _setCssText(self, cssText):
         self._checkReadonly()
 
-        prods = Sequence(PreDef.unary(),
-                         Choice(PreDef.dimension(stop=True),
-                                PreDef.number(stop=True),
-                                PreDef.percentage(stop=True)
-                                )
-                         )     
-        ok, seq, store, unused = ProdParser().parse(cssText, 
-                                                    u'DimensionValue', 
-                                                    prods)
+        ok, seq, store, unused = _parse(self, cssText, u'DimensionValue')
         if ok:
             sign = val = u''
             dim = type_ = None
@@ -529,8 +561,10 @@ class URIValue(Value):
     """
     An URI value like ``url(example.png)``.
     """
-    _type = Value.URI
-    _uri = Value._value
+    __slots__ = ()
+
+    def _setDefaults(self):
+        self._type = Value.URI
     
     def __str__(self):
         return u"<cssutils.css.%s object type=%s value=%r uri=%r cssText=%r at 0x%x>"\
@@ -538,12 +572,16 @@ class URIValue(Value):
                   self.type, self.value, self.uri, self.cssText,
                   id(self))
 
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing, ``parent()`` returns the
+        value currently parsed (see ``_parse``)."""
+        return Sequence(PreDef.uri(stop=True))
+
     def _setCssText(self, cssText):
         self._checkReadonly()
 
-        prods = Sequence(PreDef.uri(stop=True))
-                       
-        ok, seq, store, unused = ProdParser().parse(cssText, u'URIValue', prods)
+        ok, seq, store, unused = _parse(self, cssText, u'URIValue')
         if ok:
             # only 1 value only anyway
             self._type = seq[0].type
@@ -559,6 +597,7 @@ class URIValue(Value):
     def _setUri(self, uri):
         # TODO: check?
         self._value = uri
+        self._changed()
         
     uri = property(lambda self: self._value, _setUri, 
                          doc=u"Actual URL without delimiters or the empty string")
@@ -569,18 +608,21 @@ class CSSFunction(Value):
     A function value.
     """
     _functionName = 'Function'
+    __slots__ = ()
     
-    def _productions(self):
-        """Return definition used for parsing."""
-        types = self._prods # rename!
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing, ``parent()`` returns the
+        value currently parsed (see ``_parse``)."""
+        types = cls._prods # rename!
         
-        itemProd = Choice(_ColorProd(self),
-                          _DimensionProd(self),
-                          _URIProd(self),
-                          _ValueProd(self),
-                          #_CalcValueProd(self),
-                          _CSSVariableProd(self),
-                          _CSSFunctionProd(self)
+        itemProd = Choice(_ColorProd(parent),
+                          _DimensionProd(parent),
+                          _URIProd(parent),
+                          _ValueProd(parent),
+                          #_CalcValueProd(parent),
+                          _CSSVariableProd(parent),
+                          _CSSFunctionProd(parent)
                           )
         funcProds = Sequence(Prod(name='FUNCTION',
                                   match=lambda t, v: t == types.FUNCTION,
@@ -597,9 +639,7 @@ class CSSFunction(Value):
     
     def _setCssText(self, cssText):
         self._checkReadonly()
-        ok, seq, store, unused = ProdParser().parse(cssText, 
-                                                    self.type,
-                                                    self._productions())
+        ok, seq, store, unused = _parse(self, cssText, self.type)
         if ok:
             self._setSeq(seq)
             self.wellformed = ok
@@ -618,18 +658,21 @@ class MSValue(CSSFunction):
     """An IE specific Microsoft only function value which is much looser 
     in what is syntactically allowed."""
     _functionName = 'MSValue'
+    __slots__ = ()
     
-    def _productions(self):
-        """Return definition used for parsing."""
-        types = self._prods # rename!
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing, ``parent()`` returns the
+        value currently parsed (see ``_parse``)."""
+        types = cls._prods # rename!
         
         func = Prod(name='MSValue-Sub',
-                    match=lambda t, v: t == self._prods.FUNCTION,
+                    match=lambda t, v: t == types.FUNCTION,
                     toSeq=lambda t, tokens: (MSValue._functionName, 
                                      MSValue(pushtoken(t, 
                                                                        tokens
                                                                        ),
-                                            parent=self
+                                            parent=parent()
                                             )
                                          )
                     )
@@ -639,15 +682,15 @@ class MSValue(CSSFunction):
                                   match=lambda t, v: t == types.FUNCTION,
                                   toSeq=lambda t, tokens: (t[0], t[1])
                                   ),
-                             Sequence(Choice(_ColorProd(self),
-                                             _DimensionProd(self),
-                                             _URIProd(self),
-                                             _ValueProd(self),
-                                             _MSValueProd(self),
-                                             #_CalcValueProd(self),
-                                             _CSSVariableProd(self),
+                             Sequence(Choice(_ColorProd(parent),
+                                             _DimensionProd(parent),
+                                             _URIProd(parent),
+                                             _ValueProd(parent),
+                                             _MSValueProd(parent),
+                                             #_CalcValueProd(parent),
+                                             _CSSVariableProd(parent),
                                              func,
-                                             #_CSSFunctionProd(self),
+                                             #_CSSFunctionProd(parent),
                                              Prod(name='MSValuePart',
                                                   match=lambda t, v: v != u')',
                                                   toSeq=lambda t, tokens: (t[0], t[1])
@@ -674,28 +717,32 @@ class CSSVariable(CSSFunction):
     tried to be resolved from any available CSSVariablesRule definition.
     """
     _functionName = 'CSSVariable'
-    _name = None
+    __slots__ = ('_name',)
+
+    def _setDefaults(self):
+        self._name = None
 
     def __str__(self):
         return u"<cssutils.css.%s object name=%r value=%r at 0x%x>" % (
                 self.__class__.__name__, self.name, self.value, id(self)) 
     
+    @classmethod
+    def _productions(cls, parent):
+        """Return definition used for parsing, ``parent()`` returns the
+        value currently parsed (see ``_parse``)."""
+        types = cls._prods # rename!
+        return Sequence(Prod(name='var',
+                                 match=lambda t, v: t == types.FUNCTION and
+                                       normalize(v) == u'var(' 
+                            ),
+                            PreDef.ident(toStore='ident'),
+                            PreDef.funcEnd(stop=True))
+
     def _setCssText(self, cssText):
         self._checkReadonly()
 
-        types = self._prods # rename!
-        prods = Sequence(Prod(name='var',
-                                  match=lambda t, v: t == types.FUNCTION and
-                                        normalize(v) == u'var(' 
-                             ),
-                             PreDef.ident(toStore='ident'),
-                             PreDef.funcEnd(stop=True))
-        
         # store: name of variable
-        store = {'ident': None}
-        ok, seq, store, unused = ProdParser().parse(cssText, 
-                                                    u'CSSVariable',
-                                                    prods)
+        ok, seq, store, unused = _parse(self, cssText, u'CSSVariable')
         if ok:
             self._name = store['ident'].value
             self._setSeq(seq)
@@ -736,6 +783,36 @@ class CSSVariable(CSSFunction):
                      doc=u'The resolved actual value or None.')
 
 
+# productions of each value class, see _parse
+_shared = {}
+
+def _parse(value, cssText, name, keepS=False, store=None):
+    """
+    Parse `cssText` for `value` with the productions of its class and return
+    the result of ``ProdParser.parse`` (`keepS` and `store` are passed on).
+    Used for any other class which defines ``_productions(parent)`` too.
+
+    The productions are built (and compiled by ProdParser) once per class
+    by ``_productions(parent)`` and reused, ``parent()`` returns the value
+    currently parsed. Parses of the same class may be nested (like a
+    function in a function) so these values are kept in a stack.
+    """
+    cls = type(value)
+    try:
+        productions, parsed = _shared[cls]
+    except KeyError:
+        parsed = []
+        productions = cls._productions(lambda: parsed[-1])
+        _shared[cls] = productions, parsed
+
+    parsed.append(value)
+    try:
+        return ProdParser().parse(cssText, name, productions, keepS=keepS,
+                                  store=store)
+    finally:
+        parsed.pop()
+
+
 # helper for productions
 def _ValueProd(parent, nextSor=False):
     return Prod(name='Value',
@@ -744,7 +821,7 @@ def _ValueProd(parent, nextSor=False):
                 toSeq=lambda t, tokens: ('Value', Value(
                                             pushtoken(t, 
                                                                       tokens),
-                                         parent=parent)
+                                         parent=parent())
                                          )
                 )
 
@@ -758,7 +835,7 @@ def _DimensionProd(parent, nextSor=False):
                 toSeq=lambda t, tokens: (t[0], DimensionValue(
                                             pushtoken(t, 
                                                                       tokens),
-                                         parent=parent)
+                                         parent=parent())
                                          )
                 )
 
@@ -769,7 +846,7 @@ def _URIProd(parent, nextSor=False):
                 toSeq=lambda t, tokens: ('URIValue', URIValue(
                                             pushtoken(t, 
                                                                       tokens),
-                                         parent=parent)
+                                         parent=parent())
                                          )
                 )
     
@@ -788,7 +865,7 @@ def _ColorProd(parent, nextSor=False):
                 toSeq=lambda t, tokens: ('ColorValue', ColorValue(
                                             pushtoken(t, 
                                                                       tokens),
-                                         parent=parent)
+                                         parent=parent())
                                          )
                 )
     
@@ -797,7 +874,7 @@ def _CSSFunctionProd(parent, nextSor=False):
                            toSeq=lambda t, tokens: (CSSFunction._functionName, 
                                                     CSSFunction(
                                 pushtoken(t, tokens),
-                                parent=parent)
+                                parent=parent())
                                 )
                            )
 
@@ -806,7 +883,7 @@ def _CSSVariableProd(parent, nextSor=False):
                            toSeq=lambda t, tokens: (CSSVariable._functionName, 
                                                     CSSVariable(
                                 pushtoken(t, tokens), 
-                                parent=parent)
+                                parent=parent())
                                                     )
                            )  
     
@@ -834,7 +911,7 @@ def _MSValueProd(parent, nextSor=False):
                                          MSValue(pushtoken(t, 
                                                                            tokens
                                                                            ),
-                                                 parent=parent
+                                                 parent=parent()
                                                  )
                                          )
                 )
\ No newline at end of file
@@ -18,6 +18,7 @@ __all__ = ['ErrorHandler']
 __docformat__ = 'restructuredtext'
 __version__ = '$Id$'
 
+from tokenize2 import linecol
 import logging
 import urllib2
 import xml.dom
@@ -81,6 +82,7 @@ class _ErrorHandler(object):
             if token:
                 if isinstance(token, tuple):
                     value, line, col = token[1], token[2], token[3]
+                    line, col = linecol(line, col)
                 else:
                     value, line, col = token.value, token.line, token.col
                 msg = u'%s [%s:%s: %s]' % (
@@ -100,6 +102,10 @@ class _ErrorHandler(object):
         """set log of errorhandler's log"""
         self._log = log
 
+    def __reduce__(self):
+        "pickled as a reference to the global ErrorHandler"
+        return (ErrorHandler, ())
+
 
 class ErrorHandler(_ErrorHandler):
     "Singleton, see _ErrorHandler"
@@ -32,8 +32,85 @@ class Deprecated(object):
         newFunc.__dict__.update(func.__dict__)
         return newFunc
 
+# strings shared by _intern()
+_interned = {}
+# only short strings are interned and only a limited number of them
+_INTERN_MAXLENGTH = 32
+_INTERN_MAXSIZE = 20000
+# normalize() interns its results, set by CSSParser(internValues=...)
+_internValues = True
+
+def _intern(x):
+    """
+    Return the string equal to `x` which has been interned before or
+    intern `x` itself. Identifiers and other short values are repeated many
+    times in style sheets, interned they all share a single object.
+
+    Only unicode strings are interned, others and strings longer than 32
+    chars are returned unchanged. The table is never cleared and nothing is
+    ever evicted: once 20000 strings have been interned (all kept for the
+    lifetime of the process) no new ones are added and further strings are
+    returned unchanged.
+    """
+    if type(x) is not unicode:
+        return x
+    try:
+        return _interned[x]
+    except KeyError:
+        if len(x) <= _INTERN_MAXLENGTH and len(_interned) < _INTERN_MAXSIZE:
+            _interned[x] = x
+        return x
+
+# how often each path of normalize() and of the unicode escape
+# substitution of the tokenizer is taken, reset with resetStats(), only
+# counted if countStats is set (e.g. by the "normalize" benchmark)
+stats = {}
+countStats = False
+
+def resetStats():
+    """
+    Reset all counters in ``stats`` to 0:
+
+    normalize.memo
+        normalized value found in the memo of ``normalize``
+    normalize.plain
+        value without any backslash normalized by simply lowercasing it
+    normalize.escaped
+        value with a backslash normalized by removing escapes first
+    unicodesub.plain
+        token value without any backslash used unchanged by the tokenizer
+    unicodesub.escaped
+        token value with a backslash which unicode escapes were replaced
+    """
+    for key in ('normalize.memo', 'normalize.plain', 'normalize.escaped',
+                'unicodesub.plain', 'unicodesub.escaped'):
+        stats[key] = 0
+
+resetStats()
+
+# memo of normalize() in two generations: new results are added to
+# _normalized, if it is full it replaces _normalizedOld (so the least
+# recently used are dropped) and results found there are added again
+_normalized = {}
+_normalizedOld = {}
+_NORMALIZE_MAXSIZE = 10000 # of both together
+
 # simple escapes, all non unicodes
 _simpleescapes = re.compile(ur'(\\[^0-9a-fA-F])').sub    
+def _removeescape(matchobj):
+    return matchobj.group(0)[1:]
+
+def _normalize(x):
+    "Return `x` without simple escapes and lowercased."
+    if u'\\' in x:
+        if countStats:
+            stats['normalize.escaped'] += 1
+        return _simpleescapes(_removeescape, x).lower()
+    else:
+        if countStats:
+            stats['normalize.plain'] += 1
+        return x.lower()
+
 def normalize(x):
     """
     normalizes x, namely:
@@ -42,14 +119,38 @@ def normalize(x):
       x=="c\olor\" return "color" (unicode escape sequences should have
       been resolved by the tokenizer already)
     - lowercase
+
+    A normalized unicode string is kept in a memo of at most 10000 values
+    (the least recently used are removed) so the same names are normalized
+    only once. Unless turned off with ``CSSParser(internValues=False)``
+    while parsing it is interned too (see ``_intern``).
     """
-    if x:
-        def removeescape(matchobj):
-            return matchobj.group(0)[1:]
-        x = _simpleescapes(removeescape, x)
-        return x.lower()
-    else:
+    global _normalized, _normalizedOld
+    if not x:
         return x
+    elif type(x) is unicode:
+        try:
+            result = _normalized[x]
+        except KeyError:
+            try:
+                # used again so kept
+                result = _normalizedOld[x]
+            except KeyError:
+                result = _normalize(x)
+                if _internValues:
+                    result = _intern(result)
+            else:
+                if countStats:
+                    stats['normalize.memo'] += 1
+            if len(_normalized) >= _NORMALIZE_MAXSIZE // 2:
+                _normalizedOld, _normalized = _normalized, {}
+            _normalized[x] = result
+        else:
+            if countStats:
+                stats['normalize.memo'] += 1
+        return result
+    else:
+        return _normalize(x)
 
 def path2url(path):
     """Return file URL of `path`"""
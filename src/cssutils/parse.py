@@ -5,12 +5,65 @@ __docformat__ = 'restructuredtext'
 __version__ = '$Id$'
 
 from helper import path2url
+import StringIO
 import codecs
+import collections
+import cssproductions
 import cssutils
+import logging
 import os
 import tokenize2
 import urllib
 
+# collects messages of a single sheet parsed by parseMany
+_parseManyLog = logging.getLogger('CSSUTILS.parseMany')
+_parseManyLog.propagate = False
+
+# parser used by each parseMany worker process
+_workerParser = None
+
+def _initWorker(settings, loglevel):
+    "Initialize parseMany worker process, each uses a single parser."
+    global _workerParser
+    cssutils.log.setLevel(loglevel)
+    _workerParser = CSSParser(**settings)
+
+def _parseWorker(args):
+    "Parse a single sheet in a parseMany worker process."
+    return _parseCollectingLog(_workerParser, *args)
+
+def _parseCollectingLog(parser, source, files, encoding, serialize):
+    """
+    Parse `source` with `parser` and return ``(result, messages)`` where 
+    messages is a list of all messages logged while parsing. Any exception
+    is caught and reported in messages with result ``None``.
+    """
+    stream = StringIO.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(levelname)s\t%(message)s'))
+    oldlog = cssutils.log._log
+    _parseManyLog.setLevel(oldlog.getEffectiveLevel())
+    _parseManyLog.addHandler(handler)
+    cssutils.log.setLog(_parseManyLog)
+    try:
+        try:
+            if files:
+                sheet = parser.parseFile(source, encoding=encoding)
+            else:
+                sheet = parser.parseString(source, encoding=encoding)
+            if serialize:
+                result = sheet.cssText
+            else:
+                result = sheet
+        except Exception, e:
+            _parseManyLog.error(u'%s: %s' % (e.__class__.__name__, e))
+            result = None
+    finally:
+        cssutils.log.setLog(oldlog)
+        _parseManyLog.removeHandler(handler)
+    return result, stream.getvalue().splitlines()
+
+
 class CSSParser(object):
     """Parse a CSS StyleSheet from URL, string or file and return a DOM Level 2
     CSS StyleSheet object.
@@ -24,7 +77,9 @@ class CSSParser(object):
         print sheet.cssText
     """
     def __init__(self, log=None, loglevel=None, raiseExceptions=None,
-                 fetcher=None, parseComments=True):
+                 fetcher=None, parseComments=True, lazyLineCol=False,
+                 cache=None, lazyValidation=False, internValues=True,
+                 keepSource=False):
         """
         :param log:
             logging object
@@ -38,6 +93,30 @@ class CSSParser(object):
             see ``setFetcher(fetcher)``
         :param parseComments:
             if comments should be added to CSS DOM or simply omitted
+        :param lazyLineCol:
+            if ``True`` the tokenizer records only the offset of each token
+            and line and col are computed only if needed (e.g. for a log
+            message or if requested via ``Item.line`` and ``Item.col``)
+            which is a bit faster if these are not used at all
+        :param cache:
+            a :class:`cssutils.cache.SheetCache` (or any object with the
+            same ``key``, ``get`` and ``set`` methods) to lookup parsed
+            sheets in before actually parsing them, default is no cache
+        :param lazyValidation:
+            if ``True`` properties are not validated while parsing but on
+            first access of ``Property.valid`` or if
+            ``CSSStyleSheet.validate()`` is called, useful if validation
+            results are not needed at all
+        :param internValues:
+            if ``True`` (default) identifiers, hashes, numbers and
+            dimensions as well as normalized names are interned (see
+            ``cssutils.helper._intern``) so that values repeated in a sheet
+            share a single string which saves memory for large sheets
+        :param keepSource:
+            if ``True`` parsed sheets keep the text they have been parsed
+            from (and the positions of their top-level rules) which is
+            needed by ``CSSStyleSheet.applyTextEdit``, default is ``False``
+            as the text is pickled together with the sheet too
         """
         if log is not None:
             cssutils.log.setLog(log)
@@ -52,17 +131,63 @@ class CSSParser(object):
             # DEFAULT during parse
             self.__parseRaising = False
 
-        self.__tokenizer = tokenize2.Tokenizer(doComments=parseComments)
+        self.__parseComments = parseComments
+        self.__lazyLineCol = lazyLineCol
+        self.__cache = cache
+        self.__lazyValidation = lazyValidation
+        self.__internValues = internValues
+        self.__keepSource = keepSource
+        # settings to create the parsers used by parseMany
+        self.__settings = dict(raiseExceptions=raiseExceptions,
+                               parseComments=parseComments,
+                               lazyLineCol=lazyLineCol,
+                               cache=cache,
+                               lazyValidation=lazyValidation,
+                               internValues=internValues,
+                               keepSource=keepSource)
+        self.__tokenizer = tokenize2.Tokenizer(doComments=parseComments,
+                                               lazyLineCol=lazyLineCol,
+                                               internValues=internValues)
         self.setFetcher(fetcher)
 
     def __parseSetting(self, parse):
         """during parse exceptions may be handled differently depending on
-        init parameter ``raiseExceptions``
+        init parameter ``raiseExceptions`` and properties may not be
+        validated depending on ``lazyValidation``, names are normalized
+        with or without interning depending on ``internValues``
         """
         if parse:
             cssutils.log.raiseExceptions = self.__parseRaising
+            cssutils.css.Property._lazyValidation = self.__lazyValidation
+            cssutils.helper._internValues = self.__internValues
         else:
             cssutils.log.raiseExceptions = self.__globalRaising
+            cssutils.css.Property._lazyValidation = False
+            cssutils.helper._internValues = True
+
+    def __cacheSettings(self, sheet, encoding):
+        """Return tuple of all settings which may change the result of
+        parsing into `sheet`, used for the cache key."""
+        fetcher = self.__fetcher
+        if fetcher is not None:
+            # by name as the repr of a function contains its address
+            fetcher = (getattr(fetcher, '__module__', None),
+                       getattr(fetcher, '__name__',
+                               fetcher.__class__.__name__))
+        return (cssutils.VERSION,
+                encoding,
+                sheet.href,
+                sheet.media.mediaText,
+                sheet.title,
+                self.__parseRaising,
+                fetcher,
+                self.__parseComments,
+                self.__lazyLineCol,
+                self.__lazyValidation,
+                self.__keepSource,
+                cssproductions._DXImageTransform in cssproductions.PRODUCTIONS,
+                tuple(cssutils.profile.defaultProfiles or ()),
+                tuple(sorted(cssutils.profile.profiles)))
 
     def parseString(self, cssText, encoding=None, href=None, media=None,
                     title=None):
@@ -88,20 +213,52 @@ class CSSParser(object):
             The ``title`` attribute to assign to the parsed style sheet.
         :returns:
             :class:`~cssutils.css.CSSStyleSheet`.
+
+        If the parser uses a cache a sheet is looked up there first using
+        a hash of the decoded `cssText`, the other parameters and the
+        parser and global settings (e.g. ``parseComments``,
+        ``raiseExceptions``, the name of the fetcher, the
+        ``DXImageTransform.Microsoft`` setting and the names of the
+        validation profiles) as key. Sheets with @import rules are not
+        cached.
         """
         self.__parseSetting(True)
+        try:
+            return self.__parseString(cssText, encoding, href, media, title)
+        finally:
+            # also if an error has been raised
+            self.__parseSetting(False)
+
+    def __parseString(self, cssText, encoding, href, media, title):
+        "Parse with the parse settings in effect, see parseString."
         if isinstance(cssText, str):
             cssText = codecs.getdecoder('css')(cssText, encoding=encoding)[0]
 
         sheet = cssutils.css.CSSStyleSheet(href=href,
                                            media=cssutils.stylesheets.MediaList(media),
                                            title=title)
+        if self.__cache is not None:
+            key = self.__cache.key(cssText, 
+                                   self.__cacheSettings(sheet, encoding))
+            cached = self.__cache.get(key)
+            if cached is not None:
+                cached._setFetcher(self.__fetcher)
+                return cached
+
         sheet._setFetcher(self.__fetcher)
+        sheet._keepSource = self.__keepSource
         # tokenizing this ways closes open constructs and adds EOF
         sheet._setCssTextWithEncodingOverride(self.__tokenizer.tokenize(cssText,
                                                                         fullsheet=True),
                                               encodingOverride=encoding)
-        self.__parseSetting(False)
+        if sheet._source is not None:
+            # text for CSSStyleSheet.applyTextEdit and source spans
+            sheet._setSourceText(cssText, self.__tokenizer, fullsheet=True)
+        if self.__cache is not None and not [
+                rule for rule in sheet.cssRules
+                if rule.type == rule.IMPORT_RULE]:
+            # imported sheets may be changed without changing the key
+            self.__cache.set(key, sheet)
         return sheet
 
     def parseFile(self, filename, encoding=None,
@@ -159,6 +316,59 @@ class CSSParser(object):
             return self.parseString(text, encoding=encoding,
                                     href=href, media=media, title=title)
 
+    def parseMany(self, sources, files=False, encoding=None, processes=None,
+                  serialize=False):
+        """Parse all `sources` in a pool of `processes` worker processes.
+        Each worker uses its own parser with the same settings as this one
+        (including the fetcher which therefore should be picklable).
+
+        :param sources:
+            iterable of CSS strings to parse or filenames if `files` is
+            ``True``
+        :param files:
+            if `sources` are filenames
+        :param encoding:
+            used for all sources, see ``parseString`` and ``parseFile``
+        :param processes:
+            number of worker processes, ``None`` uses the number of CPUs
+            and ``0`` parses in the current process without a pool
+        :param serialize:
+            if ``True`` yield the serialized ``cssText`` of each sheet
+            instead of the sheet itself which would be pickled to get it
+            from a worker process
+        :returns:
+            a generator yielding ``(source, result, messages)`` for each
+            of `sources` in order. `result` is a
+            :class:`~cssutils.css.CSSStyleSheet` (or its cssText) or
+            ``None`` if parsing failed. `messages` is a list of all
+            messages logged while parsing this source which are not
+            logged to ``cssutils.log``.
+        """
+        tasks = ((source, files, encoding, serialize) for source in sources)
+        if processes == 0:
+            for task in tasks:
+                result, messages = _parseCollectingLog(self, *task)
+                yield task[0], result, messages
+        else:
+            import multiprocessing
+            settings = dict(self.__settings, fetcher=self.__fetcher)
+            pool = multiprocessing.Pool(processes, _initWorker, 
+                                        (settings, 
+                                         cssutils.log.getEffectiveLevel()))
+            try:
+                # tasks are consumed by the pool, so remember sources again
+                sources = collections.deque()
+                def track(tasks):
+                    for task in tasks:
+                        sources.append(task[0])
+                        yield task
+                for result, messages in pool.imap(_parseWorker, track(tasks)):
+                    yield sources.popleft(), result, messages
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+
     def setFetcher(self, fetcher=None):
         """Replace the default URL fetch function with a custom one.
         
@@ -18,6 +18,7 @@ __all__ = ['ProdParser', 'Sequence', 'Choice', 'Prod', 'PreDef']
 __docformat__ = 'restructuredtext'
 __version__ = '$Id: parse.py 1418 2008-08-09 19:27:50Z cthedot $'
 
+from tokenize2 import linecol
 import cssutils
 import sys
 
@@ -43,6 +44,24 @@ class NoMatch(ParseError):
     pass
 
 
+def _nextProd(prods, token):
+    """
+    Return the next Prod, Sequence or Choice of Sequence or Choice `prods`
+    matching `token` and reset it, see their ``nextProd``. The state is
+    kept in ``prods._frame``, the table is compiled once like for
+    ProdParser.
+    """
+    try:
+        table = prods._table
+    except AttributeError:
+        table = prods._table = _Table(prods)
+    n = table.step(prods._frame, token)
+    if n is not None:
+        prod = table.nodes[n]
+        prod.reset()
+        return prod
+
+
 class Choice(object):
     """A Choice of productions (Sequence or single Prod)."""
 
@@ -69,7 +88,7 @@ class Choice(object):
 
     def reset(self):
         """Start Choice from zero"""
-        self._exhausted = False
+        self._frame = [0, False, 0, False]
 
     def matches(self, token):
         """Check if token matches"""
@@ -88,21 +107,7 @@ class Choice(object):
         - raise Exhausted if choice already done
 
         ``token`` may be None but this occurs when no tokens left."""
-        if not self._exhausted:
-            optional = False
-            for x in self._prods:
-                if x.matches(token):
-                    self._exhausted = True
-                    x.reset()
-                    return x
-                elif x.optional:
-                    optional = True
-            else:
-                if not optional:
-                    # None matched but also None is optional
-                    raise ParseError(u'No match in %s' % self)
-        elif token:
-            raise Exhausted(u'Extra token')
+        return _nextProd(self, token)
 
     def __str__(self):
         return u'Choice(%s)' % u', '.join([str(x) for x in self._prods])
@@ -134,7 +139,6 @@ class Sequence(object):
                 # py<2.6
                 self._max = sys.maxint
 
-        self._prodcount = len(self._prods)
         self.reset()
 
     def matches(self, token):
@@ -151,18 +155,7 @@ class Sequence(object):
 
     def reset(self):
         """Reset this Sequence if it is nested."""
-        self._roundstarted = False
-        self._i = 0
-        self._round = 0
-
-    def _currentName(self):
-        """Return current element of Sequence, used by name"""
-        # TODO: current impl first only if 1st if an prod!
-        for prod in self._prods[self._i:]:
-            if not prod.optional:
-                return str(prod)
-        else:
-            return 'Sequence'
+        self._frame = [0, 0, 0, False]
 
     optional = property(lambda self: self._min == 0)
 
@@ -173,43 +166,7 @@ class Sequence(object):
         - raises ParseError if nothing matches
         - raises Exhausted if sequence already done
         """
-        while self._round < self._max:
-            # for this round
-            i = self._i
-            round = self._round
-            p = self._prods[i]
-            if i == 0:
-                self._roundstarted = False
-
-            # for next round
-            self._i += 1
-            if self._i == self._prodcount:
-                self._round += 1
-                self._i = 0
-
-            if p.matches(token):
-                self._roundstarted = True
-                # reset nested Choice or Prod to use from start
-                p.reset()
-                return p
-
-            elif p.optional:
-                continue
-
-            elif round < self._min:
-                raise Missing(u'Missing token for production %s' % p)
-
-            elif not token:
-                if self._roundstarted:
-                    raise Missing(u'Missing token for production %s' % p)
-                else:
-                    raise Done()
-
-            else:
-                raise NoMatch(u'No matching production for token')
-
-        if token:
-            raise Exhausted(u'Extra token')
+        return _nextProd(self, token)
 
     def __str__(self):
         return u'Sequence(%s)' % u', '.join([str(x) for x in self._prods])
@@ -298,6 +255,270 @@ class Prod(object):
                 self.__class__.__name__, self._name, id(self))
 
 
+class _Table(object):
+    """
+    A production tree (of Sequence, Choice and Prod objects) compiled for
+    ProdParser. Each object of the tree is a node number and all data
+    needed while parsing is stored in lists indexed by node. Sequence and
+    Choice objects themselves only define the productions.
+
+    The table itself is never changed by parsing, the state of each nested
+    Sequence or Choice is kept by ProdParser in a frame
+    ``[node, index, round, roundstarted]`` (a Choice uses ``index`` as its
+    exhausted flag). So a table may be used by any number of parses, even
+    nested ones. ``nextProd`` of Sequence and Choice keeps the frame of
+    its root node only, see ``step``.
+    """
+    PROD, SEQUENCE, CHOICE = range(3)
+
+    def __init__(self, productions):
+        self.nodes = [] # the tree objects, used for messages
+        self.kinds = []
+        self.children = []
+        self.optional = []
+        self.minmax = []
+        self.match = []
+        # Prods which are tried if a node matches a token
+        self.first = []
+        self._add(productions, {})
+
+    def _add(self, obj, numbers):
+        "Add `obj` and its children if not present yet, return its number."
+        try:
+            return numbers[id(obj)]
+        except KeyError:
+            n = numbers[id(obj)] = len(self.nodes)
+
+        self.nodes.append(obj)
+        self.optional.append(obj.optional)
+        if isinstance(obj, Prod):
+            self.kinds.append(self.PROD)
+            self.children.append(())
+            self.minmax.append(None)
+            self.match.append(obj.match)
+            self.first.append((n,))
+            return n
+
+        for x in (self.kinds, self.children, self.minmax, self.match,
+                  self.first):
+            x.append(None)
+        children = tuple([self._add(p, numbers) for p in obj._prods])
+        first = []
+        for c in children:
+            for leaf in self.first[c]:
+                if leaf not in first:
+                    first.append(leaf)
+            if isinstance(obj, Sequence) and not self.optional[c]:
+                break
+        if isinstance(obj, Sequence):
+            self.kinds[n] = self.SEQUENCE
+            self.minmax[n] = (obj._min, obj._max)
+        else:
+            self.kinds[n] = self.CHOICE
+        self.children[n] = children
+        self.first[n] = tuple(first)
+        return n
+
+    def find(self, frames, token, last):
+        """
+        Return the number of the Prod matching `token`, searched from the
+        innermost frame of `frames`. Nested Sequences and Choices found are
+        pushed to, finished ones popped from `frames`. ``last[0]`` is set to
+        each Sequence, Choice or Prod found (or None).
+
+        Raises Missing if a mandatory production is missing and ParseError
+        if nothing matches.
+        """
+        nodes, kinds, children = self.nodes, self.kinds, self.children
+        optional, first, match = self.optional, self.first, self.match
+        CHOICE, PROD = self.CHOICE, self.PROD
+        type_, val = token[0], token[1]
+        # result of each Prod, computed once for this token
+        hits = [None] * len(nodes)
+
+        while True:
+            frame = frames[-1]
+            n = frame[0]
+            found = None
+            if kinds[n] == CHOICE:
+                if not frame[1]:
+                    anyoptional = False
+                    for c in children[n]:
+                        hit = False
+                        for leaf in first[c]:
+                            hit = hits[leaf]
+                            if hit is None:
+                                hit = hits[leaf] = bool(match[leaf](type_, val))
+                            if hit:
+                                break
+                        if hit:
+                            frame[1] = True
+                            found = c
+                            break
+                        elif optional[c]:
+                            anyoptional = True
+                    else:
+                        if not anyoptional:
+                            # None matched but also None is optional
+                            raise ParseError(u'No match in %s' % nodes[n])
+            else:
+                prods = children[n]
+                count = len(prods)
+                min_, max_ = self.minmax[n]
+                while frame[2] < max_:
+                    # for this round
+                    i, round = frame[1], frame[2]
+                    c = prods[i]
+                    if i == 0:
+                        frame[3] = False
+
+                    # for next round
+                    frame[1] = i + 1
+                    if frame[1] == count:
+                        frame[2] += 1
+                        frame[1] = 0
+
+                    hit = False
+                    for leaf in first[c]:
+                        hit = hits[leaf]
+                        if hit is None:
+                            hit = hits[leaf] = bool(match[leaf](type_, val))
+                        if hit:
+                            break
+                    if hit:
+                        frame[3] = True
+                        found = c
+                        break
+                    elif optional[c]:
+                        continue
+                    elif round < min_:
+                        raise Missing(u'Missing token for production %s' %
+                                      nodes[c])
+                    else:
+                        # no match
+                        break
+
+            if found is None:
+                # nested exhausted, try in parent
+                last[0] = None
+                if len(frames) > 1:
+                    frames.pop()
+                else:
+                    raise ParseError('No match')
+            else:
+                last[0] = nodes[found]
+                if kinds[found] == PROD:
+                    return found
+                # nested Sequence, Choice
+                frames.append([found, 0, 0, False])
+
+    def _hit(self, n, token):
+        "Return True if `token` matches any first Prod of node `n`."
+        if token:
+            type_, val = token[0], token[1]
+            for leaf in self.first[n]:
+                if self.match[leaf](type_, val):
+                    return True
+        return False
+
+    def step(self, frame, token):
+        """
+        Return the number of the child of the Sequence or Choice of `frame`
+        matching `token` or None, nested Sequences and Choices are not
+        searched. Used by ``nextProd`` of Sequence and Choice.
+
+        Raises Exhausted if `frame` is finished but `token` is given, Done if
+        it is finished and no `token` is given, Missing if a mandatory
+        production is missing and NoMatch or ParseError if nothing matches.
+        """
+        n = frame[0]
+        prods = self.children[n]
+        if self.kinds[n] == self.CHOICE:
+            if frame[1]:
+                if token:
+                    raise Exhausted(u'Extra token')
+                return None
+            optional = False
+            for c in prods:
+                if self._hit(c, token):
+                    frame[1] = True
+                    return c
+                elif self.optional[c]:
+                    optional = True
+            if not optional:
+                # None matched but also None is optional
+                raise ParseError(u'No match in %s' % self.nodes[n])
+            return None
+
+        min_, max_ = self.minmax[n]
+        while frame[2] < max_:
+            # for this round
+            i, round = frame[1], frame[2]
+            c = prods[i]
+            if i == 0:
+                frame[3] = False
+
+            # for next round
+            frame[1] = i + 1
+            if frame[1] == len(prods):
+                frame[2] += 1
+                frame[1] = 0
+
+            if self._hit(c, token):
+                frame[3] = True
+                return c
+            elif self.optional[c]:
+                continue
+            elif round < min_:
+                raise Missing(u'Missing token for production %s' %
+                              self.nodes[c])
+            elif not token:
+                if frame[3]:
+                    raise Missing(u'Missing token for production %s' %
+                                  self.nodes[c])
+                else:
+                    raise Done()
+            else:
+                raise NoMatch(u'No matching production for token')
+
+        if token:
+            raise Exhausted(u'Extra token')
+
+    def finish(self, frame):
+        """
+        Check if the Sequence or Choice of `frame` may end as no tokens are
+        left. Raises Missing if a mandatory production is missing or
+        ParseError if a Choice has not been used but must be.
+        """
+        n = frame[0]
+        if self.kinds[n] == self.CHOICE:
+            if not frame[1] and not [c for c in self.children[n]
+                                     if self.optional[c]]:
+                raise ParseError(u'No match in %s' % self.nodes[n])
+            return
+
+        prods = self.children[n]
+        min_, max_ = self.minmax[n]
+        while frame[2] < max_:
+            i, round = frame[1], frame[2]
+            c = prods[i]
+            if i == 0:
+                frame[3] = False
+            frame[1] = i + 1
+            if frame[1] == len(prods):
+                frame[2] += 1
+                frame[1] = 0
+
+            if self.optional[c]:
+                continue
+            elif round < min_ or frame[3]:
+                raise Missing(u'Missing token for production %s' %
+                              self.nodes[c])
+            else:
+                # done
+                return
+
+
 # global tokenizer as there is only one!
 tokenizer = cssutils.tokenize2.Tokenizer()
 
@@ -414,7 +635,13 @@ class ProdParser(object):
         seq = cssutils.util.Seq(readonly=False)
         if not store: # store for specific values
             store = {}
-        prods = [productions] # stack of productions
+        try:
+            table = productions._table
+        except AttributeError:
+            # compile once
+            table = productions._table = _Table(productions)
+        frames = [[0, 0, 0, False]] # stack of productions
+        last = [None]
         wellformed = True
 
         # while no real token is found any S are ignored
@@ -448,7 +675,8 @@ class ProdParser(object):
             elif type_ == self.types.INVALID:
                 # invalidate parse
                 wellformed = False
-                self._log.error(u'Invalid token: %r' % (token,))
+                self._log.error(u'Invalid token: %r' % (
+                                token[:2] + linecol(line, col),))
                 break
             elif type_ == 'EOF':
                 # do nothing? (self.types.EOF == True!)
@@ -458,28 +686,13 @@ class ProdParser(object):
                 nextSor = False # reset
 
                 try:
-                    while True:
-                        # find next matching production
-                        try:
-                            prod = prods[-1].nextProd(token)
-                        except (Exhausted, NoMatch), e:
-                            # try next
-                            prod = None
-                        if isinstance(prod, Prod):
-                            # found actual Prod, not a Choice or Sequence
-                            break
-                        elif prod:
-                            # nested Sequence, Choice
-                            prods.append(prod)
-                        else:
-                            # nested exhausted, try in parent
-                            if len(prods) > 1:
-                                prods.pop()
-                            else:
-                                raise ParseError('No match')
+                    # find next matching production
+                    prod = table.nodes[table.find(frames, token, last)]
                 except ParseError, e:
+                    prod = last[0]
                     wellformed = False
-                    self._log.error(u'%s: %s: %r' % (name, e, token))
+                    self._log.error(u'%s: %s: %r' % (
+                                    name, e, token[:2] + linecol(line, col)))
                     break
                 else:                    
                     # process prod
@@ -516,38 +729,20 @@ class ProdParser(object):
             while True:
                 # all productions exhausted?
                 try:
-                    prod = prods[-1].nextProd(token=None)
-                except Done, e:
-                    # ok
-                    prod = None
-    
+                    table.finish(frames[-1])
                 except Missing, e:
-                    prod = None
                     # last was a S operator which may End a Sequence, then ok
                     if hasattr(lastprod, 'mayEnd') and not lastprod.mayEnd:
                         wellformed = False
                         self._log.error(u'%s: %s' % (name, e))
     
                 except ParseError, e:
-                    prod = None
                     wellformed = False
                     self._log.error(u'%s: %s' % (name, e))
     
-                else:
-                    if prods[-1].optional:
-                        prod = None
-                    elif prod and prod.optional:
-                        # ignore optional
-                        continue
-    
-                if prod and not prod.optional:
-                    wellformed = False
-                    self._log.error(u'%s: Missing token for production %r'
-                                    % (name, str(prod)))
-                    break
-                elif len(prods) > 1:
+                if len(frames) > 1:
                     # nested exhausted, next in parent
-                    prods.pop()
+                    frames.pop()
                 else:
                     break
 
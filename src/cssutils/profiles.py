@@ -7,7 +7,10 @@ __all__ = ['Profiles']
 __docformat__ = 'restructuredtext'
 __version__ = '$Id: cssproperties.py 1116 2008-03-05 13:52:23Z cthedot $'
 
+import cssutils
 import re
+import sre_constants
+import sre_parse
 
 class NoSuchProfileException(Exception):
     """Raised if no profile with given name is found"""
@@ -43,6 +46,24 @@ class Profiles(object):
 
     If you want to redefine any of these macros do this in your custom
     macros.
+
+    All validators of a property are indexed by its name. Before a regex
+    is used a value is checked against a few cheap prefilters like the set
+    of valid keywords or the characters a valid value may start with.
+
+    Property definitions given as regexes are compiled to also match the
+    values of a :class:`~cssutils.css.PropertyValue` directly which is used
+    if such an object is validated. Only if this match fails (or cannot be
+    done) the value is serialized and matched against the regex so the
+    result is always the same but most values need not be serialized.
+
+    Results of :meth:`validate` and :meth:`validateWithProfile` are
+    memoized as real sheets repeat the same property values very often.
+    At most :attr:`cacheSize` results are kept (least recently used ones
+    are removed first), set it to ``0`` to disable the memo. It is cleared
+    automatically if profiles are added or removed or if
+    :attr:`defaultProfiles` are changed. The attributes ``hits`` and
+    ``misses`` count lookups in the memo.
     """
     CSS_LEVEL_2 = u'CSS Level 2.1'
     CSS3_BACKGROUNDS_AND_BORDERS = u'CSS Backgrounds and Borders Module Level 3'
@@ -91,13 +112,20 @@ class Profiles(object):
         'shadow': '(inset)?{w}{length}{w}{length}{w}{length}?{w}{length}?{w}{color}?'
         }
 
-    def __init__(self, log=None):
+    def __init__(self, log=None, cacheSize=10000):
         """A few known profiles are predefined."""
         self._log = log
         self._profileNames = [] # to keep order, REFACTOR!
         self._profiles = {}
+        self._validators = {}
+        self._index = {}
         self._defaultProfiles = None
 
+        self.cacheSize = cacheSize
+        self.hits = self.misses = 0
+        self._cache = {} # {key: [lastused, result]}
+        self._cacheTick = 0
+
         self.addProfile(self.CSS_LEVEL_2,
                         properties[self.CSS_LEVEL_2],
                         macros[self.CSS_LEVEL_2])
@@ -158,6 +186,41 @@ class Profiles(object):
         self._knownNames = []
         for properties in self._profiles.values():
             self._knownNames.extend(properties.keys())
+        # {name: [(profile, validator), ...]} in order of profiles
+        self._index = {}
+        for profile in self._profileNames:
+            for name, validator in self._validators[profile].items():
+                self._index.setdefault(name, []).append((profile, validator))
+        self._cache.clear()
+        # validity of properties may be used while serializing
+        cssutils.util._TextCache.invalidate()
+
+    def _cached(self, key, count=True):
+        """Return memoized result for `key` or ``None``, counted as hit or
+        miss unless `count` is ``False``."""
+        try:
+            entry = self._cache[key]
+        except KeyError:
+            if count:
+                self.misses += 1
+            return None
+        if count:
+            self.hits += 1
+        self._cacheTick += 1
+        entry[0] = self._cacheTick
+        return entry[1]
+
+    def _memoize(self, key, result):
+        "Keep `result` for `key`, remove least recently used if full."
+        if not self.cacheSize:
+            return
+        if len(self._cache) >= self.cacheSize:
+            # remove oldest half at once so this is not done too often
+            entries = sorted(self._cache.items(), key=lambda e: e[1][0])
+            for k, entry in entries[:len(entries) // 2 + 1]:
+                del self._cache[k]
+        self._cacheTick += 1
+        self._cache[key] = [self._cacheTick, result]
 
     def _getDefaultProfiles(self):
         "If not explicitly set same as Profiles.profiles but in reverse order."
@@ -172,6 +235,7 @@ class Profiles(object):
             self._defaultProfiles = (profiles,)
         else:
             self._defaultProfiles = profiles
+        self._cache.clear()
 
     defaultProfiles = property(_getDefaultProfiles,
                                _setDefaultProfiles,
@@ -215,9 +279,22 @@ class Profiles(object):
         m = Profiles._TOKEN_MACROS.copy()
         m.update(Profiles._MACROS)
         m.update(macros)
-        properties = self._expand_macros(properties, m)
+        expanded = self._expand_macros(dict(properties), m)
         self._profileNames.append(profile)
-        self._profiles[profile] = self._compile_regexes(properties)
+        self._profiles[profile] = self._compile_regexes(dict(expanded))
+        validators = {}
+        for name, definition in properties.items():
+            match = self._profiles[profile][name]
+            if hasattr(definition, '__call__'):
+                validators[name] = _Validator(match)
+            else:
+                try:
+                    grammar = _Grammar(definition, m, self._expand_macros)
+                except (ValueError, re.error):
+                    # validated by regex only
+                    grammar = None
+                validators[name] = _Validator(match, expanded[name], grammar)
+        self._validators[profile] = validators
 
         self.__update_knownNames()
 
@@ -234,10 +311,12 @@ class Profiles(object):
         """
         if all:
             self._profiles.clear()
+            self._validators.clear()
             del self._profileNames[:]
         else:
             try:
                 del self._profiles[profile]
+                del self._validators[profile]
                 del self._profileNames[self._profileNames.index(profile)]
             except KeyError:
                 raise NoSuchProfileException(u'No profile %r.' % profile)
@@ -269,21 +348,35 @@ class Profiles(object):
         :param name:
             a property name
         :param value:
-            a CSS value (string)
+            a CSS value (string) or a
+            :class:`~cssutils.css.PropertyValue`
         :returns:
             if the `value` is valid for the given property `name` in any
             profile
         """
-        for profile in self.profiles:
-            if name in self._profiles[profile]:
-                try:
-                    # custom validation errors are caught
-                    r = bool(self._profiles[profile][name](value))
-                except Exception, e:
-                    self._log.error(e, error=Exception)
-                    return False
-                if r:
-                    return r
+        if not isinstance(value, basestring):
+            units = _units(value)
+            if units is not None and self._match(name, units, self.profiles):
+                return True
+            value = value.value
+
+        key = (name, value, None)
+        r = self._cached(key)
+        if r is not None:
+            return r
+
+        for profile, validator in self._index.get(name, ()):
+            try:
+                # custom validation errors are caught
+                r = bool(validator(value))
+            except Exception, e:
+                # not memoized so the error is reported again
+                self._log.error(e, error=Exception)
+                return False
+            if r:
+                self._memoize(key, r)
+                return r
+        self._memoize(key, False)
         return False
 
     def validateWithProfile(self, name, value, profiles=None):
@@ -293,7 +386,8 @@ class Profiles(object):
         :param name:
             a property name
         :param value:
-            a CSS value (string)
+            a CSS value (string) or a
+            :class:`~cssutils.css.PropertyValue`
         :param profiles:
             internal parameter used by Property.validate only
         :returns:
@@ -309,7 +403,7 @@ class Profiles(object):
             >>> print cssutils.profile.validateWithProfile('color', 'rgba(1,1,1,1)')
             (True, False, Profiles.CSS3_COLOR)
         """
-        if name not in self.knownNames:
+        if name not in self._index:
             return False, False, []
         else:
             if not profiles:
@@ -317,34 +411,519 @@ class Profiles(object):
             elif isinstance(profiles, basestring):
                 profiles = (profiles, )
 
-            for profilename in profiles:
-                # check given profiles
-                if name in self._profiles[profilename]:
-                    validate = self._profiles[profilename][name]
-                    try:
-                        if validate(value):
-                            return True, True, [profilename]
-                    except Exception, e:
-                        self._log.error(e, error=Exception)
-
-            for profilename in (p for p in self._profileNames
-                                if p not in profiles):
-                # check remaining profiles as well
-                if name in self._profiles[profilename]:
-                    validate = self._profiles[profilename][name]
-                    try:
-                        if validate(value):
-                            return True, False, [profilename]
-                    except Exception, e:
-                        self._log.error(e, error=Exception)
-
-            names = []
-            for profilename, properties in self._profiles.items():
-                # return profile to which name belongs
-                if name in properties.keys():
-                    names.append(profilename)
-            names.sort()
-            return False, False, names
+            result = None
+            if not isinstance(value, basestring):
+                units = _units(value)
+                if units is not None:
+                    # counted once by the lookup below if not matched
+                    key = (name, units, tuple(profiles))
+                    result = self._cached(key, count=False)
+                    if result is not None:
+                        self.hits += 1
+                    else:
+                        result = self._match(name, units, profiles)
+                        if result is not None:
+                            self.misses += 1
+                            self._memoize(key, result)
+                if result is None:
+                    value = value.value
+
+            if result is None:
+                key = (name, value, tuple(profiles))
+                result = self._cached(key)
+            if result is None:
+                result, failed = self.__validateWithProfile(name, value,
+                                                            profiles)
+                if not failed:
+                    # errors of custom validators are reported each time
+                    self._memoize(key, result)
+            valid, matching, names = result
+            return valid, matching, list(names)
+
+    def _match(self, name, units, profiles):
+        """Return ``(True, matching, [profile])`` as
+        :meth:`validateWithProfile` if `units` (see :func:`_units`) match
+        the compiled definition of the first profile of `profiles` (or the
+        remaining ones) which defines property `name`, else ``None``."""
+        for profilename in profiles:
+            validator = self._validators[profilename].get(name)
+            if validator is not None:
+                if validator.grammar and validator.grammar.match(units):
+                    return True, True, [profilename]
+                # the regex may match anyway
+                return None
+        for profilename, validator in self._index.get(name, ()):
+            if profilename not in profiles:
+                if validator.grammar and validator.grammar.match(units):
+                    return True, False, [profilename]
+                return None
+        return None
+
+    def __validateWithProfile(self, name, value, profiles):
+        """Return ``(valid, matching, profiles), failed`` where `failed` is
+        ``True`` if a custom validation raised an exception."""
+        failed = False
+        for profilename in profiles:
+            # check given profiles
+            validate = self._validators[profilename].get(name)
+            if validate is not None:
+                try:
+                    if validate(value):
+                        return (True, True, [profilename]), failed
+                except Exception, e:
+                    self._log.error(e, error=Exception)
+                    failed = True
+
+        validators = self._index[name]
+        for profilename, validate in validators:
+            # check remaining profiles as well
+            if profilename not in profiles:
+                try:
+                    if validate(value):
+                        return (True, False, [profilename]), failed
+                except Exception, e:
+                    self._log.error(e, error=Exception)
+                    failed = True
+
+        # return profiles to which name belongs
+        names = sorted([profilename for profilename, validate in validators])
+        return (False, False, names), failed
+
+
+class _Validator(object):
+    """
+    Validates values of a single property in a single profile, either by a
+    custom function or by the regex of the property definition.
+
+    Before the regex is used the value is checked against
+
+    - ``keywords``, all single words in the definition which are valid
+      values themselves (like ``inherit`` or ``none``), lowercase only
+    - ``rejected``, ASCII characters no valid value starts with (e.g. ``#``
+      for a length or a digit for a color)
+
+    which are both computed from the regex itself so the result is always
+    the same as by the regex only.
+    """
+    def __init__(self, match, pattern=None, grammar=None):
+        """
+        :param match:
+            the compiled regex' ``match`` or a custom function
+        :param pattern:
+            the expanded regex of the definition or ``None`` for a custom
+            function
+        :param grammar:
+            a :class:`_Grammar` or ``None``
+        """
+        self.match = match
+        self.grammar = grammar
+        self.keywords = self.rejected = frozenset()
+        if pattern is not None:
+            self.keywords = frozenset([word.lower() for word
+                                       in re.findall(r'[a-z][a-z-]*', pattern,
+                                                     re.I)
+                                       if match(word)])
+            try:
+                self.rejected = _ASCII - _first(sre_parse.parse(pattern, re.I))
+            except ValueError:
+                pass
+
+    def __call__(self, value):
+        "Return a true value if (string) `value` is valid."
+        if value in self.keywords:
+            return True
+        elif value[:1] in self.rejected:
+            return False
+        else:
+            return self.match(value)
+
+
+_ASCII = frozenset([unichr(i) for i in range(128)])
+_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: frozenset(u'0123456789'),
+    sre_constants.CATEGORY_SPACE: frozenset(u' \t\n\r\f\v'),
+    sre_constants.CATEGORY_WORD: frozenset(u'0123456789_'
+                                           u'abcdefghijklmnopqrstuvwxyz'
+                                           u'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+    }
+_CATEGORIES.update({
+    sre_constants.CATEGORY_NOT_DIGIT: _ASCII -
+                                      _CATEGORIES[sre_constants.CATEGORY_DIGIT],
+    sre_constants.CATEGORY_NOT_SPACE: _ASCII -
+                                      _CATEGORIES[sre_constants.CATEGORY_SPACE],
+    sre_constants.CATEGORY_NOT_WORD: _ASCII -
+                                     _CATEGORIES[sre_constants.CATEGORY_WORD]
+    })
+
+def _first(pattern):
+    """Return the ASCII characters a match of parsed case insensitive regex
+    `pattern` may start with, all if it may match an empty string.
+
+    Raises :exc:`ValueError` for unsupported regex constructs."""
+    chars, empty = _firstOfSequence(pattern)
+    if empty:
+        return _ASCII
+    chars = set(chars)
+    chars.update([c.swapcase() for c in chars])
+    return frozenset(chars)
+
+def _firstOfSequence(pattern):
+    "Return ``(chars, empty)`` of a sequence."
+    chars = set()
+    for op, av in pattern:
+        c, empty = _firstOfItem(op, av)
+        chars.update(c)
+        if not empty:
+            return chars, False
+    return chars, True
+
+def _firstOfItem(op, av):
+    "Return ``(chars, empty)`` of a single regex item."
+    if op == sre_constants.LITERAL:
+        return set([unichr(av)]) & _ASCII, False
+    elif op == sre_constants.ANY:
+        return _ASCII, False
+    elif op == sre_constants.IN:
+        chars, negate = set(), False
+        for kind, value in av:
+            if kind == sre_constants.NEGATE:
+                negate = True
+            elif kind == sre_constants.LITERAL:
+                chars.add(unichr(value))
+            elif kind == sre_constants.RANGE:
+                chars.update([unichr(i) for i in range(value[0],
+                                                       min(value[1], 127) + 1)])
+            elif kind == sre_constants.CATEGORY and value in _CATEGORIES:
+                chars.update(_CATEGORIES[value])
+            else:
+                raise ValueError(u'Unsupported regex: %r' % kind)
+        if negate:
+            chars.update([c.swapcase() for c in chars])
+            return _ASCII - chars, False
+        return chars & _ASCII, False
+    elif op == sre_constants.BRANCH:
+        chars, empty = set(), False
+        for pattern in av[1]:
+            c, e = _firstOfSequence(pattern)
+            chars.update(c)
+            empty = empty or e
+        return chars, empty
+    elif op == sre_constants.SUBPATTERN:
+        return _firstOfSequence(av[1])
+    elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+        chars, empty = _firstOfSequence(av[2])
+        return chars, empty or av[0] == 0
+    elif op == sre_constants.AT:
+        return (), True
+    else:
+        raise ValueError(u'Unsupported regex: %r' % op)
+
+
+class _Leaf(object):
+    """Matches a single value by a regex for its serialized text or
+    nothing if the regex matches an empty text."""
+    def __init__(self, match):
+        self.match_ = match
+        self.empty = bool(match(u''))
+
+    def match(self, units, i):
+        if self.empty:
+            yield i
+        if not i % 2 and i < len(units) and self.match_(units[i]):
+            yield i + 1
+
+
+class _Space(object):
+    "Matches the whitespace between two values, optional if `optional`."
+    def __init__(self, optional):
+        self.optional = optional
+
+    def match(self, units, i):
+        if self.optional:
+            yield i
+        if i % 2 and i < len(units) and units[i] == u' ':
+            yield i + 1
+
+
+class _Operator(object):
+    "Matches operator ``,`` or ``/`` between two values."
+    def __init__(self, operator):
+        self.operator = operator
+
+    def match(self, units, i):
+        if i % 2 and i < len(units) and units[i] == self.operator:
+            yield i + 1
+
+
+class _Sequence(object):
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def match(self, units, i, n=0):
+        if n == len(self.nodes):
+            yield i
+        else:
+            for j in self.nodes[n].match(units, i):
+                for k in self.match(units, j, n + 1):
+                    yield k
+
+
+class _Choice(object):
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def match(self, units, i):
+        for node in self.nodes:
+            for j in node.match(units, i):
+                yield j
+
+
+class _Repeat(object):
+    def __init__(self, node, min, max):
+        self.node, self.min, self.max = node, min, max
+
+    def match(self, units, i, n=0):
+        if n >= self.min:
+            yield i
+        if self.max is None or n < self.max:
+            for j in self.node.match(units, i):
+                # empty matches only as long as needed to reach min
+                if j != i or n < self.min:
+                    for k in self.match(units, j, n + 1):
+                        yield k
+
+
+class _Grammar(object):
+    """
+    A property definition of a profile compiled to match the values of a
+    :class:`~cssutils.css.PropertyValue` directly (see :func:`_units`)
+    instead of its serialized text.
+
+    Parts of a definition which match a single value only (like
+    ``{length}`` or ``rgb\(...\)``) are matched by a regex for the
+    serialized text of that value. Whitespace, ``{w},{w}`` and ``{w}/{w}``
+    match the separators between values. A match is therefore a match of
+    the regex of the whole definition too. The regex may match in other
+    ways, e.g. two parts of the definition in a single value, so no match
+    does not mean the value is invalid.
+    """
+    _tokenizer = re.compile(r'''
+        (?P<operator>{w}\\?([,/]){w})
+        |(?P<space>\\s[*+]|{w})
+        |(?P<macro>{[a-z][a-z0-9-]*})
+        |(?P<repeat>{\d+(,\d*)?}|[*+?])
+        |(?P<open>\((\?:)?)
+        |(?P<close>\))
+        |(?P<choice>\|)
+        |(?P<function>[a-z-]+\\\()
+        |(?P<char>\[(\\.|[^\]])*\]|\\.|.)
+        ''', re.X | re.S)
+    _functionpart = re.compile(r'\[(\\.|[^\]])*\]|\\.|.', re.S)
+
+    def __init__(self, definition, macros, expand):
+        """
+        :param definition:
+            the property definition, macros not expanded
+        :param macros:
+            all macros usable in `definition`
+        :param expand:
+            :meth:`Profiles._expand_macros` used to expand macros
+
+        Raises :exc:`ValueError` if `definition` uses a construct which is
+        not supported.
+        """
+        self.macros = macros
+        self._expand = expand
+        self._macroNodes = {}
+        self._regexes = {}
+        node = self._parse(definition)
+        self.node = self._build(node)
+
+    def match(self, units):
+        "Return ``True`` if `units` match the definition."
+        end = len(units)
+        for i in self.node.match(units, 0):
+            if i == end:
+                return True
+        return False
+
+    # parsing to nodes of (pattern, kind, args) where pattern is the regex
+    # for the node if it matches a single value only, else ``None``
+
+    def _tokens(self, definition):
+        tokens = []
+        pos = 0
+        while pos < len(definition):
+            m = self._tokenizer.match(definition, pos)
+            kind = m.lastgroup
+            text = m.group(kind)
+            pos = m.end()
+            if kind == 'function':
+                # up to the matching \) outside of any group, a single value
+                depth, groups = 1, 0
+                while depth:
+                    m2 = self._functionpart.match(definition, pos)
+                    if not m2:
+                        raise ValueError(u'Unmatched "\\(".')
+                    part = m2.group()
+                    pos = m2.end()
+                    if part in u'()':
+                        groups += part == u'(' and 1 or -1
+                    elif not groups and part in (u'\\(', u'\\)'):
+                        depth += part == u'\\(' and 1 or -1
+                text = definition[m.start():pos]
+            elif kind == 'operator':
+                text = m.group(2)
+            tokens.append((kind, text))
+        return tokens
+
+    def _parse(self, definition):
+        tokens = self._tokens(definition)
+        tokens.reverse()
+        node = self._parseChoice(tokens)
+        if tokens:
+            raise ValueError(u'Unmatched ")".')
+        return node
+
+    def _parseChoice(self, tokens):
+        nodes = [self._parseSequence(tokens)]
+        while tokens and tokens[-1][0] == 'choice':
+            tokens.pop()
+            nodes.append(self._parseSequence(tokens))
+        if len(nodes) == 1:
+            return nodes[0]
+        patterns = [node[0] for node in nodes]
+        if None in patterns:
+            return None, _Choice, nodes
+        return u'|'.join(patterns), None, None
+
+    def _parseSequence(self, tokens):
+        nodes = []
+        while tokens and tokens[-1][0] not in ('choice', 'close'):
+            kind, text = tokens.pop()
+            if kind == 'open':
+                node = self._parseChoice(tokens)
+                if not tokens:
+                    raise ValueError(u'Unmatched "(".')
+                tokens.pop()
+                if node[0] is not None:
+                    node = u'(?:%s)' % node[0], None, None
+            elif kind == 'macro':
+                node = self._parseMacro(text[1:-1])
+            elif kind == 'space':
+                node = None, _Space, text != u'\\s+'
+            elif kind == 'operator':
+                node = None, _Operator, text
+            elif kind == 'repeat':
+                raise ValueError(u'Nothing to repeat.')
+            else:
+                # function and char
+                node = text, None, None
+
+            if tokens and tokens[-1][0] == 'repeat':
+                repeat = tokens.pop()[1]
+                if node[0] is not None:
+                    node = u'(?:%s)%s' % (node[0], repeat), None, None
+                else:
+                    min, max = {u'?': (0, 1), u'*': (0, None), u'+': (1, None)
+                                }.get(repeat, (None, None))
+                    if min is None:
+                        bounds = repeat[1:-1].split(u',')
+                        min = int(bounds[0])
+                        if len(bounds) == 1:
+                            max = min
+                        elif bounds[1]:
+                            max = int(bounds[1])
+                    node = None, _Repeat, (node, min, max)
+            nodes.append(node)
+
+        # consecutive single value nodes match a single value together
+        merged = []
+        for node in nodes:
+            if node[0] is not None and merged and merged[-1][0] is not None:
+                merged[-1] = merged[-1][0] + node[0], None, None
+            else:
+                merged.append(node)
+        if len(merged) == 1:
+            return merged[0]
+        return None, _Sequence, merged
+
+    def _parseMacro(self, name):
+        try:
+            return self._macroNodes[name]
+        except KeyError:
+            try:
+                definition = self.macros[name]
+            except KeyError:
+                raise ValueError(u'Unknown macro %r.' % name)
+            node = self._parse(definition)
+            if node[0] is not None:
+                # keep macro to be expanded as the regex profiles do
+                node = u'{%s}' % name, None, None
+            self._macroNodes[name] = node
+            return node
+
+    def _build(self, node):
+        pattern, kind, args = node
+        if pattern is not None:
+            return _Leaf(self._regex(pattern))
+        elif kind is _Space or kind is _Operator:
+            return kind(args)
+        elif kind is _Repeat:
+            return _Repeat(self._build(args[0]), args[1], args[2])
+        else:
+            return kind([self._build(n) for n in args])
+
+    def _regex(self, pattern):
+        try:
+            return self._regexes[pattern]
+        except KeyError:
+            expanded = self._expand({u'': pattern}, self.macros)[u'']
+            match = re.compile(u'^(?:%s)$' % expanded, re.I).match
+            self._regexes[pattern] = match
+            return match
+
+
+def _units(propertyValue):
+    """Return the serialized values of `propertyValue` separated by ``u' '``
+    or operators ``u','`` and ``u'/'`` as used by :class:`_Grammar` or
+    ``None`` if the serialized text cannot be composed from these."""
+    prefs = cssutils.ser.prefs
+    if prefs.spacer.strip() or prefs.listItemSpacer.strip():
+        return None
+    units = []
+    for item in propertyValue.seq:
+        type_, val = item.type, item.value
+        if not isinstance(type_, basestring):
+            # comment
+            continue
+        elif type_ == u'operator':
+            if not units or len(units) % 2 == 0 or val not in u',/':
+                return None
+            units.append(val)
+        elif type_ in _SPECIALTYPES:
+            return None
+        else:
+            if type_ == u'Value' and val._type == u'IDENT':
+                text = val._value
+            else:
+                try:
+                    text = val.cssText
+                except AttributeError:
+                    return None
+            if not text or text in u'+>~,:{;)]/=' or text in u'}[]()' or \
+               text.endswith(u' '):
+                # special spacing by serializer
+                return None
+            if len(units) % 2:
+                units.append(u' ')
+            units.append(text)
+    if not len(units) % 2:
+        return None
+    return tuple(units)
+
+# item types handled differently by the serializer
+_SPECIALTYPES = (u'COMMENT', u'FUNCTION', u'HASH', u'S', u'STRING', u'URI')
 
 
 properties = {}
@@ -363,7 +942,9 @@ macros[Profiles.CSS_LEVEL_2] = {
     'shape': r'rect\(({w}({length}|auto}){w},){3}{w}({length}|auto){w}\)',
     'counter': r'counter\({w}{identifier}{w}(?:,{w}{list-style-type}{w})?\)',
     'identifier': r'{ident}',
-    'family-name': r'{string}|{identifier}({w}{identifier})*',
+    # same as {identifier}({w}{identifier})* as identifiers written together
+    # are a single identifier anyway but without exponential backtracking
+    'family-name': r'{string}|{identifier}(\s+{identifier})*',
     'generic-family': r'serif|sans-serif|cursive|fantasy|monospace',
     'absolute-size': r'(x?x-)?(small|large)|medium',
     'relative-size': r'smaller|larger',
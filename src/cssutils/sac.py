@@ -7,6 +7,7 @@ __version__ = '$Id: parse.py 1754 2009-05-30 14:50:13Z cthedot $'
 import helper
 import codecs
 import errorhandler
+import itertools
 import os
 import tokenize2
 import urllib
@@ -196,11 +197,41 @@ class Parser(object):
             self.setErrorHandler(ErrorHandler())
     
     def parseString(self, cssText, encoding=None):
+        """Parse `cssText` which may be a (byte) string which is decoded
+        using `encoding` or the encoding detected by the ``css`` codec."""
         if isinstance(cssText, str):
             cssText = codecs.getdecoder('css')(cssText, encoding=encoding)[0]
         
-        tokens = self._tokenizer.tokenize(cssText, fullsheet=True)
-                
+        self._parse(self._tokenizer.tokenize(cssText, fullsheet=True))
+
+    def parseStream(self, stream, encoding=None, chunkSize=65536):
+        """Parse all text read from file-like object `stream` in chunks of
+        `chunkSize`. Bytes read are decoded incrementally using `encoding`
+        or the encoding detected by the ``css`` codec, unicode is used as
+        it is. Only the text of the current rule is kept in memory so even
+        huge sheets may be parsed."""
+        chunks = iter(lambda: stream.read(chunkSize), '')
+        try:
+            first = chunks.next()
+        except StopIteration:
+            first = u''
+        chunks = itertools.chain([first], chunks)
+        if isinstance(first, str):
+            decoder = codecs.getincrementaldecoder('css')(encoding=encoding)
+            chunks = decoder.iterdecode(chunks)
+
+        self._parse(self._tokenizer.tokenizeChunks(chunks, fullsheet=True))
+
+    def parseFile(self, filename, encoding=None):
+        """Parse file `filename` using ``parseStream``."""
+        f = open(filename, 'rb')
+        try:
+            self.parseStream(f, encoding=encoding)
+        finally:
+            f.close()
+
+    def _parse(self, tokens):
+        "Parse `tokens` and call the handlers."
         def COMMENT(val, line, col):
             self._handler.comment(val[2:-2], line, col)
 
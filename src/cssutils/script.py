@@ -352,9 +352,10 @@ def csscombine(path=None, url=None, cssText=None, href=None,
     cssutils.log.info(u'Using target encoding: %r' % targetencoding, neverraise=True)
 
     oldser = cssutils.ser
-    cssutils.setSerializer(cssutils.serialize.CSSSerializer())
     if minify:
-        cssutils.ser.prefs.useMinified()
+        cssutils.setSerializer(cssutils.serialize.MinifyingSerializer())
+    else:
+        cssutils.setSerializer(cssutils.serialize.CSSSerializer())
     cssutils.ser.prefs.resolveVariables = resolveVariables
     cssText = result.cssText
     cssutils.setSerializer(oldser)
@@ -1,11 +1,12 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """cssutils serializer"""
-__all__ = ['CSSSerializer', 'Preferences']
+__all__ = ['CSSSerializer', 'MinifyingSerializer', 'Preferences']
 __docformat__ = 'restructuredtext'
 __version__ = '$Id$'
 
 from cssutils.helper import normalize
+from cssutils.util import _TextCache
 import codecs
 import cssutils
 import helper
@@ -107,6 +108,11 @@ class Preferences(object):
             if value:
                 self.__setattr__(key, value)
 
+    def __setattr__(self, name, value):
+        "Serialized texts cached so far are not used anymore."
+        super(Preferences, self).__setattr__(name, value)
+        _TextCache.invalidate()
+
     def __repr__(self):
         return u"cssutils.css.%s(%s)" % (self.__class__.__name__,
             u', '.join(['\n    %s=%r' % (p, self.__getattribute__(p)) for p in self.__dict__]
@@ -167,16 +173,86 @@ class Preferences(object):
         self.validOnly = False
 
 
+def _substrings(s):
+    "Return all values `val` for which ``val in s`` is true except u''."
+    return frozenset(s[i:j] for i in range(len(s))
+                            for j in range(i + 1, len(s) + 1))
+
+
+class _Spacing(object):
+    """Texts appended by Out.append around special values, derived once
+    from the preferences of a serializer, see CSSSerializer._spacing.
+    """
+    # types handled specially by Out.append
+    types = frozenset(['COMMENT', 'S', 'STRING', 'URI', 'HASH'])
+    # values with S before removed
+    removeBefore = _substrings(u'+>~,:{;)]/=')
+    # values without spacer after
+    noSpacer = _substrings(u'}[]()/=')
+
+    def __init__(self, prefs):
+        # valid until prefs are changed
+        self.prefs, self.epoch = prefs, _TextCache.epoch
+        self.keepComments = prefs.keepComments
+        self.spacer = prefs.spacer
+        # {val: (before, after)}
+        self.special = {
+            u',': ((), (prefs.listItemSpacer,)),
+            u':': ((), (prefs.propertyNameSpacer,)),
+            u'{': ((prefs.paranthesisSpacer,), (prefs.lineSeparator,)),
+            u';': ((), (prefs.lineSeparator,)),
+            u')': ((), (u' ',))
+            }
+        combinator = (prefs.selectorCombinatorSpacer,)
+        for val in _substrings(u'+>~'):
+            self.special[val] = combinator, combinator
+        # a value with an empty cssText (e.g. the DimensionValue of an
+        # invalid "-") is enclosed like a combinator as u'' in u'+>~'
+        self.special[u''] = combinator, combinator
+        # after all other values
+        if prefs.spacer:
+            self.after = self.afterString = (prefs.spacer,)
+        else:
+            # a single S is needed anyway
+            self.after = (prefs.spacer, u' ')
+            self.afterString = (prefs.spacer,)
+        # if all texts consist of whitespace only (the usual case) these
+        # are simply added to Out.spaces
+        self.whitespace = not u''.join([
+            prefs.listItemSpacer, prefs.propertyNameSpacer,
+            prefs.paranthesisSpacer, prefs.lineSeparator,
+            prefs.selectorCombinatorSpacer, prefs.spacer]).strip()
+
+
 class Out(object):
-    """A simple class which makes appended items available as a combined string"""
+    """A simple class which makes appended items available as a combined
+    string.
+
+    Trailing items consisting of whitespace only are kept in ``spaces``
+    until anything else is appended so these may be removed again without
+    changing ``out``.
+    """
     def __init__(self, ser):
         self.ser = ser
         self.out = []
+        self.spaces = []
+        self.spacing = ser._spacing()
 
     def _remove_last_if_S(self):
-        if self.out and not self.out[-1].strip():
+        if self.spaces:
             # remove trailing S
-            del self.out[-1]
+            del self.spaces[-1]
+
+    def _extend(self, texts):
+        "Append `texts` which may or may not consist of whitespace only."
+        for text in texts:
+            if text.strip():
+                if self.spaces:
+                    self.out.extend(self.spaces)
+                    del self.spaces[:]
+                self.out.append(text)
+            else:
+                self.spaces.append(text)
 
     def append(self, val, typ=None, space=True, keepS=False, indent=False,
                lineSeparator=False):
@@ -203,15 +279,21 @@ class Out(object):
         - some other vals
             add ``*spacer`` except ``space=False``
         """
-        prefspace = self.ser.prefs.spacer
         if val or typ in ('STRING', 'URI'):
+            spacing, spaces = self.spacing, self.spaces
             # PRE
-            if 'COMMENT' == typ:
-                if self.ser.prefs.keepComments:
+            if typ not in _Spacing.types:
+                if not isinstance(val, basestring):
+                    if hasattr(val, 'cssText'):
+                        val = val.cssText
+                elif val in spacing.removeBefore and spaces:
+                    del spaces[-1]
+            elif 'COMMENT' == typ:
+                if spacing.keepComments:
                     val = val.cssText
                 else:
                     return
-            elif hasattr(val, 'cssText'):
+            elif not isinstance(val, basestring) and hasattr(val, 'cssText'):
                 val = val.cssText
 #            elif typ in ('Property', cssutils.css.CSSRule.UNKNOWN_RULE):
 #                val = val.cssText
@@ -229,54 +311,59 @@ class Out(object):
                 if val is None:
                     return
                 val = helper.string(val)
-                if not prefspace:
-                    self._remove_last_if_S()
+                if not spacing.spacer and spaces:
+                    del spaces[-1]
             elif 'URI' == typ:
                 val = helper.uri(val)
             elif 'HASH' == typ:
                 val = self.ser._hash(val)
-            elif val in u'+>~,:{;)]/=':
-                self._remove_last_if_S()
+
+            # spacing, see _Spacing
+            if lineSeparator:
+                # Property , ...
+                before = after = ()
+            elif val in spacing.special and (u')' != val or not keepS):
+                before, after = spacing.special[val]
+            else:
+                before = ()
+                if not space or typ == 'FUNCTION' or val in spacing.noSpacer:
+                    after = ()
+                elif typ == 'STRING':
+                    after = spacing.afterString
+                else:
+                    after = spacing.after
 
             # APPEND
             if indent:
-                self.out.append(self.ser._indentblock(val, self.ser._level+1))
-            else:
-                if val.endswith(u' '):
-                    self._remove_last_if_S()
+                val = self.ser._indentblock(val, self.ser._level+1)
+            elif val.endswith(u' ') and spaces:
+                del spaces[-1]
+            if before:
+                self._extend(before)
+            if val.strip():
+                if spaces:
+                    self.out.extend(spaces)
+                    del spaces[:]
                 self.out.append(val)
+            else:
+                spaces.append(val)
 
             # POST
-            if lineSeparator:
-                # Property , ...
+            if not after:
                 pass
-            elif val in u'+>~': # enclose selector combinator
-                self.out.insert(-1, self.ser.prefs.selectorCombinatorSpacer)
-                self.out.append(self.ser.prefs.selectorCombinatorSpacer)
-            elif u')' == val and not keepS: # CHAR funcend
-                # TODO: pref?
-                self.out.append(u' ')
-            elif u',' == val: # list
-                self.out.append(self.ser.prefs.listItemSpacer)
-            elif u':' == val: # prop
-                self.out.append(self.ser.prefs.propertyNameSpacer)
-            elif u'{' == val: # block start
-                self.out.insert(-1, self.ser.prefs.paranthesisSpacer)
-                self.out.append(self.ser.prefs.lineSeparator)
-            elif u';' == val: # end or prop or block
-                self.out.append(self.ser.prefs.lineSeparator)
-            elif val not in u'}[]()/=' and typ != 'FUNCTION' and space:
-                self.out.append(self.ser.prefs.spacer)
-                if typ != 'STRING' and not self.ser.prefs.spacer and \
-                   self.out and not self.out[-1].endswith(u' '):
-                    self.out.append(u' ')
+            elif spacing.whitespace:
+                spaces.extend(after)
+            else:
+                self._extend(after)
 
     def value(self, delim=u'', end=None, keepS=False):
         "returns all items joined by delim"
-        if not keepS:
-            self._remove_last_if_S()
+        if not keepS and self.spaces:
+            del self.spaces[-1]
         if end:
-            self.out.append(end)
+            self._extend((end,))
+        if self.spaces:
+            return delim.join(self.out + self.spaces)
         return delim.join(self.out)
 
 
@@ -295,6 +382,7 @@ class CSSSerializer(object):
             prefs = Preferences()
         self.prefs = prefs
         self._level = 0 # current nesting level
+        self.__spacing = None
 
         # TODO:
         self._selectors = [] # holds SelectorList
@@ -307,6 +395,14 @@ class CSSSerializer(object):
         else:
             return rule.atkeyword
 
+    def _spacing(self):
+        "Return _Spacing for the current prefs, used by Out."
+        spacing = self.__spacing
+        if spacing is None or spacing.prefs is not self.prefs or\
+           spacing.epoch != _TextCache.epoch:
+            spacing = self.__spacing = _Spacing(self.prefs)
+        return spacing
+
     def _indentblock(self, text, level):
         """
         indent a block like a CSSStyleDeclaration to the given level
@@ -356,10 +452,9 @@ class CSSSerializer(object):
         return not self.prefs.validOnly or (self.prefs.validOnly and
                                             x.valid)
 
-    def do_CSSStyleSheet(self, stylesheet):
-        """serializes a complete CSSStyleSheet"""
+    def _rulesTexts(self, stylesheet):
+        "Generator of the serialized rules of `stylesheet` which are kept."
         useduris = stylesheet._getUsedURIs()
-        out = []
         for rule in stylesheet.cssRules:
             if self.prefs.keepUsedNamespaceRulesOnly and\
                rule.NAMESPACE_RULE == rule.type and\
@@ -369,16 +464,57 @@ class CSSSerializer(object):
 
             cssText = rule.cssText
             if cssText:
-                out.append(cssText)
-        text = self._linenumnbers(self.prefs.lineSeparator.join(out))
+                yield cssText
 
-        # get encoding of sheet, defaults to UTF-8
+    def _encoding(self, stylesheet):
+        "Encoding of `stylesheet`, defaults to UTF-8."
         try:
-            encoding = stylesheet.cssRules[0].encoding
+            return stylesheet.cssRules[0].encoding
         except (IndexError, AttributeError):
-            encoding = 'UTF-8'
+            return 'UTF-8'
 
-        return text.encode(encoding, 'escapecss')
+    def do_CSSStyleSheet(self, stylesheet):
+        """serializes a complete CSSStyleSheet"""
+        text = self._linenumnbers(
+                self.prefs.lineSeparator.join(self._rulesTexts(stylesheet)))
+        return text.encode(self._encoding(stylesheet), 'escapecss')
+
+    def write(self, stylesheet, stream, encoding=None):
+        """
+        Write the serialized `stylesheet` to the file-like object `stream`
+        rule by rule through a StreamWriter of the ``css`` codec (see
+        :mod:`cssutils.codec`) so only the text of a single top-level rule
+        is held in memory at once. The bytes written are the same as
+        ``stylesheet.cssText``.
+
+        If ``prefs.lineNumbers`` is set the whole text is serialized first
+        as line numbers are padded to the width of the last one.
+
+        :param stylesheet:
+            the :class:`~cssutils.css.CSSStyleSheet` to serialize
+        :param stream:
+            object with a ``write`` method which accepts byte strings
+        :param encoding:
+            encoding to use instead of the one of `stylesheet`, the
+            encoding of an @charset rule is replaced by it
+        """
+        if encoding is None:
+            encoding = self._encoding(stylesheet)
+        writer = codecs.getwriter('css')(stream, 'escapecss',
+                                         encoding=encoding)
+        # texts of rules are not cached as the whole sheet would be kept
+        store, _TextCache.store = _TextCache.store, False
+        try:
+            if self.prefs.lineNumbers:
+                writer.write(self._linenumnbers(self.prefs.lineSeparator.join(
+                    self._rulesTexts(stylesheet))))
+            else:
+                separator = u''
+                for cssText in self._rulesTexts(stylesheet):
+                    writer.write(separator + cssText)
+                    separator = self.prefs.lineSeparator
+        finally:
+            _TextCache.store = store
 
     def do_CSSComment(self, rule):
         """
@@ -1047,3 +1183,312 @@ class CSSSerializer(object):
             return u' '.join(out)
         else:
             return u''
+
+
+class MinifyingSerializer(CSSSerializer):
+    """Serialize a CSSStylesheet and its parts in the minimal form only.
+
+    Rules, style declarations, properties and values are written directly
+    without indentation, line numbers, comments or any optional spacing
+    so the result is the same as of a CSSSerializer using
+    :meth:`Preferences.useMinified` but faster to compute. Additionally:
+
+    - the unit of a zero length is removed, e.g. ``0px`` => ``0``, but not
+      in functions as e.g. a unitless 0 is invalid in ``calc()``
+    - the leading zero of numbers is removed, e.g. ``0.5em`` => ``.5em``
+    - a ``+`` sign of a number which is a term of a property value on its
+      own is removed, e.g. ``+1px`` => ``1px`` but not in functions or
+      after an operator like ``/``, binary ``+`` and ``-`` in ``calc()``
+      keep the whitespace required around them, e.g. ``calc(1px + 2px)``
+    - hash colors and ``rgb()`` colors are written in the shortest form
+      of a color name, ``#rgb`` or ``#rrggbb``, e.g. ``#ff0000`` => ``red``
+      or ``rgb(255, 255, 255)`` => ``#fff``
+
+    Use it like any other serializer::
+
+        cssutils.setSerializer(cssutils.serialize.MinifyingSerializer())
+
+    Preferences which do not change the formatting like e.g.
+    ``keepAllProperties`` or ``resolveVariables`` are still used.
+    """
+    # zero of these units is simply 0
+    LENGTHS = frozenset(['ch', 'cm', 'em', 'ex', 'in', 'mm', 'pc', 'pt', 'px',
+                         'rem', 'vh', 'vmax', 'vmin', 'vw'])
+    # functions with binary + and - which need whitespace around them
+    CALC = frozenset([u'calc(', u'-moz-calc(', u'-webkit-calc('])
+
+    def __init__(self, prefs=None):
+        """
+        :param prefs:
+            instance of Preferences, defaults to minified Preferences
+        """
+        if not prefs:
+            prefs = Preferences()
+            prefs.useMinified()
+        super(MinifyingSerializer, self).__init__(prefs)
+        # > 0 while the arguments of a function are serialized
+        self._function = 0
+        # (red, green, blue) => name of opaque colors
+        self._colornames = dict((rgba[:3], name) for name, rgba in
+                                cssutils.css.ColorValue.COLORS.items()
+                                if rgba[3] == 1.0)
+
+    def _indentblock(self, text, level):
+        "Never indented."
+        return text
+
+    def _linenumnbers(self, text):
+        "No line numbers."
+        return text
+
+    def do_CSSStyleSheet(self, stylesheet):
+        """serializes a complete CSSStyleSheet"""
+        text = u''.join(self._rulesTexts(stylesheet))
+        return text.encode(self._encoding(stylesheet), 'escapecss')
+
+    def write(self, stylesheet, stream, encoding=None):
+        """
+        Write the serialized `stylesheet` to the file-like object `stream`,
+        see :meth:`CSSSerializer.write`.
+        """
+        if encoding is None:
+            encoding = self._encoding(stylesheet)
+        writer = codecs.getwriter('css')(stream, 'escapecss',
+                                         encoding=encoding)
+        store, _TextCache.store = _TextCache.store, False
+        try:
+            for cssText in self._rulesTexts(stylesheet):
+                writer.write(cssText)
+        finally:
+            _TextCache.store = store
+
+    def do_CSSComment(self, rule):
+        """No comments."""
+        return u''
+
+    def do_CSSMediaRule(self, rule):
+        """
+        serializes CSSMediaRule, ``@media`` medialist [name] {rules}
+        """
+        if not rule.media.wellformed:
+            return u''
+        rulesText = u''.join([r.cssText for r in rule.cssRules])
+        if not rulesText and not self.prefs.keepEmptyRules:
+            return u''
+        out = [self._atkeyword(rule, u'@media'), u' ',
+               self.do_stylesheets_medialist(rule.media)]
+        if rule.name:
+            out.append(helper.string(rule.name))
+        out.append(u'{%s}' % rulesText)
+        return u''.join(out)
+
+    def do_CSSStyleRule(self, rule):
+        """
+        serializes CSSStyleRule, selectorList{style}
+        """
+        selectorText = self.do_css_SelectorList(rule.selectorList)
+        if not selectorText or not rule.wellformed:
+            return u''
+        styleText = self.do_css_CSSStyleDeclaration(rule.style)
+        if styleText or self.prefs.keepEmptyRules:
+            return u'%s{%s}' % (selectorText, styleText)
+        else:
+            return u''
+
+    def do_css_CSSStyleDeclaration(self, style, separator=None):
+        """
+        Style declaration, properties separated by ``;``, `separator` is
+        ignored
+        """
+        if self.prefs.keepAllProperties:
+            seq = style.seq
+        else:
+            _effective = style.getProperties()
+            seq = [item for item in style.seq
+                     if (isinstance(item.value, cssutils.css.Property)
+                         and item.value in _effective)
+                     or not isinstance(item.value, cssutils.css.Property)]
+
+        out = []
+        for item in seq:
+            val = item.value
+            if isinstance(val, cssutils.css.Property):
+                cssText = val.cssText
+                if cssText:
+                    out.append(cssText)
+                    out.append(u';')
+            elif isinstance(val, cssutils.css.CSSUnknownRule):
+                out.append(val.cssText)
+            elif not isinstance(val, cssutils.css.CSSComment):
+                out.append(val)
+
+        if out and out[-1] == u';':
+            del out[-1]
+        return u''.join(out)
+
+    def do_Property(self, property):
+        """
+        Property, name:value!priority
+        """
+        if not (property.seqs[0] and property.wellformed and
+                self._valid(property)):
+            return u''
+        nameseq, value, priorityseq = property.seqs
+
+        name = self._propertyname(property, property.literalname)
+        valueText = value.cssText
+        if property._mediaQuery and not valueText:
+            # MediaQuery may consist of name only
+            return name
+
+        out = [name, u':', valueText]
+        for part in priorityseq:
+            if hasattr(part, 'cssText'): # comments
+                continue
+            elif part == property.literalpriority and\
+                 self.prefs.defaultPropertyPriority:
+                out.append(property.priority)
+            else:
+                out.append(part)
+        return u''.join(out)
+
+    def do_css_PropertyValue(self, value, valuesOnly=False):
+        """Values separated by a single space or their operator."""
+        out = []
+        spaced = False # last item is a value
+        operator = False # last item is an operator
+        for item in value.seq:
+            type_, val = item.type, item.value
+            if isinstance(val, cssutils.css.CSSComment):
+                continue
+            elif u'operator' == type_:
+                out.append(val)
+                spaced = False
+                operator = True
+            else:
+                if spaced:
+                    out.append(u' ')
+                if isinstance(val, cssutils.css.DimensionValue) and \
+                   not operator:
+                    # a term on its own, "+" is optional
+                    cssText = val.cssText
+                    if cssText.startswith(u'+'):
+                        cssText = cssText[1:]
+                    out.append(cssText)
+                elif hasattr(val, 'cssText'):
+                    out.append(val.cssText)
+                elif val and val[0] == val[-1] and val[0] in '\'"':
+                    out.append(helper.string(val[1:-1]))
+                else:
+                    out.append(val)
+                spaced = True
+                operator = False
+        return u''.join(out)
+
+    def _number(self, value):
+        """Number and unit of DimensionValue `value` in the shortest form
+        without a sign, the unit of a zero length is kept in functions."""
+        dim = value.dimension or u''
+        number = abs(value.value)
+        if number == 0:
+            if dim in self.LENGTHS and not self._function:
+                dim = u''
+            return u'0' + dim
+        elif number == int(number):
+            val = unicode(int(number))
+        else:
+            val = unicode(number)
+            if val.startswith(u'0.'):
+                val = val[1:]
+        return val + dim
+
+    def do_css_Value(self, value, valuesOnly=None):
+        """Serializes a Value, numbers in their shortest form but with a
+        ``+`` sign if given, see do_css_PropertyValue"""
+        type_ = value.type
+        if type_ in (u'DIMENSION', u'NUMBER', u'PERCENTAGE'):
+            val = self._number(value)
+            if value.value == 0:
+                return val
+            elif value.value < 0:
+                return u'-' + val
+            elif value._sign == u'+':
+                return u'+' + val
+            return val
+        elif u'STRING' == type_:
+            return helper.string(value.value)
+        elif u'URI' == type_:
+            return helper.uri(value.value)
+        elif u'HASH' == type_:
+            return self._hash(value.value)
+        else:
+            return value.value or u''
+
+    def do_css_CSSFunction(self, cssvalue, valuesOnly=False):
+        """Serialize a function, zero lengths keep their unit and ``+`` and
+        ``-`` between two terms of ``calc()`` are enclosed in spaces."""
+        if not cssvalue:
+            return u''
+        self._function += 1
+        try:
+            if normalize(cssvalue.seq[0].value) not in self.CALC:
+                return super(MinifyingSerializer, self).do_css_CSSFunction(
+                                                    cssvalue, valuesOnly)
+            out = []
+            term = False # last item is a term
+            for item in cssvalue.seq:
+                val = item.value
+                if isinstance(val, cssutils.css.CSSComment):
+                    continue
+                elif isinstance(val, cssutils.css.DimensionValue):
+                    number = self._number(val)
+                    if val._sign and term:
+                        # binary operator
+                        out.append(u' %s %s' % (val._sign, number))
+                    elif term:
+                        out.append(u' ' + number)
+                    elif val.value < 0 or val._sign:
+                        out.append((val._sign or u'-') + number)
+                    else:
+                        out.append(number)
+                    term = True
+                elif hasattr(val, 'cssText'):
+                    if term:
+                        out.append(u' ')
+                    out.append(val.cssText)
+                    term = True
+                else:
+                    out.append(val)
+                    term = False
+            return u''.join(out)
+        finally:
+            self._function -= 1
+
+    def do_css_ColorValue(self, value, valuesOnly=False):
+        """Serialize a ColorValue, HASH and rgb() colors in their shortest
+        form, a color name is kept as it might be e.g. a font name too"""
+        if u'HASH' == value.colorType or (u'FUNCTION' == value.colorType and
+                                          self._rgb(value)):
+            hashText = self._hash(u'#%02x%02x%02x' % (value.red,
+                                                      value.green,
+                                                      value.blue))
+            name = self._colornames.get((value.red, value.green, value.blue))
+            if name and len(name) < len(hashText):
+                return name
+            return hashText
+        elif u'IDENT' == value.colorType:
+            return value.seq[0].value
+        else:
+            return super(MinifyingSerializer, self).do_css_ColorValue(
+                                                    value, valuesOnly)
+
+    def _rgb(self, value):
+        "Is `value` a rgb() color of 3 integers each from 0 to 255?"
+        if value.seq[0].value != u'rgb(':
+            return False
+        numbers = [item.value for item in value.seq
+                   if isinstance(item.value, cssutils.css.DimensionValue)]
+        return len(numbers) == 3 and not [v for v in numbers
+                                          if v.type != u'NUMBER' or
+                                          type(v.value) != int or
+                                          not 0 <= v.value <= 255]
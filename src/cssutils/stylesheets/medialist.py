@@ -113,6 +113,7 @@ class MediaList(cssutils.util.Base, cssutils.util.ListSeq):
             for mq in newseq:
                 self.appendMedium(mq)
             self._wellformed = True
+            self._changed()
 
     mediaText = property(_getMediaText, _setMediaText,
         doc="The parsable textual representation of the media list.")
@@ -125,6 +126,7 @@ class MediaList(cssutils.util.Base, cssutils.util.ListSeq):
             newMedium = MediaQuery(newMedium)
 
         if newMedium.wellformed:
+            newMedium._parent = self
             return newMedium
 
     def __setitem__(self, index, newMedium):
@@ -135,6 +137,7 @@ class MediaList(cssutils.util.Base, cssutils.util.ListSeq):
         newMedium = self.__prepareset(newMedium)
         if newMedium:
             self.seq[index] = newMedium
+            self._changed()
         # TODO: remove duplicates?
 
     def appendMedium(self, newMedium):
@@ -187,6 +190,7 @@ class MediaList(cssutils.util.Base, cssutils.util.ListSeq):
             else:
                 self.seq.append(newMedium)
 
+            self._changed()
             return True
 
         else:
@@ -213,6 +217,7 @@ class MediaList(cssutils.util.Base, cssutils.util.ListSeq):
         for i, mq in enumerate(self):
             if self._normalize(mq.mediaType) == oldMedium:
                 del self[i]
+                self._changed()
                 break
         else:
             self._log.error(u'"%s" not in this MediaList' % oldMedium,
@@ -228,6 +233,9 @@ class MediaList(cssutils.util.Base, cssutils.util.ListSeq):
         except IndexError:
             return None
 
+    def _parentNode(self):
+        return self._parentRule
+
     parentRule = property(lambda self: self._parentRule,
                           doc=u"The CSSRule (e.g. an @media or @import rule "
                               u"this list is part of or None")
@@ -44,6 +44,9 @@ class MediaQuery(cssutils.util.Base):
     # so the following is a valid mediaType
     __mediaTypeMatch = re.compile(ur'^[-a-zA-Z0-9]+$', re.U).match
 
+    # MediaList containing this query
+    _parent = None
+
     def __init__(self, mediaText=None, readonly=False):
         """
         :param mediaText:
@@ -154,6 +157,7 @@ class MediaQuery(cssutils.util.Base):
                 # set
                 self.mediaType = new['mediatype']
                 self.seq = newseq
+                self._changed()
 
     mediaText = property(_getMediaText, _setMediaText,
         doc="The parsable textual representation of the media list.")
@@ -199,9 +203,13 @@ class MediaQuery(cssutils.util.Base):
                         break
             else:
                 self.seq.insert(0, mediaType)
+            self._changed()
 
     mediaType = property(lambda self: self._mediaType, _setMediaType,
         doc="The media type of this MediaQuery (one of "
             ":attr:`MEDIA_TYPES`).")
 
     wellformed = property(lambda self: bool(len(self.seq)))
+
+    def _parentNode(self):
+        return self._parent
@@ -7,12 +7,127 @@ __docformat__ = 'restructuredtext'
 __version__ = '$Id$'
 
 from cssproductions import *
-from helper import normalize
+from helper import _intern, normalize, stats
+import helper
+import bisect
 import itertools
 import re
+import sre_constants
+import sre_parse
 
 _TOKENIZER_CACHE = {}
 
+_ASCII = frozenset(range(128))
+
+def _firstchars(subpattern):
+    """
+    Return ``(chars, nullable)`` of a parsed regular expression (see
+    ``sre_parse.parse``). ``chars`` is the set of ASCII codes a match may
+    start with and ``nullable`` is ``True`` if the expression may match
+    the empty string.
+
+    Unknown constructs are handled as "may start with anything" so the
+    result is always a superset of the actual start characters.
+    """
+    chars = set()
+    for op, av in subpattern:
+        if op == sre_constants.LITERAL:
+            chars.add(av)
+            return chars & _ASCII, False
+        elif op == sre_constants.NOT_LITERAL:
+            chars.update(_ASCII - set([av]))
+            return chars, False
+        elif op == sre_constants.IN:
+            chars.update(_inchars(av))
+            return chars, False
+        elif op == sre_constants.BRANCH:
+            nullable = False
+            for branch in av[1]:
+                c, n = _firstchars(branch)
+                chars.update(c)
+                nullable = nullable or n
+            if not nullable:
+                return chars, False
+        elif op == sre_constants.SUBPATTERN:
+            c, nullable = _firstchars(av[-1])
+            chars.update(c)
+            if not nullable:
+                return chars, False
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            min, max, item = av
+            c, nullable = _firstchars(item)
+            chars.update(c)
+            if min > 0 and not nullable:
+                return chars, False
+        else:
+            # ANY, AT, GROUPREF etc. not used in productions
+            return set(_ASCII), False
+    return chars, True
+
+def _inchars(items):
+    "Return set of ASCII codes matched by a parsed character set ``[...]``."
+    chars = set()
+    negate = False
+    for op, av in items:
+        if op == sre_constants.NEGATE:
+            negate = True
+        elif op == sre_constants.LITERAL:
+            chars.add(av)
+        elif op == sre_constants.RANGE:
+            chars.update(range(av[0], av[1] + 1))
+        else:
+            # CATEGORY like \s, may be anything
+            return set(_ASCII)
+    if negate:
+        return _ASCII - chars
+    else:
+        return chars & _ASCII
+
+
+class _LineIndex(object):
+    """
+    Offsets of all newlines in a text. Used by ``Tokenizer(lazyLineCol=True)``
+    which yields tokens ``(name, value, lineindex, offset)`` so line and col
+    are only computed if actually needed, see :func:`linecol`.
+    """
+    _newline = re.compile(u'\n').finditer
+
+    def __init__(self, text):
+        self._text = text
+        self._newlines = None
+        # offset of first token in first line (after BOM)
+        self.start = 0
+
+    def linecol(self, offset):
+        "Return ``(line, col)`` of `offset`."
+        if self._newlines is None:
+            # built at first use, text is not needed anymore after that
+            self._newlines = [m.start() for m in self._newline(self._text)]
+            self._text = None
+        line = bisect.bisect_left(self._newlines, offset)
+        if line:
+            col = offset - self._newlines[line - 1]
+        else:
+            col = max(offset - self.start, 0) + 1
+        return line + 1, col
+
+    def __getstate__(self):
+        "Pickle the newline offsets only and not the text."
+        self.linecol(0)
+        return {'_text': None, '_newlines': self._newlines, 
+                'start': self.start}
+
+def linecol(line, col):
+    """
+    Return actual ``(line, col)`` of the line and col values of a token
+    (``token[2], token[3]``) which are an index and the token offset if
+    tokenized with ``lazyLineCol=True``.
+    """
+    if isinstance(line, _LineIndex):
+        return line.linecol(col)
+    else:
+        return line, col
+
 class Tokenizer(object):
     """
     generates a list of Token tuples:
@@ -30,10 +145,19 @@ class Tokenizer(object):
     unicodesub = re.compile(r'\\[0-9a-fA-F]{1,6}(?:\r\n|[\t|\r|\n|\f|\x20])?').sub
     cleanstring = re.compile(r'\\((\r\n)|[\n|\r|\f])').sub
 
-    def __init__(self, macros=None, productions=None, doComments=True):
+    def __init__(self, macros=None, productions=None, doComments=True,
+                 lazyLineCol=False, internValues=True):
         """
         inits tokenizer with given macros and productions which default to
         cssutils own macros and productions
+
+        lazyLineCol
+            if ``True`` only the offset of each token is recorded and line
+            and col are computed only if needed, see ``tokenize``
+        internValues
+            if ``True`` the values of IDENT, HASH, DIMENSION, NUMBER and
+            PERCENTAGE tokens are interned (see ``cssutils.helper._intern``)
+            so that equal values share a single string
         """
         if type(macros)==type({}):
             macros_hash_key = sorted(macros.items()) 
@@ -41,23 +165,33 @@ class Tokenizer(object):
             macros_hash_key = macros
         hash_key = str((macros_hash_key, productions))
         if hash_key in _TOKENIZER_CACHE:
-            (tokenmatches, commentmatcher, urimatcher) = _TOKENIZER_CACHE[hash_key]
+            (tokenmatches, commentmatcher, urimatcher, 
+             mastermatch, dispatch) = _TOKENIZER_CACHE[hash_key]
         else:
             if not macros:
                 macros = MACROS
             if not productions:
                 productions = PRODUCTIONS
-            tokenmatches = self._compile_productions(self._expand_macros(macros,
-                                                                         productions))
+            expanded = self._expand_macros(macros, productions)
+            tokenmatches = self._compile_productions(expanded)
             commentmatcher = [x[1] for x in tokenmatches if x[0] == 'COMMENT'][0]
             urimatcher = [x[1] for x in tokenmatches if x[0] == 'URI'][0]
-            _TOKENIZER_CACHE[hash_key] = (tokenmatches, commentmatcher, urimatcher)
+            # BOM is checked separately
+            mastermatch, dispatch = self._compile_master(expanded[1:])
+            _TOKENIZER_CACHE[hash_key] = (tokenmatches, commentmatcher, urimatcher,
+                                          mastermatch, dispatch)
 
+        self._macros = macros
+        self._productions = productions
         self.tokenmatches = tokenmatches
         self.commentmatcher = commentmatcher
         self.urimatcher = urimatcher
+        self._mastermatch = mastermatch
+        self._dispatch = dispatch
         
         self._doComments = doComments
+        self._lazyLineCol = lazyLineCol
+        self._internValues = internValues
         self._pushed = []
 
     def _expand_macros(self, macros, productions):
@@ -73,12 +207,55 @@ class Tokenizer(object):
         return expanded
 
     def _compile_productions(self, expanded_productions):
-        """compile productions into callable match objects, order is kept"""
+        """compile productions into callable match objects, order is kept
+
+        Matchers are not anchored with ``^`` but are always called as
+        ``matcher(text, pos)`` which matches at ``pos`` only.
+        """
         compiled = []
         for key, value in expanded_productions:
-            compiled.append((key, re.compile('^(?:%s)' % value, re.U).match))
+            compiled.append((key, re.compile('(?:%s)' % value, re.U).match))
         return compiled
 
+    def _compile_master(self, expanded_productions):
+        """
+        compile productions into a single regular expression with one named
+        group per production, alternatives are tried in the order of the
+        productions, so the first matching production wins just like trying
+        each production on its own.
+
+        Returns ``(mastermatch, dispatch)`` where ``mastermatch`` is a
+        tuple ``(match, names)`` with ``names`` mapping group names to
+        production names. ``dispatch`` maps each ASCII character to such a
+        tuple for a master expression of only those productions a token
+        starting with this character may match.
+        """
+        firsts = []
+        for key, value in expanded_productions:
+            firsts.append(_firstchars(sre_parse.parse(value))[0])
+
+        compiled = {}
+        def master(indexes):
+            "compile master expression for productions at indexes"
+            if indexes not in compiled:
+                groups, names = [], {}
+                for i in indexes:
+                    key, value = expanded_productions[i]
+                    groups.append('(?P<p%d>%s)' % (i, value))
+                    names['p%d' % i] = key
+                compiled[indexes] = (re.compile('|'.join(groups), re.U).match,
+                                     names)
+            return compiled[indexes]
+
+        mastermatch = master(tuple(range(len(expanded_productions))))
+        dispatch = {}
+        for code in _ASCII:
+            indexes = tuple([i for i, first in enumerate(firsts)
+                             if code in first])
+            if indexes:
+                dispatch[unichr(code)] = master(indexes)
+        return mastermatch, dispatch
+
     def push(self, *tokens):
         """Push back tokens which have been pulled but not processed."""
         self._pushed = itertools.chain(tokens, self._pushed)
@@ -86,7 +263,7 @@ class Tokenizer(object):
     def clear(self):
         self._pushed = []
 
-    def tokenize(self, text, fullsheet=False):
+    def tokenize(self, text, fullsheet=False, start=0):
         """Generator: Tokenize text and yield tokens, each token is a tuple 
         of::
         
@@ -102,6 +279,18 @@ class Tokenizer(object):
         fullsheet
             if ``True`` appends EOF token as last one and completes incomplete
             COMMENT or INVALID (to STRING) tokens
+        start
+            offset in text to start tokenizing at, line and col of the tokens
+            are still the ones in the whole text (used to parse only a part
+            of a text again, see ``CSSStyleSheet.applyTextEdit``)
+
+        If the tokenizer has been initialized with ``lazyLineCol=True`` 
+        tokens are::
+
+            (name, value, lineindex, offset)
+
+        instead. Use :func:`linecol` to get the actual line and col. 
+        ``cssutils.util.Item`` and the ErrorHandler do this automatically.
         """
         def _repl(m):
             "used by unicodesub"
@@ -111,112 +300,242 @@ class Tokenizer(object):
             else:
                 return m.group(0)
 
+        # see cssutils.helper.stats
+        countStats = helper.countStats
+
         def _normalize(value):
             "normalize and do unicodesub"
-            return normalize(self.unicodesub(_repl, value))
+            if u'\\' in value:
+                if countStats:
+                    stats['unicodesub.escaped'] += 1
+                value = self.unicodesub(_repl, value)
+            elif countStats:
+                stats['unicodesub.plain'] += 1
+            return normalize(value)
+
+        # text is never sliced, ``pos`` is the index of the next token
+        pos = start
+        end = len(text)
+        lazy = self._lazyLineCol
+        if self._internValues:
+            interned = ('IDENT', 'HASH', 'DIMENSION', 'NUMBER', 'PERCENTAGE')
+        else:
+            interned = ()
+        if lazy:
+            # col is simply the offset, line is shared by all tokens
+            line, col = _LineIndex(text), start
+        elif start:
+            line = text.count(self._linesep, 0, start) + 1
+            col = start - text.rfind(self._linesep, 0, start)
+        else:
+            line = col = 1
 
-        line = col = 1
-        
         # check for BOM first as it should only be max one at the start
-        (BOM, matcher), productions = self.tokenmatches[0], self.tokenmatches[1:]
-        match = matcher(text)
+        BOM, matcher = self.tokenmatches[0]
+        match = not start and matcher(text, pos)
         if match:
             found = match.group(0)
             yield (BOM, found, line, col)
-            text = text[len(found):]
+            pos = match.end()
+            if lazy:
+                line.start = col = pos
 
         # check for @charset which is valid only at start of CSS
-        if text.startswith('@charset '):
+        if not start and text.startswith('@charset ', pos):
             found = '@charset ' # production has trailing S!
             yield (CSSProductions.CHARSET_SYM, found, line, col)
-            text = text[len(found):]
+            pos += len(found)
             col += len(found)
-        
-        while text:
+
+        while pos < end:
             # do pushed tokens before new ones 
             for pushed in self._pushed:
                 yield pushed
 
             # speed test for most used CHARs, sadly . not possible :(
-            c = text[0]
+            c = text[pos]
             if c in u',:;{}>+[]':
                 yield ('CHAR', c, line, col)
                 col += 1
-                text = text[1:]
+                pos += 1
                 
             else:
-                # check all other productions, at least CHAR must match
-                for name, matcher in productions:
+                # check all productions a token starting with c may match
+                # with a single master expression, at least CHAR must match
+                matcher, names = self._dispatch.get(c, self._mastermatch)
+                match = matcher(text, pos)
+                name = names[match.lastgroup]
+
+                # TODO: USE bad comment? 
+                if fullsheet and name == 'CHAR' and text.startswith(u'/*', pos):
+                    # before CHAR production test for incomplete comment
+                    possiblecomment = u'%s*/' % text[pos:]
+                    if self.commentmatcher(possiblecomment) and self._doComments:
+                        yield ('COMMENT', possiblecomment, line, col)
+                        pos = end # ate all remaining text 
+                        continue
+
+                found = match.group(0) # needed later for line/col
+                if fullsheet:                        
+                    # check if found may be completed into a full token
+                    if 'INVALID' == name and match.end() == end:
+                        # complete INVALID to STRING with start char " or '
+                        name, found = 'STRING', '%s%s' % (found, found[0])
                     
-                    # TODO: USE bad comment? 
-                    if fullsheet and name == 'CHAR' and text.startswith(u'/*'):
-                        # before CHAR production test for incomplete comment
-                        possiblecomment = u'%s*/' % text
-                        match = self.commentmatcher(possiblecomment)
-                        if match and self._doComments:
-                            yield ('COMMENT', possiblecomment, line, col)
-                            text = None # ate all remaining text 
-                            break 
-    
-                    match = matcher(text) # if no match try next production
-                    if match:
-                        found = match.group(0) # needed later for line/col
-                        if fullsheet:                        
-                            # check if found may be completed into a full token
-                            if 'INVALID' == name and text == found:
-                                # complete INVALID to STRING with start char " or '
-                                name, found = 'STRING', '%s%s' % (found, found[0])
-                            
-                            elif 'FUNCTION' == name and\
-                                 u'url(' == _normalize(found):
-                                # url( is a FUNCTION if incomplete sheet
-                                # FUNCTION production MUST BE after URI production
-                                for end in (u"')", u'")', u')'):
-                                    possibleuri = '%s%s' % (text, end)
-                                    match = self.urimatcher(possibleuri)
-                                    if match:
-                                        name, found = 'URI', match.group(0)
-                                        break
-    
-                        if name in ('DIMENSION', 'IDENT', 'STRING', 'URI', 
-                                    'HASH', 'COMMENT', 'FUNCTION', 'INVALID',
-                                    'UNICODE-RANGE'):
-                            # may contain unicode escape, replace with normal 
-                            # char but do not _normalize (?)
+                    elif 'FUNCTION' == name and\
+                         u'url(' == _normalize(found):
+                        # url( is a FUNCTION if incomplete sheet
+                        # FUNCTION production MUST BE after URI production
+                        for urlend in (u"')", u'")', u')'):
+                            possibleuri = '%s%s' % (text[pos:], urlend)
+                            match = self.urimatcher(possibleuri)
+                            if match:
+                                name, found = 'URI', match.group(0)
+                                break
+
+                if name in ('DIMENSION', 'IDENT', 'STRING', 'URI', 
+                            'HASH', 'COMMENT', 'FUNCTION', 'INVALID',
+                            'UNICODE-RANGE'):
+                    # may contain unicode escape, replace with normal 
+                    # char but do not _normalize (?)
+                    if name in ('STRING', 'INVALID'): #'URI'?
+                        # remove \ followed by nl (so escaped) from string
+                        value = self.cleanstring('', found)
+                    else:
+                        if u'\\' in found:
+                            if countStats:
+                                stats['unicodesub.escaped'] += 1
                             value = self.unicodesub(_repl, found)
-                            if name in ('STRING', 'INVALID'): #'URI'?
-                                # remove \ followed by nl (so escaped) from string
-                                value = self.cleanstring('', found)
-    
-                        else:
-                            if 'ATKEYWORD' == name:
-                                try:
-                                    # get actual ATKEYWORD SYM
-                                    name = self._atkeywords[_normalize(found)]
-                                except KeyError, e:
-                                    # might also be misplace @charset...
-                                    if '@charset' == found and u' ' == text[len(found):len(found)+1]:
-                                        # @charset needs tailing S!
-                                        name = CSSProductions.CHARSET_SYM
-                                        found += u' '
-                                    else:
-                                        name = 'ATKEYWORD'
-                                    
-                            value = found # should not contain unicode escape (?)
-                        
-                        if self._doComments or (not self._doComments and 
-                                                name != 'COMMENT'):
-                            yield (name, value, line, col)
-                        
-                        text = text[len(found):]
-                        nls = found.count(self._linesep)
-                        line += nls
-                        if nls:
-                            col = len(found[found.rfind(self._linesep):])
                         else:
-                            col += len(found)
+                            if countStats:
+                                stats['unicodesub.plain'] += 1
+                            value = found
+                        if name in interned:
+                            value = _intern(value)
+
+                else:
+                    if 'ATKEYWORD' == name:
+                        try:
+                            # get actual ATKEYWORD SYM
+                            name = self._atkeywords[_normalize(found)]
+                        except KeyError, e:
+                            # might also be misplace @charset...
+                            after = pos + len(found)
+                            if '@charset' == found and u' ' == text[after:after+1]:
+                                # @charset needs tailing S!
+                                name = CSSProductions.CHARSET_SYM
+                                found += u' '
+                            else:
+                                name = 'ATKEYWORD'
                             
-                        break
+                    value = found # should not contain unicode escape (?)
+                    if name in interned:
+                        value = _intern(value)
+                
+                if self._doComments or (not self._doComments and 
+                                        name != 'COMMENT'):
+                    yield (name, value, line, col)
+                
+                pos += len(found)
+                if lazy:
+                    col = pos
+                else:
+                    nls = found.count(self._linesep)
+                    line += nls
+                    if nls:
+                        col = len(found[found.rfind(self._linesep):])
+                    else:
+                        col += len(found)
 
         if fullsheet:
             yield ('EOF', u'', line, col)
+
+    def tokenizeChunks(self, chunks, fullsheet=False):
+        """Generator: Tokenize text given as an iterable of (unicode) `chunks`
+        and yield the same tokens as ``tokenize(u''.join(chunks), fullsheet)``
+        but with always the actual line and col even if the tokenizer has
+        been initialized with ``lazyLineCol=True``.
+
+        Only text not yet known to be tokenized completely is kept between
+        chunks. This is the text since the last ``;``, ``{`` or ``}`` found
+        outside of any comment, string or ``url(...)`` so the memory used
+        depends on the size of the largest rule (or declaration) and not
+        the size of the text. The kept text is only tokenized again if a new
+        chunk contains something which may end it, e.g. a ``;`` or the
+        ``)`` of an open ``url(`` so a single large rule or value like a
+        ``data:`` URI is not tokenized again for each chunk. Pushed tokens
+        are not supported.
+        """
+        # tokenizes text kept, offsets of tokens are needed to cut it
+        tokenizer = Tokenizer(self._macros, self._productions,
+                              doComments=self._doComments, lazyLineCol=True,
+                              internValues=self._internValues)
+        text = u''
+        # kept text is tokenized again only if one of these is found in a
+        # new chunk, None for any chunk, chunks until then are collected
+        until = None
+        skipped = []
+        # line and col at offset pos of text
+        line, col, pos = 1, 1, 0
+
+        def advance(text, offset):
+            "Return line and col at offset of text."
+            nls = text.count(self._linesep, pos, offset)
+            if nls:
+                return (line + nls,
+                        offset - text.rfind(self._linesep, pos, offset))
+            else:
+                return line, col + offset - pos
+
+        for chunk in chunks:
+            # */ may start at the end of the previous chunk
+            last = (skipped or [text])[-1][-1:]
+            skipped.append(chunk)
+            if until is not None and not [
+                    x for x in until if x in last + chunk]:
+                continue
+            text = u''.join([text] + skipped)
+            del skipped[:]
+
+            tokens = list(tokenizer.tokenize(text))
+            # index of last token which may start the next text
+            cut = None
+            inurl = False
+            until = u';{}'
+            for i, (name, value, index, offset) in enumerate(tokens):
+                if 'FUNCTION' == name and u'url(' == normalize(value):
+                    # may still become a URI which may contain ;{}
+                    inurl = True
+                elif 'CHAR' == name:
+                    if u'/' == value and text.startswith(u'/*', offset):
+                        # incomplete comment, anything after may change
+                        until = (u'*/',)
+                        break
+                    elif u')' == value:
+                        inurl = False
+                    elif value in u';{}' and not inurl:
+                        cut = i
+            else:
+                if inurl:
+                    until = u')'
+                elif tokens and 'INVALID' == tokens[-1][0]:
+                    # incomplete string, ends with its quote or a newline
+                    until = tokens[-1][1][0] + u'\n\r\f'
+
+            if cut:
+                # tokens before cut are complete, the CHAR at cut is kept
+                # so the new text does not start with a possible BOM or
+                # @charset
+                for name, value, index, offset in tokens[:cut]:
+                    line, col = advance(text, offset)
+                    pos = offset
+                    yield (name, value, line, col)
+                offset = tokens[cut][3]
+                line, col = advance(text, offset)
+                text, pos = text[offset:], 0
+
+        text = u''.join([text] + skipped)
+        for name, value, index, offset in tokenizer.tokenize(text, fullsheet):
+            line, col = advance(text, offset)
+            pos = offset
+            yield (name, value, line, col)
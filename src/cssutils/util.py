@@ -5,10 +5,11 @@ __docformat__ = 'restructuredtext'
 __version__ = '$Id$'
 
 from helper import normalize
-from itertools import ifilter
+from tokenize2 import _LineIndex, linecol
 import cssutils
 import codec
 import codecs
+import copy_reg
 import errorhandler
 import tokenize2
 import types
@@ -21,15 +22,245 @@ except ImportError, e:
 
 log = errorhandler.ErrorHandler()
 
+# token values changing the nesting depth in Base._tokensupto2
+_BRACKETS = frozenset(u'{}[]()')
+
+class _TextCache(object):
+    """
+    Global state of the serialized texts cached by
+    ``_BaseClass._cachedText``.
+
+    ``epoch`` is part of the key of all cached texts and incremented by
+    :meth:`invalidate`, ``sets`` counts the texts cached so far (see
+    ``_BaseClass._changed``). While ``store`` is ``False`` cached texts are
+    still used but no new ones are kept, e.g. while a sheet is written to a
+    stream.
+    """
+    epoch = 0
+    sets = 0
+    store = True
+
+    @classmethod
+    def invalidate(cls):
+        """The serialized texts of all objects may have changed, e.g. if
+        the preferences of the serializer or the namespaces or variables of
+        a sheet have been changed."""
+        cls.epoch += 1
+
+
+class _TokenView(object):
+    """
+    The tokens of a child (e.g. a rule) read in place from the token stream
+    of its parent while the child is parsed, see ``Base._tokensview``.
+
+    Like ``Base._tokensupto2`` the view ends with the first ``;`` or ``}``
+    (``mediaendonly``: the ``}`` closing the current block) outside of any
+    brackets or with ``EOF``. With ``separateEnd`` the end token (but not
+    ``EOF``) is not part of the view but available as ``end``.
+
+    A view may be iterated once. All tokens read from the stream of the
+    outermost view are recorded once in a list shared by all views nested in
+    it, each view only keeps its ``start`` and ``stop`` index in it. So the
+    tokens of e.g. rules in nested @media rules are not copied again on each
+    level. ``tokens()`` returns them as a list, e.g. for an error message.
+    """
+    def __init__(self, tokenizer, starttoken=None, mediaendonly=False,
+                 separateEnd=False):
+        if isinstance(tokenizer, _TokenView):
+            # the parent records all tokens including starttoken
+            self._tape = tokenizer._tape
+            record = False
+        else:
+            self._tape = []
+            record = True
+            if starttoken:
+                self._tape.append(starttoken)
+        self._start = len(self._tape)
+        if starttoken:
+            self._start -= 1
+        self._stop = None
+        self._owner = None
+        self.end = None
+        if mediaendonly:
+            ends, brace = u'}', 1
+        else:
+            ends, brace = u';}', 0
+        self._iter = self.__tokens(tokenizer, record, starttoken, ends, brace,
+                                   separateEnd)
+        self.next = self._iter.next
+
+    def __iter__(self):
+        return self._iter
+
+    def __tokens(self, tokenizer, record, starttoken, ends, brace,
+                 separateEnd):
+        tape = self._tape
+        append = tape.append
+        bracket = parant = 0 # {}, [], ()
+        if starttoken:
+            val = starttoken[1]
+            if u'[' == val:
+                bracket += 1
+            elif u'{' == val:
+                brace += 1
+            elif u'(' == val:
+                parant += 1
+            yield starttoken
+
+        FUNCTION = Base._prods.FUNCTION
+        for token in tokenizer:
+            if record:
+                append(token)
+            typ, val = token[0], token[1]
+            if 'EOF' == typ:
+                self._finish(len(tape), token)
+                yield token
+                return
+
+            if val in _BRACKETS or FUNCTION == typ:
+                if u'{' == val:
+                    brace += 1
+                elif u'}' == val:
+                    brace -= 1
+                elif u'[' == val:
+                    bracket += 1
+                elif u']' == val:
+                    bracket -= 1
+                # function( or single (
+                elif u')' == val:
+                    parant -= 1
+                else:
+                    parant += 1
+
+            if (brace == bracket == parant == 0) and val in ends:
+                if separateEnd:
+                    self._finish(len(tape) - 1, token)
+                    return
+                self._finish(len(tape), token)
+                yield token
+                return
+
+            yield token
+
+        if record:
+            self._finish(len(tape), None)
+        else:
+            # the parent has ended
+            self._finish(tokenizer._stop, None)
+
+    def _finish(self, stop, end):
+        "Record end of view and set the span of the object parsed from it."
+        self._stop = stop
+        self.end = end
+        if self._owner is not None:
+            self._owner._span = self._owner._tokensSpan(self)
+            self._owner = None
+
+    def drain(self):
+        "Skip all tokens of this view not read yet."
+        for token in self._iter:
+            pass
+
+    def spanOf(self, owner):
+        """
+        Set ``owner._span`` (see ``Base._tokensSpan``) as soon as all tokens
+        of this view have been read.
+        """
+        owner._span = None
+        if self._stop is None:
+            self._owner = owner
+        else:
+            owner._span = owner._tokensSpan(self)
+
+    def tokens(self):
+        "Return all tokens of this view as a list (reading the remaining)."
+        self.drain()
+        return self._tape[self._start:self._stop]
+
+
 class _BaseClass(object):
     """
     Base class for Base, Base2 and _NewBase.
 
     **Base and Base2 will be removed in the future!**
+
+    All base classes define empty ``__slots__`` so classes which are created
+    very often like Property, Selector or Value may use ``__slots__`` and
+    have no ``__dict__`` at all.
+
+    Classes which cache their serialized text (see ``_cachedText``) set
+    ``_stop`` to -1, their text is kept in ``_cache`` as ``(key, text)``.
     """
+    __slots__ = ()
+
     _log = errorhandler.ErrorHandler()
     _prods = tokenize2.CSSProductions
 
+    _cache = None
+    _stop = None
+
+    def __getstate__(self):
+        """Pickle state including values of ``__slots__`` for all protocols,
+        a cached serialized text is not pickled."""
+        slots = {}
+        for name in copy_reg._slotnames(self.__class__):
+            if hasattr(self, name):
+                slots[name] = getattr(self, name)
+        if '_stop' in slots:
+            slots['_cache'], slots['_stop'] = None, -1
+        state = getattr(self, '__dict__', None)
+        if state and ('_cache' in state or '_stop' in state):
+            state = state.copy()
+            state.pop('_cache', None)
+            state.pop('_stop', None)
+        if slots:
+            # unpickled like protocol 2 does it, no __setstate__ needed
+            return state, slots
+        else:
+            return state
+
+    def _parentNode(self):
+        "Object containing this one (up to its sheet) or ``None``."
+        return None
+
+    def _changed(self):
+        """Drop the cached serialized text of this object and of all objects
+        containing it, called by all modifications.
+
+        Stops at an object which an earlier call has passed already if no
+        text has been cached at all since, its containers have been changed
+        only with calls of this method in between. So this is cheap while
+        parsing where nothing is cached yet.
+        """
+        sets = _TextCache.sets
+        obj = self
+        while obj is not None:
+            if obj._stop is not None:
+                if obj._stop == sets:
+                    break
+                obj._stop = sets
+                obj._cache = None
+            obj = obj._parentNode()
+
+    def _cachedText(self, method):
+        """Return ``cssutils.ser.<method>(self)``, the text is cached until
+        this object or one contained in it is changed, the serializer or
+        its preferences are changed or :meth:`_TextCache.invalidate` is
+        called."""
+        ser = cssutils.ser
+        if ser.prefs.indentSpecificities:
+            # depends on the rules serialized before
+            return getattr(ser, method)(self)
+        key = (ser, ser.prefs, _TextCache.epoch)
+        cache = self._cache
+        if cache is not None and cache[0] == key:
+            return cache[1]
+        text = getattr(ser, method)(self)
+        if _TextCache.store:
+            self._cache = key, text
+            _TextCache.sets += 1
+        return text
+
     def _checkReadonly(self):
         "Raise xml.dom.NoModificationAllowedErr if rule/... is readonly"
         if hasattr(self, '_readonly') and self._readonly:
@@ -48,6 +279,8 @@ class _BaseClass(object):
             return u''
         elif isinstance(t, basestring):
             return t
+        elif isinstance(t, _TokenView):
+            return u''.join([x[1] for x in t.tokens()])
         else:
             return u''.join([x[1] for x in t])
 
@@ -58,6 +291,8 @@ class _NewBase(_BaseClass):
 
     **Currently CSSValue and related ones only.**
     """
+    __slots__ = ()
+
     def __init__(self):
         self._seq = Seq()
 
@@ -65,6 +300,7 @@ class _NewBase(_BaseClass):
         """Set value of ``seq`` which is readonly."""
         newseq._readonly = True
         self._seq = newseq
+        self._changed()
 
     def _tempSeq(self, readonly=False):
         "Get a writeable Seq() which is used to set ``seq`` later"
@@ -86,6 +322,8 @@ class Base(_BaseClass):
 
     ``_normalize`` is static as used by Preferences.
     """
+    __slots__ = ()
+
     __tokenizer2 = tokenize2.Tokenizer()
 
     # for more on shorthand properties see
@@ -148,15 +386,16 @@ class Base(_BaseClass):
             # needs to be tokenized
             return self.__tokenizer2.tokenize(
                  textortokens)
-        elif types.GeneratorType == type(textortokens):
+        elif types.GeneratorType == type(textortokens) or isinstance(
+             textortokens, _TokenView):
             # already tokenized
             return textortokens
         elif isinstance(textortokens, tuple):
             # a single token (like a comment)
             return [textortokens]
         else:
-            # already tokenized but return generator
-            return (x for x in textortokens)
+            # already tokenized but return iterator
+            return iter(textortokens)
 
     def _nexttoken(self, tokenizer, default=None):
         "returns next token in generator tokenizer or the default value"
@@ -210,6 +449,64 @@ class Base(_BaseClass):
         else:
             return None
 
+    def _tokensSpan(self, tokens):
+        """
+        Return ``(start, last, lastvalue)`` of a list of `tokens` without
+        leading and trailing whitespace with the positions of the first and
+        the last token, each the offset if the tokens have been tokenized
+        with ``lazyLineCol=True`` and ``(line, col)`` otherwise.
+        :class:`~cssutils.css.CSSStyleSheet` converts these to ``(start,
+        end)`` offsets after parsing (the value of the last token may have
+        been unescaped so its length in the text is not known here).
+        ``None`` if `tokens` is not a list of tokens but e.g. a string.
+        """
+        if isinstance(tokens, tuple) and len(tokens) == 2:
+            # (tokens, namespaces)
+            tokens = tokens[0]
+        if isinstance(tokens, _TokenView) and tokens._stop is not None:
+            tokens, first, last = tokens._tape, tokens._start, tokens._stop - 1
+        elif isinstance(tokens, list):
+            first, last = 0, len(tokens) - 1
+        else:
+            return None
+        S = self._prods.S
+        while first <= last and tokens[first][0] == S:
+            first += 1
+        while last >= first and tokens[last][0] == S:
+            last -= 1
+        if first > last:
+            return None
+
+        type_, value, line, col = tokens[first]
+        if isinstance(line, _LineIndex):
+            start = col
+        else:
+            start = line, col
+        type_, value, line, col = tokens[last]
+        if isinstance(line, _LineIndex):
+            return start, col, value
+        else:
+            return start, (line, col), value
+
+    def _getSourceSpan(self, rule):
+        """
+        Return ``(start, end)`` offsets of this object in the text of its
+        style sheet. `rule` is the rule this object is part of (``None`` if
+        it is a top-level rule) as only the span of a top-level rule is
+        absolute and all others are relative to the start of their rule.
+        """
+        span = self._span
+        while span is not None and len(span) == 2:
+            if rule is None:
+                return span
+            base = rule._span
+            if base is None or len(base) != 2:
+                break
+            span = base[0] + span[0], base[0] + span[1]
+            rule = rule.parentRule
+        # not parsed from a text or not converted to offsets
+        return None
+
     def _tokensupto2(self,
                      tokenizer,
                      starttoken=None,
@@ -286,28 +583,30 @@ class Base(_BaseClass):
                 parant += 1
 
         if tokenizer:
+            append = resulttokens.append
+            FUNCTION = Base._prods.FUNCTION
             for token in tokenizer:
-                typ, val, line, col = token
+                typ, val = token[0], token[1]
                 if 'EOF' == typ:
-                    resulttokens.append(token)
+                    append(token)
                     break
 
-                if u'{' == val:
-                    brace += 1
-                elif u'}' == val:
-                    brace -= 1
-                elif u'[' == val:
-                    bracket += 1
-                elif u']' == val:
-                    bracket -= 1
-                # function( or single (
-                elif u'(' == val or \
-                     Base._prods.FUNCTION == typ:
-                    parant += 1
-                elif u')' == val:
-                    parant -= 1
-
-                resulttokens.append(token)
+                append(token)
+
+                if val in _BRACKETS or FUNCTION == typ:
+                    if u'{' == val:
+                        brace += 1
+                    elif u'}' == val:
+                        brace -= 1
+                    elif u'[' == val:
+                        bracket += 1
+                    elif u']' == val:
+                        bracket -= 1
+                    # function( or single (
+                    elif u')' == val:
+                        parant -= 1
+                    else:
+                        parant += 1
 
                 if (brace == bracket == parant == 0) and (
                     val in ends or typ in endtypes):
@@ -325,6 +624,17 @@ class Base(_BaseClass):
         else:
             return resulttokens
 
+    def _tokensview(self, tokenizer, starttoken=None, mediaendonly=False,
+                    separateEnd=False):
+        """
+        Return a :class:`_TokenView` of the tokens of a child in `tokenizer`
+        to be parsed in place. Ends like :meth:`_tokensupto2` with the same
+        parameters. Call ``drain()`` of the view after setting the child so
+        tokens it did not read are skipped.
+        """
+        return _TokenView(tokenizer, starttoken, mediaendonly=mediaendonly,
+                          separateEnd=separateEnd)
+
     def _adddefaultproductions(self, productions, new=None):
         """
         adds default productions if not already present, used by
@@ -415,7 +725,8 @@ class Base(_BaseClass):
                     expected = p(expected, seq, token, tokenizer)
                 else:
                     wellformed = False
-                    self._log.error(u'Unexpected token (%s, %s, %s, %s)' % token)
+                    self._log.error(u'Unexpected token (%s, %s, %s, %s)' % (
+                                    token[:2] + linecol(token[2], token[3])))
         return wellformed, expected
 
 
@@ -425,6 +736,8 @@ class Base2(Base, _NewBase):
 
     Base class for new seq handling.
     """
+    __slots__ = ()
+
     def __init__(self):
         self._seq = Seq()
 
@@ -489,6 +802,8 @@ class Seq(object):
 
     is normally readonly, only writable during parsing
     """
+    __slots__ = ('_seq', '_readonly')
+
     def __init__(self, readonly=True):
         """
         only way to write to a Seq is to initialize it with new items
@@ -504,6 +819,12 @@ class Seq(object):
             u',\n    '.join([u'%r' % item for item in self._seq]
             ), self._readonly)
 
+    def __getstate__(self):
+        return self._seq, self._readonly
+
+    def __setstate__(self, state):
+        self._seq, self._readonly = state
+
     def __str__(self):
         vals = []
         for v in self:
@@ -590,9 +911,13 @@ class Item(object):
     value
         the actual value which may be a string, number etc or an instance
         of e.g. a CSSComment
-    *line*
-        **NOT IMPLEMENTED YET, may contain the line in the source later**
+    line, col
+        position in the source if known, if parsed with
+        ``CSSParser(lazyLineCol=True)`` these are computed only when
+        requested
     """
+    __slots__ = ('__value', '__type', '__line', '__col')
+
     def __init__(self, value, type, line=None, col=None):
         self.__value = value
         self.__type = type
@@ -601,13 +926,17 @@ class Item(object):
 
     type = property(lambda self: self.__type)
     value = property(lambda self: self.__value)
-    line = property(lambda self: self.__line)
-    col = property(lambda self: self.__col)
+    line = property(lambda self: linecol(self.__line, self.__col)[0])
+    col = property(lambda self: linecol(self.__line, self.__col)[1])
 
     def __repr__(self):
         return "%s.%s(value=%r, type=%r, line=%r, col=%r)" % (
                 self.__module__, self.__class__.__name__,
-                self.__value, self.__type, self.__line, self.__col)
+                self.__value, self.__type, self.line, self.col)
+
+    def __reduce__(self):
+        "Pickled as a simple tuple, there are lots of Items in a sheet."
+        return (Item, (self.__value, self.__type, self.__line, self.__col))
 
 
 class ListSeq(object):
@@ -691,11 +1020,9 @@ class _Namespaces(object):
         if not prefix:
             prefix = u''
         delrule = self.__findrule(prefix)
-        for i, rule in enumerate(ifilter(lambda r: r.type == r.NAMESPACE_RULE,
-                            self.parentStyleSheet.cssRules)):
-            if rule == delrule:
-                self.parentStyleSheet.deleteRule(i)
-                return
+        if delrule:
+            self.parentStyleSheet.deleteRule(delrule)
+            return
 
         self._log.error('Prefix %r not found.' % prefix,
                         error=xml.dom.NamespaceErr)
@@ -731,11 +1058,24 @@ class _Namespaces(object):
 
     def __findrule(self, prefix):
         # returns namespace rule where prefix == key
-        for rule in ifilter(lambda r: r.type == r.NAMESPACE_RULE,
-                            reversed(self.parentStyleSheet.cssRules)):
+        for rule in reversed(self.__rules()):
             if rule.prefix == prefix:
                 return rule
 
+    def __rules(self):
+        # returns @namespace rules of the sheet, these may only follow
+        # @charset and @import so all other rules are not looked at which
+        # keeps lookups for each selector independent of the sheet size
+        rules = []
+        for rule in self.parentStyleSheet.cssRules:
+            if rule.type == rule.NAMESPACE_RULE:
+                rules.append(rule)
+            elif rule.type in (rule.VARIABLES_RULE, rule.MEDIA_RULE,
+                               rule.PAGE_RULE, rule.STYLE_RULE,
+                               rule.FONT_FACE_RULE):
+                break
+        return rules
+
     @property
     def namespaces(self):
         """
@@ -743,8 +1083,7 @@ class _Namespaces(object):
         self.parentStyleSheets.
         """
         namespaces = {}
-        for rule in ifilter(lambda r: r.type == r.NAMESPACE_RULE,
-                            reversed(self.parentStyleSheet.cssRules)):
+        for rule in reversed(self.__rules()):
             if rule.namespaceURI not in namespaces.values():
                 namespaces[rule.prefix] = rule.namespaceURI
         return namespaces
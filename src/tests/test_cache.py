@@ -0,0 +1,136 @@
+"""Testcases for cssutils.cache.SheetCache."""
+__version__ = '$Id$'
+
+import os
+import shutil
+import tempfile
+import basetest
+import cssutils
+import xml.dom
+from cssutils.cache import SheetCache
+
+class SheetCacheTestCase(basetest.BaseTestCase):
+
+    def setUp(self):
+        super(SheetCacheTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(SheetCacheTestCase, self).tearDown()
+        shutil.rmtree(self.path)
+
+    def _entries(self):
+        return [n for n in os.listdir(self.path) if n.endswith(SheetCache.suffix)]
+
+    def test_parseString(self):
+        "CSSParser(cache=SheetCache(...)).parseString()"
+        css = u'''@namespace x "uri";
+            @media print { x|a { color: red } }
+            /*1*/ b { background: url(x.gif) }'''
+        cache = SheetCache(self.path)
+        p = cssutils.CSSParser(cache=cache)
+        s1 = p.parseString(css, href='http://example.com/a.css')
+        self.assertEqual((0, 1), (cache.hits, cache.misses))
+        self.assertEqual(1, len(self._entries()))
+
+        s2 = p.parseString(css, href='http://example.com/a.css')
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        self.assertEqual(s1.cssText, s2.cssText)
+        self.assertEqual(u'http://example.com/a.css', s2.href)
+        self.assertEqual({u'x': u'uri'}, dict(s2.namespaces.items()))
+        # parent links
+        mediarule = s2.cssRules[1]
+        self.assertEqual(s2, mediarule.parentStyleSheet)
+        self.assertEqual(mediarule, mediarule.cssRules[0].parentRule)
+        # usable sheet
+        s2.insertRule(u'c { color: green }')
+        mediarule.cssRules.append(cssutils.css.CSSStyleRule(u'd'))
+        self.assertEqual(mediarule, mediarule.cssRules[1].parentRule)
+
+        # a new parser uses the same cache
+        s3 = cssutils.CSSParser(cache=SheetCache(self.path)).parseString(css,
+                                             href='http://example.com/a.css')
+        self.assertEqual(s1.cssText, s3.cssText)
+
+    def test_settings(self):
+        "SheetCache key depends on settings"
+        css = u'/*1*/ a { color: red }'
+        cache = SheetCache(self.path)
+        cssutils.CSSParser(cache=cache).parseString(css)
+        s = cssutils.CSSParser(cache=cache, parseComments=False).parseString(css)
+        self.assertEqual((0, 2), (cache.hits, cache.misses))
+        self.assertEqual('a {\n    color: red\n    }', s.cssText)
+
+        cssutils.CSSParser(cache=cache).parseString(css, href='other.css')
+        cssutils.CSSParser(cache=cache).parseString(css, media='print')
+        self.assertEqual((0, 4), (cache.hits, cache.misses))
+
+        css = u'a { $ }'
+        cssutils.CSSParser(cache=cache).parseString(css)
+        p = cssutils.CSSParser(cache=cache, raiseExceptions=True)
+        self.assertRaises(xml.dom.SyntaxErr, p.parseString, css)
+        self.assertEqual((0, 6), (cache.hits, cache.misses))
+
+    def test_imports(self):
+        "SheetCache does not keep sheets with @import rules"
+        imported = [u'a { color: red }']
+        def fetcher(url):
+            return None, imported[0]
+        cache = SheetCache(self.path)
+        p = cssutils.CSSParser(cache=cache, fetcher=fetcher)
+        css = u'@import "b.css"; c { top: 0 }'
+        s = p.parseString(css, href='http://example.com/a.css')
+        self.assertEqual(u'red', s.cssRules[0].styleSheet.cssRules[0]\
+                                  .style.color)
+        self.assertEqual(0, len(self._entries()))
+
+        imported[0] = u'a { color: blue }'
+        s = p.parseString(css, href='http://example.com/a.css')
+        self.assertEqual(u'blue', s.cssRules[0].styleSheet.cssRules[0]\
+                                   .style.color)
+        self.assertEqual(0, cache.hits)
+
+    def test_limits(self):
+        "SheetCache(maxEntries, maxSize)"
+        cache = SheetCache(self.path, maxEntries=2)
+        p = cssutils.CSSParser(cache=cache)
+        for i in range(5):
+            p.parseString(u'a { left: %dpx }' % i)
+        self.assertEqual(2, len(self._entries()))
+
+        cache.maxEntries = None
+        cache.maxSize = 1
+        p.parseString(u'a { top: 0 }')
+        self.assertEqual(0, len(self._entries()))
+
+        cache.clear()
+        self.assertEqual([], os.listdir(self.path))
+
+        # entries are listed only if a limit may be exceeded
+        listed = []
+        def entries():
+            listed.append(1)
+            return SheetCache._entries(cache)
+        cache._entries = entries
+        cache.maxSize = None
+        cache.maxEntries = 3
+        for i in range(6):
+            p.parseString(u'a { right: %dpx }' % i)
+        self.assertEqual(3, len(self._entries()))
+        self.assertEqual(4, len(listed))
+
+    def test_broken(self):
+        "SheetCache broken entry"
+        cache = SheetCache(self.path)
+        p = cssutils.CSSParser(cache=cache)
+        p.parseString(u'a { color: red }')
+        for name in self._entries():
+            open(os.path.join(self.path, name), 'wb').write('broken')
+        s = p.parseString(u'a { color: red }')
+        self.assertEqual((0, 2), (cache.hits, cache.misses))
+        self.assertEqual('a {\n    color: red\n    }', s.cssText)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -459,6 +459,23 @@ ex2|SEL4, a, ex2|SELSR {
         self.assertRaisesMsg(xml.dom.NamespaceErr, "Prefix u'a' not found.", 
                              s._setCssText, 'a|a { color: red }')        
         
+    def test_namespaces6(self):
+        "CSSStyleSheet.namespaces 6"
+        # @namespace rules may follow @charset and @import only
+        s = cssutils.parseString(u'''@charset "ascii";
+            @import "x";
+            @namespace p "u1";
+            @namespace q "u2";
+            p|a { color: red }''')
+        self.assertEqual({u'p': u'u1', u'q': u'u2'}, s.namespaces.namespaces)
+        self.assertTrue(u'q' in s.namespaces)
+
+        # deletes the @namespace rule and not the rule at its index
+        del s.namespaces[u'q']
+        self.assertEqual([u'@charset', u'@import', u'@namespace', u'p|a'],
+                         [r.cssText.split()[0] for r in s.cssRules])
+        self.assertEqual({u'p': u'u1'}, s.namespaces.namespaces)
+
     def test_deleteRuleIndex(self):
         "CSSStyleSheet.deleteRule(index)"
         self.s.cssText = u'@charset "ascii"; @import "x"; @x; a {\n    x: 1\n    }@y;'
@@ -785,6 +802,246 @@ body {
         }
         self.do_equal_p(tests) # parse
 
+    def test_applyTextEdit(self):
+        "CSSStyleSheet.applyTextEdit()"
+        css = u'''@charset "ascii";
+@variables { v: 1 }
+a { color: red }
+@media print { b { top: 0 } }
+/*1*/ c { left: var(v) }'''
+        parser = cssutils.CSSParser(keepSource=True)
+        def parseString(text):
+            # a sheet of the parser keeps any new text too
+            s = cssutils.CSSParser(keepSource=True).parseString(u'')
+            s.cssText = text
+            return s
+        for parse in (parser.parseString, parseString):
+            s = parse(css)
+            text = css
+            def edit(old, new, count=1):
+                "Replace old by new and check rules parsed again."
+                start = text.index(old)
+                rules = list(s.cssRules)
+                s.applyTextEdit(start, start + len(old), new)
+                newtext = text.replace(old, new, 1)
+                self.assertEqual(parse(newtext).cssText, s.cssText)
+                for rule in s.cssRules:
+                    self.assertEqual(s, rule.parentStyleSheet)
+                self.assertEqual(count, len([r for r in s.cssRules
+                                             if r not in rules]))
+                return newtext
+
+            text = edit(u'red', u'green')
+            self.assertEqual(u'green', s.cssRules[2].style.color)
+            text = edit(u'top: 0', u'top: 1px; left: 0')
+            text = edit(u'} }', u'} } d { top: 0 }', 2)
+            # sheet unchanged if an error is raised
+            end = text.index(u'green }') + 7
+            self.assertRaises(xml.dom.SyntaxErr, s.applyTextEdit,
+                              end - 1, end, u'')
+            self.assertEqual(parse(text).cssText, s.cssText)
+            # following rules parsed again until in sync again
+            cssutils.log.raiseExceptions = False
+            try:
+                text = edit(u'green }', u'green ', 1)
+            finally:
+                cssutils.log.raiseExceptions = True
+            text = edit(u'green ', u'green }', 5)
+            # variables are updated
+            text = edit(u'v: 1', u'v: 2')
+            self.assertEqual(u'2', s.variables['v'])
+            self.assertEqual(u'2', s.cssRules[-1].style.left)
+            # rules are checked against the preceding ones
+            cssutils.log.raiseExceptions = False
+            try:
+                text = edit(u'/*1*/', u'@charset "ascii";', 0)
+            finally:
+                cssutils.log.raiseExceptions = True
+            text = edit(u'@charset "ascii"; c', u' c')
+            # namespaces need all rules parsed again
+            text = edit(u'@variables', u'@namespace p "u";\n@variables', 7)
+            text = edit(u'a {', u'p|a {')
+            self.assertEqual(u'p|a', s.cssRules[3].selectorText)
+            # changed otherwise
+            s.insertRule(u'x { top: 0 }')
+            text = edit(u'} d {', u'} e {', 7)
+
+            self.assertRaises(xml.dom.IndexSizeErr,
+                              s.applyTextEdit, -1, 0, u'')
+            self.assertRaises(xml.dom.IndexSizeErr,
+                              s.applyTextEdit, 1, 0, u'')
+            self.assertRaises(xml.dom.IndexSizeErr,
+                              s.applyTextEdit, 0, len(text) + 1, u'')
+        self.assertRaises(xml.dom.InvalidStateErr,
+                          cssutils.css.CSSStyleSheet().applyTextEdit, 0, 0, u'')
+        # the text is not kept by default
+        for s in (cssutils.parseString(css), cssutils.css.CSSStyleSheet()):
+            s.cssText = css
+            self.assertEqual(None, s._source.text)
+            self.assertRaises(xml.dom.InvalidStateErr,
+                              s.applyTextEdit, 0, 0, u'')
+        s = parser.parseString(css)
+        s._readonly = True
+        self.assertRaises(xml.dom.NoModificationAllowedErr,
+                          s.applyTextEdit, 0, 0, u'')
+
+    def test_sourceSpan(self):
+        "CSSRule.sourceSpan, Property.sourceSpan, Selector.sourceSpan"
+        css = u'''/* 1 */
+a, b > c { color: red; left : 1px }
+@media print {
+    x\\2e y { top: 0 }
+}
+@x \\41 ;'''
+        def spans(s):
+            "text of all spans"
+            def text(obj):
+                start, end = obj.sourceSpan
+                return css[start:end]
+            media = s.cssRules[2]
+            return [text(s.cssRules[0]), text(s.cssRules[1]),
+                    [text(x) for x in s.cssRules[1].selectorList],
+                    [text(p) for p in s.cssRules[1].style.getProperties()],
+                    text(media), text(media.cssRules[0]),
+                    text(media.cssRules[0].selectorList[0]),
+                    text(media.cssRules[0].style.getProperty('top')),
+                    text(s.cssRules[3])]
+        exp = [u'/* 1 */', u'a, b > c { color: red; left : 1px }',
+               [u'a', u'b > c'], [u'color: red', u'left : 1px'],
+               u'@media print {\n    x\\2e y { top: 0 }\n}',
+               u'x\\2e y { top: 0 }', u'x\\2e y', u'top: 0',
+               u'@x \\41 ;']
+        for lazyLineCol in (False, True):
+            s = cssutils.CSSParser(lazyLineCol=lazyLineCol).parseString(css)
+            self.assertEqual(exp, spans(s))
+        s = cssutils.css.CSSStyleSheet()
+        s.cssText = css
+        self.assertEqual(exp, spans(s))
+
+        # kept in sync by applyTextEdit
+        s = cssutils.CSSParser(keepSource=True).parseString(css)
+        start = css.index(u'left')
+        s.applyTextEdit(start, start, u'top: 0; ')
+        css = css[:start] + u'top: 0; ' + css[start:]
+        exp[1] = u'a, b > c { color: red; top: 0; left : 1px }'
+        exp[3].insert(1, u'top: 0')
+        self.assertEqual(exp, spans(s))
+
+        # not parsed from the text
+        s.insertRule(u'd { top: 0 }')
+        self.assertEqual(None, s.cssRules[-1].sourceSpan)
+        self.assertEqual(None, s.cssRules[-1].selectorList[0].sourceSpan)
+        s.cssRules[2].insertRule(u'd { top: 0 }')
+        self.assertEqual(None, s.cssRules[2].cssRules[-1].sourceSpan)
+        # changed values keep the span they have been parsed from
+        s.cssRules[1].style.color = u'green'
+        start, end = s.cssRules[1].style.getProperty(u'color').sourceSpan
+        self.assertEqual(u'color: red', css[start:end])
+        s.cssRules[1].cssText = u'a { color: red }'
+        self.assertEqual(None, s.cssRules[1].sourceSpan)
+        self.assertEqual(None, s.cssRules[1].selectorList[0].sourceSpan)
+        self.assertEqual(None, cssutils.css.Property(u'top', u'0').sourceSpan)
+        self.assertEqual(None, cssutils.css.Selector(u'a').sourceSpan)
+        self.assertEqual(None, cssutils.css.CSSStyleRule(u'a').sourceSpan)
+
+    def test_ruleAt(self):
+        "CSSStyleSheet.ruleAt()"
+        css = u'''a { color: red }
+@media print {
+    b { top: 0 }
+    /* 1 */
+}
+
+c { left: 0 }'''
+        # the text is not needed
+        s = cssutils.parseString(css)
+        self.assertEqual(s.cssRules[1].cssRules[0],
+                         s.ruleAt(css.index(u'b {')))
+
+        s = cssutils.CSSParser(keepSource=True).parseString(css)
+        a, media, c = s.cssRules
+        b, comment = media.cssRules
+        for text, rule in ((u'a {', a), (u'red', a), (u'}\n@', a),
+                           (u'@media', media), (u'print', media),
+                           (u'b {', b), (u'0 }\n  ', b), (u'/* 1', comment),
+                           (u'\n}', media), (u'c {', c), (u'left', c)):
+            self.assertEqual(rule, s.ruleAt(css.index(text)))
+        for offset in (css.index(u'\n@media'), css.index(u'\n\nc'),
+                       len(css), -1):
+            self.assertEqual(None, s.ruleAt(offset))
+
+        # index is built again after changes
+        s.applyTextEdit(0, 0, u'  ')
+        self.assertEqual(None, s.ruleAt(0))
+        self.assertEqual(s.cssRules[0], s.ruleAt(2))
+        self.assertEqual(media, s.ruleAt(css.index(u'@media') + 2))
+        s.deleteRule(0)
+        self.assertEqual(None, s.ruleAt(2))
+        self.assertEqual(media, s.ruleAt(css.index(u'@media') + 2))
+
+        self.assertEqual(None, cssutils.css.CSSStyleSheet().ruleAt(0))
+
+    def test_rulesFor(self):
+        "CSSStyleSheet.rulesForClass(), .rulesForId(), .rulesForTag()"
+        s = cssutils.parseString(u'a.b {} .b p {} '
+                                 u'@media print { #x .b:not(.c) {} DIV {} } '
+                                 u'*.c, .b > .c {}')
+        def texts(rules):
+            return [r.selectorText for r in rules]
+        self.assertEqual([u'a.b', u'#x .b:not(.c)'],
+                         texts(s.rulesForClass(u'b')))
+        self.assertEqual([u'*.c, .b > .c'], texts(s.rulesForClass(u'c')))
+        self.assertEqual([u'.b p'], texts(s.rulesForTag(u'p')))
+        self.assertEqual([u'DIV'], texts(s.rulesForTag(u'div')))
+        self.assertEqual([u'#x .b:not(.c)', u'*.c, .b > .c'],
+                         texts(s.rulesForTag(u'*')))
+        self.assertEqual([], s.rulesForId(u'x'))
+        self.assertEqual([], s.rulesForClass(u'x'))
+
+        # kept up to date in document order
+        media = s.cssRules[2]
+        s.insertRule(u'.b {}', 1)
+        media.insertRule(u'.e .b {}', 0)
+        s.insertRule(u'#x {}')
+        self.assertEqual([u'a.b', u'.b', u'.e .b', u'#x .b:not(.c)'],
+                         texts(s.rulesForClass(u'b')))
+        self.assertEqual([u'#x'], texts(s.rulesForId(u'x')))
+        media.deleteRule(1)
+        s.deleteRule(0)
+        self.assertEqual([u'.b', u'.e .b'], texts(s.rulesForClass(u'b')))
+        s.cssRules[0].selectorText = u'.z'
+        s.cssRules[1].selectorList.appendSelector(u'.z')
+        self.assertEqual([u'.z', u'.b p, .z'], texts(s.rulesForClass(u'z')))
+        self.assertEqual([u'.e .b'], texts(s.rulesForClass(u'b')))
+        s.cssRules[0].selectorList[0].selectorText = u'.y'
+        self.assertEqual([u'.b p, .z'], texts(s.rulesForClass(u'z')))
+        self.assertEqual([u'.y'], texts(s.rulesForClass(u'y')))
+        s.cssRules[0].selectorList[0].selectorText = u'.z'
+        media.cssText = u'@media all { .z {} }'
+        self.assertEqual([u'.z', u'.b p, .z', u'.z'],
+                         texts(s.rulesForClass(u'z')))
+        s.deleteRule(media)
+        self.assertEqual([u'.z', u'.b p, .z'], texts(s.rulesForClass(u'z')))
+
+        # returned lists are copies
+        s.rulesForClass(u'z').pop()
+        self.assertEqual(2, len(s.rulesForClass(u'z')))
+
+        # rules are indexed once
+        s.add(u'.z {}')
+        s.insertRule(u'.z b {}', inOrder=True)
+        self.assertEqual([u'.z', u'.b p, .z', u'.z'],
+                         texts(s.rulesForClass(u'z')))
+        self.assertEqual([u'.z b'], texts(s.rulesForTag(u'b')))
+
+        s = cssutils.CSSParser(keepSource=True).parseString(u'a {} b {}')
+        self.assertEqual([u'a'], texts(s.rulesForTag(u'A')))
+        s.applyTextEdit(0, 1, u'b')
+        self.assertEqual([u'b', u'b'], texts(s.rulesForTag(u'b')))
+        s.cssText = u'c {}'
+        self.assertEqual([], s.rulesForTag(u'b'))
+        self.assertEqual([u'c'], texts(s.rulesForTag(u'c')))
+
     def test_NoModificationAllowedErr(self):
         "CSSStyleSheet NoModificationAllowedErr"
         css = cssutils.css.CSSStyleSheet(readonly=True)
@@ -815,6 +1072,75 @@ body {
         self.assert_(href == s2.href)
         self.assert_(title == s2.title)
 
+    def test_pickle(self):
+        "CSSStyleSheet pickle"
+        import pickle
+        css = u'''@charset "ascii";
+@import "x.css" print;
+@namespace p "uri";
+/*1*/
+@media print {
+    p|a:hover > b, c[p|x="1"] {
+        color: red !important;
+        background: url(a) rgb(1, 2, 3)
+        }
+    }
+@page :left {
+    margin: 1px
+    }
+x {
+    filter: alpha(opacity=1);
+    font: 12px/1 Arial, sans-serif
+    }'''.encode('ascii')
+        parser = cssutils.CSSParser(fetcher=lambda url: (None, u'a { top: 0 }'))
+        s = parser.parseString(css, href='http://example.com/a.css',
+                               media='screen', title='t')
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            s2 = pickle.loads(pickle.dumps(s, protocol))
+            self.assertEqual(css, s2.cssText)
+            self.assertEqual((s.href, s.media.mediaText, s.title, s.encoding),
+                             (s2.href, s2.media.mediaText, s2.title, s2.encoding))
+            self.assertEqual(s.cssRules[1].styleSheet.cssText,
+                             s2.cssRules[1].styleSheet.cssText)
+            self.assertEqual(s2.cssRules[1],
+                             s2.cssRules[1].styleSheet.ownerRule)
+            self.assertEqual({u'p': u'uri'}, dict(s2.namespaces.items()))
+
+            # parent links
+            media = s2.cssRules[4]
+            style = media.cssRules[0].style
+            for rule in s2.cssRules:
+                self.assertEqual(s2, rule.parentStyleSheet)
+            self.assertEqual(media, media.cssRules[0].parentRule)
+            self.assertEqual(style, style.getProperty('color').parent)
+            self.assertEqual(media.cssRules[0], style.parentRule)
+
+            # still usable
+            s2.cssRules.append(cssutils.css.CSSStyleRule(u'y'))
+            self.assertEqual(s2, s2.cssRules[-1].parentStyleSheet)
+            s2.insertRule(u'p|z { top: 0 }')
+            s2.namespaces['q'] = 'uri'
+            self.assertEqual(u'@namespace q "uri";', s2.cssRules[2].cssText)
+            self.assertEqual(u'q|z', s2.cssRules[-1].selectorText)
+            self.assertEqual(u'q|a:hover > b, c[q|x="1"]',
+                             media.cssRules[0].selectorText)
+            media.cssRules.append(cssutils.css.CSSStyleRule(u'y'))
+            self.assertEqual(media, media.cssRules[-1].parentRule)
+
+            # the global log is not copied
+            log = pickle.loads(pickle.dumps(cssutils.log, protocol))
+            self.assertTrue(log.__dict__ is cssutils.log.__dict__)
+
+        # only the newline offsets of lazy line indexes
+        s = cssutils.CSSParser(lazyLineCol=True).parseString(css)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            s2 = pickle.loads(pickle.dumps(s, protocol))
+            seq, seq2 = (sheet.cssRules[6].style.getProperty('font')\
+                              .propertyValue.seq for sheet in (s, s2))
+            self.assertEqual([(i.line, i.col) for i in seq],
+                             [(i.line, i.col) for i in seq2])
+            self.assertEqual((16, 11), (seq2[0].line, seq2[0].col))
+
 
 if __name__ == '__main__':
     import unittest
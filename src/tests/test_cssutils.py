@@ -394,6 +394,47 @@ a {
         else:
             self.assertEqual(False, u'Minimock needed for this test')
 
+    def test_minify(self):
+        "cssutils.minify(cssText)"
+        tests = {
+            u'': u'',
+            u' /* x */ ': u'',
+            u'@charset "ascii";\n/* x */ a , b > c ~ d + e  f { x : 1 ; }':
+                u'@charset "ascii";a,b>c~d+e f{x:1}',
+            # whitespace and comments in selectors
+            u'a  .b :c * [d] #e  :not( f ) g { }':
+                u'a .b :c * [d] #e :not(f) g{}',
+            u'a/**/b, a /**/ b, x/**/.5, 1/**/.5': u'a/**/b,a b,x.5,1/**/.5',
+            # declarations
+            u'a { ; x : 1px  -2px ! important ;; y : url( "a b" )  1 / 2 ; }':
+                u'a{x:1px -2px!important;y:url("a b") 1/2}',
+            u'a { w: calc( 1px + 2px ); f: rgb( 1 , 2 , 3 ) red }':
+                u'a{w:calc(1px + 2px);f:rgb(1,2,3) red}',
+            u'@media screen and ( min-width : 1px ) , print { a { x: 0 } }':
+                u'@media screen and (min-width:1px),print{a{x:0}}',
+            u'@page :first { margin : 0 }': u'@page :first{margin:0}',
+            # escapes and strings are kept
+            ur'.\31 0 { content: "a  /* b */" }':
+                ur'.\31 0{content:"a  /* b */"}',
+            ur'.\31/**/0 {}': ur'.\31/**/0{}',
+            ur'.\31/**/ a {}': ur'.\31  a{}',
+            u'a { x: "unclosed\n}': u'a{x:"unclosed\n}',
+            u'u/**/+1, u+/**/1': u'u/**/+1,u+/**/1',
+            }
+        for test, exp in tests.items():
+            self.assertEqual(exp, cssutils.minify(test))
+
+        self.assertEqual(u'a{x:"\xe4"}', cssutils.minify('a { x: "\xc3\xa4" }'))
+        self.assertEqual(u'a{x:"\xe4"}',
+                         cssutils.minify('a { x: "\xe4" }', encoding='iso-8859-1'))
+
+        # semantic rewrites by MinifyingSerializer
+        ser = cssutils.ser
+        cssText = u'a { x: 0px #ff0000 } b {}'
+        self.assertEqual(u'a{x:0px #ff0000}b{}', cssutils.minify(cssText))
+        self.assertEqual(u'a{x:0 red}', cssutils.minify(cssText, rewrite=True))
+        self.assertTrue(ser is cssutils.ser)
+
 
 if __name__ == '__main__':
     import unittest
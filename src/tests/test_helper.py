@@ -4,6 +4,7 @@ __version__ = '$Id: test_util.py 1437 2008-08-18 20:30:38Z cthedot $'
 
 import basetest
 from cssutils.helper import * 
+from cssutils.helper import _intern # not imported by *
 
 class HelperTestCase(basetest.BaseTestCase):
 
@@ -21,6 +22,65 @@ class HelperTestCase(basetest.BaseTestCase):
             # static too
             self.assertEqual(normalize(test), exp)
 
+    def test_normalizeStats(self):
+        "helper.normalize() memo and stats"
+        import cssutils.helper
+        resetStats()
+        cssutils.helper.countStats = True
+        try:
+            a = normalize(u'\\Normali\\zed')
+            self.assertEqual(u'normalized', a)
+            self.assertTrue(a is normalize(u'\\Normali\\zed'))
+            self.assertEqual(u'normalized', normalize(u'NORMALIZED'))
+            self.assertEqual(u'x', normalize('X'))
+            self.assertEqual(str, type(normalize('X')))
+        finally:
+            cssutils.helper.countStats = False
+        # not counted by default
+        normalize(u'Plain')
+        self.assertEqual({'normalize.memo': 1, 'normalize.plain': 3,
+                          'normalize.escaped': 1, 'unicodesub.plain': 0,
+                          'unicodesub.escaped': 0}, stats)
+
+    def test_normalizeMemo(self):
+        "helper.normalize() memo without interning and its size"
+        import cssutils.helper
+        resetStats()
+        cssutils.helper.countStats = True
+        cssutils.helper._internValues = False
+        try:
+            normalize(u'NotInterned')
+            normalize(u'NotInterned')
+            self.assertEqual(1, stats['normalize.memo'])
+            self.assertEqual(False, u'notinterned' in cssutils.helper._interned)
+            # least recently used are removed, all others kept
+            maxsize = cssutils.helper._NORMALIZE_MAXSIZE
+            for i in range(maxsize * 2):
+                normalize(u'Used')
+                normalize(u'X%d' % i)
+            memo = dict(cssutils.helper._normalizedOld,
+                        **cssutils.helper._normalized)
+            self.assertTrue(maxsize // 2 <= len(memo) <= maxsize)
+            self.assertTrue(u'Used' in memo)
+            self.assertTrue(u'NotInterned' not in memo)
+        finally:
+            cssutils.helper.countStats = False
+            cssutils.helper._internValues = True
+
+    def test_intern(self):
+        "helper._intern()"
+        a = u''.join([u'inter', u'ned'])
+        b = u''.join([u'inter', u'ned'])
+        self.assertTrue(a is not b)
+        self.assertTrue(_intern(a) is _intern(b))
+        self.assertTrue(normalize(u'INTERNED') is _intern(a))
+        # long strings are not interned
+        a = u'x' * 33
+        self.assertTrue(_intern(a) is a)
+        self.assertTrue(_intern(a * 1) is not _intern(u'x' * 33))
+        # only unicode
+        self.assertTrue(type(_intern('interned')) is str)
+
 #    def test_normalnumber(self):
 #        "helper.normalnumber()"
 #        tests = {
@@ -68,7 +68,137 @@ class CSSParserTestCase(basetest.BaseTestCase):
         p = cssutils.CSSParser(parseComments=True)
         self.assertEqual(p.parseString(css).cssText,
                          u'/*1*/\na {\n    color: /*2*/ red\n    }')
-        
+
+    def test_lazyLineCol(self):
+        "cssutils.CSSParser(lazyLineCol=True)"
+        css = u'/*1*/\na,\n  b#x { color: red }\n\n  c { x: 1 }'
+        eager = cssutils.CSSParser().parseString(css)
+        lazy = cssutils.CSSParser(lazyLineCol=True).parseString(css)
+        self.assertEqual(eager.cssText, lazy.cssText)
+        for e, l in ((eager.cssRules[1].selectorList[1],
+                      lazy.cssRules[1].selectorList[1]),
+                     (eager.cssRules[2].style.getProperty('x').propertyValue,
+                      lazy.cssRules[2].style.getProperty('x').propertyValue)):
+            self.assertEqual([(i.line, i.col) for i in e.seq],
+                             [(i.line, i.col) for i in l.seq])
+        self.assertEqual((3, 3), (lazy.cssRules[1].selectorList[1].seq[0].line,
+                                  lazy.cssRules[1].selectorList[1].seq[0].col))
+
+        # error messages
+        css = u'a {\n color: red }\n\n  $ {}'
+        for p in (cssutils.CSSParser(raiseExceptions=True),
+                  cssutils.CSSParser(raiseExceptions=True, lazyLineCol=True)):
+            try:
+                p.parseString(css)
+            except xml.dom.SyntaxErr, e:
+                self.assertTrue(u'[4:3: $]' in unicode(e), unicode(e))
+            else:
+                self.fail('SyntaxErr expected')
+
+        # all logged messages
+        import logging
+        import StringIO
+        css = u'a {\n  color: red &; top: rgb(1,2,3 }\n b { \\\n }'
+        oldlog = cssutils.log._log
+        oldlevel = cssutils.log.getEffectiveLevel()
+        stream = StringIO.StringIO()
+        log = logging.getLogger('TEST-LAZYLINECOL')
+        log.addHandler(logging.StreamHandler(stream))
+        cssutils.log.setLog(log)
+        cssutils.log.setLevel(logging.DEBUG)
+        try:
+            cssutils.CSSParser().parseString(css)
+            eagermessages = stream.getvalue().splitlines()
+            stream.truncate(0)
+            cssutils.CSSParser(lazyLineCol=True).parseString(css)
+            lazymessages = stream.getvalue().splitlines()
+        finally:
+            cssutils.log.setLog(oldlog)
+            cssutils.log.setLevel(oldlevel)
+        self.assertTrue(u"PropertyValue: No match: ('CHAR', u'&', 2, 14)"
+                        in eagermessages, eagermessages)
+        self.assertEqual(eagermessages, lazymessages)
+
+    def test_lazyValidation(self):
+        "cssutils.CSSParser(lazyValidation=True)"
+        import logging
+        import StringIO
+        css = u'''a { color: red; color: 1px; x: 1; opacity: 1 }
+            @media print { b { left: 0; left: x } }
+            @font-face { font-family: x; src: y }
+            @page { margin: 0 }'''
+        oldlog = cssutils.log._log
+        oldlevel = cssutils.log.getEffectiveLevel()
+        stream = StringIO.StringIO()
+        log = logging.getLogger('TEST-LAZYVALIDATION')
+        log.addHandler(logging.StreamHandler(stream))
+        cssutils.log.setLog(log)
+        cssutils.log.setLevel(logging.DEBUG)
+        try:
+            cssutils.profile.defaultProfiles = cssutils.profile.CSS_LEVEL_2
+            eager = cssutils.CSSParser().parseString(css)
+            eagermessages = stream.getvalue().splitlines()
+            stream.truncate(0)
+
+            lazy = cssutils.CSSParser(lazyValidation=True).parseString(css)
+            self.assertEqual(eager.cssText, lazy.cssText)
+            parsemessages = stream.getvalue().splitlines()
+            self.assertEqual([u'Property: Unknown Property name. [1:29: x]'],
+                             parsemessages)
+            self.assertEqual(True, lazy.cssRules[0].style.getProperty(
+                                                   'opacity').validationPending)
+
+            # first access of valid
+            self.assertEqual(False, lazy.cssRules[1].cssRules[0].style\
+                                        .getProperties(all=True)[1].valid)
+            self.assertEqual(False, lazy.validate())
+            self.assertEqual(True, lazy.validate())
+            self.assertEqual(sorted(eagermessages),
+                             sorted(stream.getvalue().splitlines()))
+            self.assertEqual(False, lazy.cssRules[0].style.getProperty(
+                                                   'opacity').validationPending)
+
+            # not lazy after parsing
+            p = cssutils.css.Property('color', 'red')
+            self.assertEqual(False, p.validationPending)
+            self.assertEqual(False, cssutils.css.Property._lazyValidation)
+
+            # also not if parsing raised an error
+            p = cssutils.CSSParser(raiseExceptions=True, lazyValidation=True)
+            self.assertRaises(xml.dom.SyntaxErr, p.parseString, u'b { x: }')
+            self.assertEqual(False, cssutils.css.Property._lazyValidation)
+            r = cssutils.css.CSSStyleRule(selectorText=u'a',
+                                          style=u'color: bogus')
+            self.assertEqual(False, r.style.getProperty('color')\
+                                           .validationPending)
+        finally:
+            cssutils.profile.defaultProfiles = None
+            cssutils.log.setLog(oldlog)
+            cssutils.log.setLevel(oldlevel)
+
+    def test_internValues(self):
+        "cssutils.CSSParser(internValues=False)"
+        css = u'a { color: red } b { color: red; left: 1px } #x { left: 1px }'
+        for internValues in (True, False):
+            sheet = cssutils.CSSParser(internValues=internValues)\
+                        .parseString(css)
+            a, b = [r.style for r in sheet.cssRules[:2]]
+            self.assertEqual(internValues,
+                             a.color is b.color and
+                             a.getProperty('color').name is
+                             b.getProperty('color').name)
+            self.assertEqual(u'a {\n    color: red\n    }\nb {\n    '
+                             u'color: red;\n    left: 1px\n    }\n#x {\n'
+                             u'    left: 1px\n    }', sheet.cssText)
+        # interning after parsing
+        self.assertEqual(True, cssutils.helper._internValues)
+        # also if parsing raised an error
+        p = cssutils.CSSParser(internValues=False, raiseExceptions=True)
+        self.assertRaises(xml.dom.SyntaxErr, p.parseString, u'b { x: }')
+        self.assertEqual(True, cssutils.helper._internValues)
+        x = cssutils.helper.normalize(u'ABC-x')
+        self.assertTrue(x is cssutils.helper.normalize(u'ABC-x'))
+
 #    def test_parseFile(self):
 #        "CSSParser.parseFile()"
 #        # see test_cssutils
@@ -188,6 +318,42 @@ class CSSParserTestCase(basetest.BaseTestCase):
             #self.assertEqual(None, cssutils.parseString(css, encoding=encoding))
             self.assertRaises(UnicodeDecodeError, cssutils.parseString, test[0], test[1])
 
+    def test_parseMany(self):
+        "CSSParser.parseMany()"
+        import logging
+        import StringIO
+        sources = [u'a { color: red }', u'b { x: 1 }', '/*\xe4*/']
+        parser = cssutils.CSSParser()
+        oldlog = cssutils.log._log
+        stream = StringIO.StringIO()
+        log = logging.getLogger('TEST-PARSEMANY')
+        log.addHandler(logging.StreamHandler(stream))
+        cssutils.log.setLog(log)
+        try:
+            for processes in (0, 2):
+                results = list(parser.parseMany(sources, processes=processes))
+                self.assertEqual(sources, [r[0] for r in results])
+                self.assertEqual(u'a {\n    color: red\n    }',
+                                 results[0][1].cssText)
+                self.assertEqual([], results[0][2])
+                self.assertEqual(u'b {\n    x: 1\n    }',
+                                 results[1][1].cssText)
+                self.assertEqual([u'WARNING\tProperty: Unknown Property name. '
+                                  u'[1:5: x]'], results[1][2])
+                self.assertEqual(None, results[2][1])
+                self.assertTrue(results[2][2][0].startswith(
+                                u'ERROR\tUnicodeDecodeError: '))
+
+                results = parser.parseMany(sources[:2], processes=processes,
+                                           serialize=True)
+                self.assertEqual([u'a {\n    color: red\n    }',
+                                  u'b {\n    x: 1\n    }'],
+                                 [r[1] for r in results])
+            # nothing logged to cssutils.log
+            self.assertEqual('', stream.getvalue())
+        finally:
+            cssutils.log.setLog(oldlog)
+
     def test_fetcher(self):
         """CSSParser.fetcher
         
@@ -389,7 +389,30 @@ class ProdParserTestCase(basetest.BaseTestCase):
             else:
                 self.assertRaisesMsg(xml.dom.SyntaxErr, u'T: %s' % exp,
                                      ProdParser().parse, text, 'T', prods)
-                
+
+    def test_table(self):
+        "ProdParser.parse() with productions compiled once"
+        results = []
+        def nested(t, tokens):
+            # parse with the same productions while these are in use
+            results.append(ProdParser().parse(u'1 2 2', 'N', prods)[0])
+            return t[0], t[1]
+        p1 = Prod('p1', lambda t, v: v == '1')
+        p2 = Prod('p2', lambda t, v: v == '2')
+        px = Prod('px', lambda t, v: v == 'x', toSeq=nested)
+        prods = Sequence(p1, Choice(px, p2), p2)
+
+        wellformed, seq, store, unused = ProdParser().parse(u'1 x 2', 'T',
+                                                            prods)
+        self.assertEqual(True, wellformed)
+        self.assertEqual([True], results)
+        self.assertEqual([u'1', u'x', u'2'], [item.value for item in seq])
+        table = prods._table
+        self.assertRaisesMsg(xml.dom.SyntaxErr,
+                             u"T: No match: ('NUMBER', u'2', 1, 7)",
+                             ProdParser().parse, u'1 x 2 2', 'T', prods)
+        self.assertEqual(True, ProdParser().parse(u'1 2 2', 'T', prods)[0])
+        self.assertEqual(table, prods._table)
 
 
 if __name__ == '__main__':
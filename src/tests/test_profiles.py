@@ -129,7 +129,154 @@ class ProfilesTestCase(basetest.BaseTestCase):
         for test, r in tests.items():
             self.assertEqual(p.validate(test[0], test[1]), r[0])
             self.assertEqual(p.validateWithProfile(*test), r)
-            
+
+    def test_cache(self):
+        "Profiles memoized validation"
+        p = cssutils.profiles.Profiles(log=cssutils.log, cacheSize=4)
+        self.assertEqual((0, 0), (p.hits, p.misses))
+        self.assertEqual(True, p.validate('color', 'red'))
+        self.assertEqual(True, p.validate('color', 'red'))
+        self.assertEqual((1, 1), (p.hits, p.misses))
+        r = p.validateWithProfile('color', 'red')
+        r[2].append('changed')
+        self.assertEqual((True, True, [p.CSS_LEVEL_2]),
+                         p.validateWithProfile('color', 'red'))
+        self.assertEqual((2, 2), (p.hits, p.misses))
+        # profiles are part of the key
+        self.assertEqual((True, True, [p.CSS3_COLOR]),
+                         p.validateWithProfile('color', 'red', p.CSS3_COLOR))
+        self.assertEqual((2, 3), (p.hits, p.misses))
+
+        # changes invalidate results
+        p.defaultProfiles = p.CSS3_COLOR
+        self.assertEqual((True, True, [p.CSS3_COLOR]),
+                         p.validateWithProfile('color', 'red'))
+        self.assertEqual((True, False, [p.CSS3_COLOR]),
+                         p.validateWithProfile('color', 'rgba(0,0,0,0)',
+                                               p.CSS_LEVEL_2))
+        p.removeProfile(p.CSS3_COLOR)
+        self.assertEqual((False, False, [p.CSS_LEVEL_2]),
+                         p.validateWithProfile('color', 'rgba(0,0,0,0)',
+                                               p.CSS_LEVEL_2))
+        p.addProfile('test', {'color': 'rgba.*'})
+        self.assertEqual((True, False, ['test']),
+                         p.validateWithProfile('color', 'rgba(0,0,0,0)',
+                                               p.CSS_LEVEL_2))
+        self.assertEqual((2, 7), (p.hits, p.misses))
+
+        # least recently used are removed
+        p.removeProfile(all=True)
+        p.addProfile('test', {'x': '[0-9]+'})
+        for i in range(6):
+            self.assertEqual(True, p.validate('x', str(i)))
+        self.assertEqual(True, 2 < len(p._cache) <= 4)
+        self.assertEqual(True, p.validate('x', '5'))
+        self.assertEqual((3, 13), (p.hits, p.misses))
+
+        # errors of custom validation are not memoized
+        p.addProfile('func', {'y': lambda v: int(v) > 0})
+        cssutils.log.raiseExceptions = False
+        self.assertEqual((False, False, ['func']),
+                         p.validateWithProfile('y', 'a', 'func'))
+        self.assertEqual(0, len(p._cache))
+
+        p.cacheSize = 0
+        p.validate('x', '1')
+        p.validate('x', '1')
+        self.assertEqual((3, 16), (p.hits, p.misses))
+
+        # a single hit or miss for each PropertyValue, matched or not
+        p = cssutils.profiles.Profiles(log=cssutils.log)
+        p.addProfile('test', {'z': 'a+'})
+        for name, text, profiles in (('z', u'aa', 'test'),
+                                     ('color', u'red', None)):
+            v = cssutils.css.PropertyValue(text)
+            misses = p.misses
+            p.validateWithProfile(name, v, profiles)
+            self.assertEqual(misses + 1, p.misses)
+            hits = p.hits
+            p.validateWithProfile(name, v, profiles)
+            self.assertEqual((hits + 1, misses + 1), (p.hits, p.misses))
+
+    def test_match(self):
+        "Profiles matching PropertyValue objects"
+        p = cssutils.profiles.Profiles(log=cssutils.log, cacheSize=0)
+        values = (u'0', u'1px', u'-1.5em', u'+1px', u'1e3px', u'0deg', u'10%',
+                  u'red', u'#fff', u'#abcdef', u'rgb(1,2,3)', u'rgba(1,2,3,0.5)',
+                  u'url(x)', u'"a" "b"', u'a, b', u'a b, c', u'inherit', u'auto',
+                  u'none', u'x-small', u'700', u'750', u'lower-alpha',
+                  u'1px solid red', u'solid 1pxred', u'1pxsolid',
+                  u'italic bold 12px/1.5 Arial, sans-serif', u'12px/1.5',
+                  u'left top', u'bottom repeat-x', u'1px 2px 3px 4px 5px',
+                  u'url(a) 1 2, pointer', u'1px 1px 2px red, 0 0 blue',
+                  u'1px 2px / 3px', u'counter(a, disc)', u'attr(x)',
+                  u'rect(1px, auto, 2px, 3px)', u'a 1 b 2', u'/**/ a /**/',
+                  u'expression(a)')
+        values = [cssutils.css.PropertyValue(v) for v in values]
+        values = [(v, v.value) for v in values]
+        for name in sorted(p.knownNames):
+            for v, text in values:
+                for profiles in (None, FM3FF):
+                    self.assertEqual(p.validateWithProfile(name, text,
+                                                           profiles),
+                                     p.validateWithProfile(name, v, profiles))
+                self.assertEqual(p.validate(name, text), p.validate(name, v))
+
+        units = cssutils.profiles._units(cssutils.css.PropertyValue(
+                                    u'bold 12px/1.5 /**/ a b, "c"'))
+        self.assertEqual((u'bold', u' ', u'12px', u'/', u'1.5', u' ', u'a',
+                          u' ', u'b', u',', u'"c"'), units)
+        self.assertEqual((True, True, [p.CSS_LEVEL_2]),
+                         p._match('font', units, p.defaultProfiles))
+        # may be valid anyway
+        units = (u'1pxsolid',)
+        self.assertEqual(None, p._match('border', units, p.defaultProfiles))
+        self.assertEqual(True, p.validate('border', u'1pxsolid'))
+        # a custom validator is never matched
+        p.addProfile('func', {'x': lambda v: True})
+        self.assertEqual(None, p._match('x', (u'a',), ['func']))
+        self.assertEqual(True, p.validate('x', cssutils.css.PropertyValue(u'a')))
+
+    def test_validators(self):
+        "Profiles validator index and prefilters"
+        p = cssutils.profiles.Profiles(log=cssutils.log, cacheSize=0)
+        self.assertEqual([p.CSS_LEVEL_2, p.CSS3_COLOR],
+                         [profile for profile, v in p._index['color']])
+        validator = p._index['width'][0][1]
+        self.assertEqual(frozenset(['auto', 'inherit']), validator.keywords)
+        for c in u'+#"rx':
+            self.assertTrue(c in validator.rejected)
+        for c in u'-.0aAiI\xe4':
+            self.assertFalse(c in validator.rejected)
+        # may match an empty value
+        self.assertEqual(frozenset(), p._index['border'][0][1].rejected)
+
+        # same results as regex only
+        values = (u'', u'0', u'+1px', u'1PX', u'.5em', u'-x', u'auto', u'AUTO',
+                  u'inherit', u'red', u'Red', u'#fff', u'rgb(1,2,3)', u'"a"',
+                  u'\\61', u'\xe4', u'table-header-group', u'a b, serif',
+                  u'bold 12px/1.5 a', u'1px solid red')
+        for name, validators in p._index.items():
+            for profile, validator in validators:
+                for value in values:
+                    self.assertEqual(bool(validator.match(value)),
+                                     bool(validator(value)))
+
+        # index is updated
+        p.addProfile('test', {'color': r'x|inherit', 'x': lambda v: v == 'x'})
+        self.assertEqual([p.CSS_LEVEL_2, p.CSS3_COLOR, 'test'],
+                         [profile for profile, v in p._index['color']])
+        self.assertEqual(True, p.validate('color', u'x'))
+        self.assertEqual((True, True, ['test']),
+                         p.validateWithProfile('x', u'x'))
+        p.removeProfile(p.CSS3_COLOR)
+        self.assertEqual([p.CSS_LEVEL_2, 'test'],
+                         [profile for profile, v in p._index['color']])
+        p.removeProfile(all=True)
+        self.assertEqual({}, p._index)
+        self.assertEqual((False, False, []),
+                         p.validateWithProfile('color', u'red'))
+
     def test_propertiesByProfile(self):
         "Profiles.propertiesByProfile"
         self.assertEqual(['color', 'opacity'], 
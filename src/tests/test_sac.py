@@ -0,0 +1,71 @@
+"""Testcases for cssutils.sac."""
+__version__ = '$Id$'
+
+import os
+import StringIO
+import tempfile
+import basetest
+from cssutils import sac
+
+class RecordingHandler(sac.DocumentHandler):
+    "Records all calls."
+    def __init__(self):
+        self.calls = []
+
+    def _log(self, msg):
+        self.calls.append(msg)
+
+    def property(self, name, value='TODO', important=False, line=None,
+                 col=None):
+        self.calls.append((name, value, important))
+
+
+class ParserTestCase(basetest.BaseTestCase):
+
+    css = u'''@charset "iso-8859-1";
+        @import "x.css";
+        @namespace p "uri";
+        a, b { color: red; background: url(a;b) }
+        /* \xe4 */ c { x: 1 !important }
+        @media print { d { y: "}" } }'''
+
+    def _parsed(self, parse):
+        handler = RecordingHandler()
+        parse(sac.Parser(handler))
+        return handler.calls
+
+    def test_parseStream(self):
+        "sac.Parser.parseStream()"
+        text = self.css.encode('iso-8859-1')
+        expected = self._parsed(lambda p: p.parseString(text))
+        self.assertTrue(('background', u'url(a;b)', False) in expected)
+        self.assertTrue(("comment u' \\xe4 ' at [5, 9]") in expected)
+        for size in (1, 3, 1000):
+            self.assertEqual(expected, self._parsed(
+                lambda p: p.parseStream(StringIO.StringIO(text),
+                                        chunkSize=size)))
+        # unicode
+        self.assertEqual(expected, self._parsed(
+            lambda p: p.parseStream(StringIO.StringIO(self.css), chunkSize=5)))
+        # encoding
+        encoding = 'iso-8859-15'
+        self.assertEqual(self._parsed(lambda p: p.parseString(text, encoding)),
+                         self._parsed(lambda p: p.parseStream(
+                                      StringIO.StringIO(text), encoding, 5)))
+
+    def test_parseFile(self):
+        "sac.Parser.parseFile()"
+        text = self.css.encode('iso-8859-1')
+        fd, name = tempfile.mkstemp(suffix='.css')
+        try:
+            os.write(fd, text)
+            os.close(fd)
+            self.assertEqual(self._parsed(lambda p: p.parseString(text)),
+                             self._parsed(lambda p: p.parseFile(name)))
+        finally:
+            os.remove(name)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -68,6 +68,12 @@ class CSSCombine(basetest.BaseTestCase):
                          'a {\n    color: var(c)\n    }')
         self.assertEqual(csscombine(cssText=cssText, minify=False),
                          'a {\n    color: #0f0\n    }')
+
+    def test_combine_minify(self):
+        "scripts.csscombine(minify=True) keeps valid calc()"
+        self.assertEqual(csscombine(cssText='a { top: calc(0px + 1em); '
+                                            'left: calc(100% - 2px) 0px }'),
+                         'a{top:calc(0px + 1em);left:calc(100% - 2px) 0}')
         
 
 if __name__ == '__main__':
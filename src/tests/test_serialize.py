@@ -4,6 +4,8 @@ __version__ = '$Id$'
 
 import basetest
 import cssutils
+import glob
+import os
 import sys
 
 
@@ -633,7 +635,83 @@ class CSSSerializerTestCase(basetest.BaseTestCase):
         sheet.cssRules[0].encoding = 'ascii'
         self.assertEqual('@charset "ascii";\n/* \\3BA \\3BF \\3C5 \\3C1 \\3BF \\3C2  */', 
                          sheet.cssText)
-        
+
+    def test_write(self):
+        "CSSSerializer.write, CSSStyleSheet.writeTo"
+        import StringIO
+        css = u'''@charset "ascii";
+@namespace x "unused";
+a { content: "κουρος" }
+@media print {
+    /* κουρος */
+    b { color: red }
+    }'''
+        sheet = cssutils.parseString(css)
+        for lineNumbers in (False, True):
+            cssutils.ser.prefs.lineNumbers = lineNumbers
+            for keep in (False, True):
+                cssutils.ser.prefs.keepUsedNamespaceRulesOnly = keep
+                stream = StringIO.StringIO()
+                sheet.writeTo(stream)
+                self.assertEqual(sheet.cssText, stream.getvalue())
+
+        cssutils.ser.prefs.useDefaults()
+        stream = StringIO.StringIO()
+        cssutils.ser.write(sheet, stream, 'utf-16')
+        sheet.encoding = 'utf-16'
+        self.assertEqual(sheet.cssText, stream.getvalue())
+
+        stream = StringIO.StringIO()
+        cssutils.css.CSSStyleSheet().writeTo(stream)
+        self.assertEqual('', stream.getvalue())
+
+        # texts of rules are not kept after writing
+        sheet = cssutils.parseString(css)
+        for ser in (cssutils.ser, cssutils.serialize.MinifyingSerializer()):
+            ser.write(sheet, StringIO.StringIO())
+            media = sheet.cssRules[3]
+            for obj in (sheet.cssRules[2], sheet.cssRules[2].style, media,
+                        media.cssRules[1], media.cssRules[1].style):
+                self.assertEqual(None, obj._cache)
+            self.assertEqual(True, cssutils.util._TextCache.store)
+
+    def test_cachedText(self):
+        "cached cssText of rules and sheets"
+        sheet = cssutils.parseString(u'''@namespace x "http://x";
+x|a { color: red }
+@media print {
+    b { color: red }
+    }''')
+        a, media = sheet.cssRules[1], sheet.cssRules[2]
+        b = media.cssRules[0]
+        text = sheet.cssText
+        self.assertTrue(text is sheet.cssText)
+        self.assertTrue(a.cssText is a.cssText)
+
+        b.style.getProperty('color').priority = '!important'
+        self.assertEqual(u'b {\n    color: red !important\n    }', b.cssText)
+        self.assertEqual(u'''@media print {
+    b {
+        color: red !important
+        }
+    }''', media.cssText)
+        self.assertNotEqual(text, sheet.cssText)
+
+        media.media.appendMedium('tv')
+        self.assertEqual(u'@media print, tv {', media.cssText[:18])
+        b.selectorList.appendSelector('c')
+        self.assertEqual(u'b, c {', b.cssText[:6])
+
+        # text of selectors depends on namespaces
+        sheet.cssRules[0].prefix = 'y'
+        self.assertEqual(u'y|a {\n    color: red\n    }', a.cssText)
+
+        # and on preferences
+        cssutils.ser.prefs.useMinified()
+        self.assertEqual(u'y|a{color:red}', a.cssText)
+        cssutils.ser.prefs.useDefaults()
+        self.assertEqual(u'y|a {\n    color: red\n    }', a.cssText)
+
     def test_Property(self):
         "CSSSerializer.do_Property"
 
@@ -651,6 +729,16 @@ class CSSSerializerTestCase(basetest.BaseTestCase):
         self.assertEqual(u'color: red',
                     cssutils.ser.do_Property(s))
 
+    def test_emptyValue(self):
+        "CSSSerializer spacing around a value without text"
+        # "-" before "-2px" is parsed as a DimensionValue with cssText u''
+        sheet = cssutils.parseString(u'a { top: calc(1px - -2px) }')
+        cssutils.ser.prefs.useMinified()
+        self.assertEqual('a{top:calc(1px 2px)}', sheet.cssText)
+        cssutils.ser.prefs.useDefaults()
+        self.assertEqual('a {\n    top: calc(1px   2px)\n    }',
+                         sheet.cssText)
+
     def test_escapestring(self):
         "CSSSerializer._escapestring"
         #'"\a\22\27"'  
@@ -682,8 +770,157 @@ a[href="\"\a\22\27\""] {
     }'''
         sheet = cssutils.parseString(css)
         self.assertEqual(sheet.cssText, exp)
-    
-    
+
+
+class MinifyingSerializerTestCase(basetest.BaseTestCase):
+    """
+    testcases for cssutils.serialize.MinifyingSerializer
+    """
+    def setUp(self):
+        super(MinifyingSerializerTestCase, self).setUp()
+        self._ser = cssutils.ser
+        cssutils.setSerializer(cssutils.serialize.MinifyingSerializer())
+
+    def test_values(self):
+        "MinifyingSerializer values"
+        tests = {
+            u'0px 0.0em -0 +0': u'0 0 0 0',
+            u'0% 0s 0deg': u'0% 0s 0deg',
+            u'0.5em -0.50px +0.25 +1px 1.0': u'.5em -.5px .25 1px 1',
+            u'10.5%': u'10.5%',
+            u'#112233 #123456 #ABC #FF0000 #000080': u'#123 #123456 #abc red navy',
+            u'rgb(255, 255, 255) rgb(0,0,128)': u'#fff navy',
+            u'rgb(100%, 0%, 0%) rgba(0, 0, 0, 0.5)':
+                u'rgb(100%,0%,0%) rgba(0,0,0,.5)',
+            u'white Black': u'white Black',
+            u'12px/1.5 "a b", serif': u'12px/1.5 "a b",serif',
+            u'url(x.png) no-repeat /**/ 0 0': u'url(x.png) no-repeat 0 0',
+            # "+" kept in functions and after operators
+            u'a +1px, +2px': u'a 1px,+2px',
+            u'1px/+2px': u'1px/+2px',
+            u'calc(100% + 2px)': u'calc(100% + 2px)',
+            u'-moz-calc(1px + 2px)': u'-moz-calc(1px + 2px)',
+            u'calc(1px /**/ - 2.50em)': u'calc(1px - 2.5em)',
+            # zero lengths keep their unit in functions
+            u'calc(0px + 1em)': u'calc(0px + 1em)',
+            u'calc(1px - 0px)': u'calc(1px - 0px)',
+            u'f(0px) 0px': u'f(0px) 0',
+            u'f(1, +2)': u'f(1,+2)',
+            u'expression(1 + 2)': u'expression(1+2)',
+            }
+        for test, exp in tests.items():
+            v = cssutils.css.PropertyValue(test)
+            self.assertEqual(exp, v.cssText)
+
+    def test_CSSStyleSheet(self):
+        "MinifyingSerializer.do_CSSStyleSheet"
+        css = u'''@charset "ascii";
+@import url(a.css) print;
+/* comment */
+a , b > c { color : #ff0000 ! important ; margin: 0px 0.5em; }
+@media print, tv {
+    x { top: 0.0em } y {}
+    }
+@media all { z {} }
+@page :left { margin: 0.1in }
+@font-face { src: url(f.ttf) }
+e {}'''
+        exp = '@charset "ascii";@import"a.css"print;'\
+              'a,b>c{color:red!important;margin:0 .5em}'\
+              '@media print,tv{x{top:0}}@page :left{margin:.1in}'\
+              '@font-face{src:url(f.ttf)}'
+        sheet = cssutils.parseString(css)
+        self.assertEqual(exp, sheet.cssText)
+
+        cssutils.ser.prefs.keepEmptyRules = True
+        self.assertEqual('@media all{z{}}',
+                         sheet.cssRules[5].cssText)
+        self.assertEqual('e{}', sheet.cssRules[8].cssText)
+
+    def test_roundtrip(self):
+        "MinifyingSerializer output re-parses to an equivalent sheet"
+        def items(seq):
+            # values of a PropertyValue or function as minifying keeps them
+            values = []
+            for item in seq:
+                val = item.value
+                if isinstance(val, cssutils.css.CSSComment):
+                    continue
+                elif isinstance(val, cssutils.css.ColorValue):
+                    values.append((val.red, val.green, val.blue, val.alpha))
+                elif isinstance(val, cssutils.css.DimensionValue):
+                    dim = val.dimension
+                    if val.value == 0 and dim in minifying.LENGTHS:
+                        dim = None
+                    values.append((val.value, dim))
+                elif isinstance(val, cssutils.css.CSSVariable) and \
+                     val.value is not None:
+                    # resolved
+                    values.extend(items(
+                        cssutils.css.PropertyValue(val.value).seq))
+                elif isinstance(val, cssutils.css.CSSFunction):
+                    # general serialization keeps any sign
+                    values.append(val.cssText)
+                elif isinstance(val, cssutils.css.Value):
+                    values.append((val.type, val.value))
+                else:
+                    values.append(val)
+            return values
+
+        def texts(sheet):
+            # minified text and the general minified serialization of all
+            # selectors and property names which are not changed by minifying
+            # and the values of all properties
+            cssutils.setSerializer(minified)
+            try:
+                names = []
+                for rule in sheet.cssRules:
+                    if not rule.cssText:
+                        # e.g. empty rules
+                        continue
+                    if hasattr(rule, 'selectorText'):
+                        names.append(rule.selectorText)
+                    if hasattr(rule, 'style'):
+                        names.extend((p.name, items(p.propertyValue.seq))
+                                     for p in
+                                     rule.style.getProperties(all=True))
+            finally:
+                cssutils.setSerializer(minifying)
+            return sheet.cssText, names
+
+        minifying = cssutils.ser
+        default = cssutils.serialize.CSSSerializer()
+        minified = cssutils.serialize.CSSSerializer()
+        minified.prefs.useMinified()
+        cssutils.log.raiseExceptions = False
+        sheets = os.path.join(os.path.dirname(__file__), '..', '..',
+                              'sheets', '*.css')
+        for fn in sorted(glob.glob(sheets)):
+            try:
+                sheet = cssutils.parseFile(fn)
+            except UnicodeDecodeError:
+                continue
+
+            # skip sheets which do not survive serializing in general
+            cssutils.setSerializer(default)
+            cssText = sheet.cssText
+            general = cssutils.parseString(cssText).cssText == cssText
+            cssutils.setSerializer(minifying)
+            if not general:
+                continue
+
+            text, names = texts(sheet)
+            self.assertEqual((text, names),
+                             texts(cssutils.parseString(text)), fn)
+
+        # values are kept
+        sheet = cssutils.parseString(u'a { margin: +1px; top: 0.5em; '
+                                     u'width: calc(100% + 2px); '
+                                     u'height: expression(1 + 2) }')
+        text, names = texts(sheet)
+        self.assertEqual(names, texts(cssutils.parseString(text))[1])
+
+
 if __name__ == '__main__':
     import unittest
     unittest.main()
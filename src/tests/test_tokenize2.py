@@ -8,6 +8,7 @@ __version__ = '$Id$'
 import xml.dom
 import basetest
 from cssutils.tokenize2 import *
+from cssutils.tokenize2 import linecol
 
 class TokenizerTestCase(basetest.BaseTestCase):
 
@@ -635,6 +636,69 @@ class TokenizerTestCase(basetest.BaseTestCase):
             # EOF is added so -1
             self.assertEqual(len(tokens) - 1, len(tests[css]))
 
+    def test_tokenizeoffsets(self):
+        "cssutils Tokenizer().tokenize() of long text"
+        css = u'a {\n  color: red;\n  x: url(a) "b" 1px 2% #c }\n/*x*/'
+        tokens = list(self.tokenizer.tokenize(css))
+        n = 50
+        alltokens = list(self.tokenizer.tokenize(u'\n'.join([css] * n)))
+        # each repeated part adds 1 S token for \n
+        self.assertEqual(n * len(tokens) + n - 1, len(alltokens))
+        self.assertEqual(('COMMENT', u'/*x*/', 4 * n, 1), alltokens[-1])
+        self.assertEqual([t[1] for t in tokens],
+                         [t[1] for t in alltokens[-len(tokens):]])
+
+    def test_unicodesub(self):
+        "cssutils Tokenizer().tokenize() unicode escapes"
+        from cssutils import helper
+        helper.resetStats()
+        helper.countStats = True
+        try:
+            tokens = list(self.tokenizer.tokenize(
+                u'\\61 b a\\62 \\@ \\61 bc( @\\61 x "\\61" ab'))
+        finally:
+            helper.countStats = False
+        self.assertEqual([u'ab', u' ', u'ab\\@', u' ', u'abc(', u' ',
+                          u'@\\61 x', u' ', u'"\\61"', u' ', u'ab'],
+                         [t[1] for t in tokens])
+        # IDENT, FUNCTION and normalized ATKEYWORD
+        self.assertEqual(4, helper.stats['unicodesub.escaped'])
+        self.assertEqual(1, helper.stats['unicodesub.plain'])
+
+    def test_dispatch(self):
+        "cssutils Tokenizer() master expression and dispatch table"
+        productions = self.tokenizer.tokenmatches[1:]
+        tails = (u'', u'a', u'1', u'-a(', u'+1', u'=', u'*x*/', u'"', u'!--')
+        for code in range(128):
+            for tail in tails:
+                text = unichr(code) + tail
+                for name, matcher in productions:
+                    # first matching production wins
+                    if matcher(text):
+                        break
+                for match, names in (self.tokenizer._mastermatch,
+                                     self.tokenizer._dispatch[unichr(code)]):
+                    self.assertEqual(name, names[match(text).lastgroup])
+
+    def test_tokenizeChunks(self):
+        "cssutils Tokenizer().tokenizeChunks()"
+        css = u'''@charset "x"; a { b: url(a;b}c) } /* x ; } */ "s;}"
+            "unterminated ; \n  c{d:e}\r\n@media all { a { b\\;c: d\\}} }
+            x { y: url( a; }} \n b{ }\ufeff;/* incomplete ;'''
+        for doComments in (True, False):
+            for lazyLineCol in (False, True):
+                tokenizer = Tokenizer(doComments=doComments,
+                                      lazyLineCol=lazyLineCol)
+                for fullsheet in (False, True):
+                    expected = [t[:2] + linecol(*t[2:])
+                                for t in tokenizer.tokenize(css, fullsheet)]
+                    for size in (1, 2, 5, 17, 1000):
+                        chunks = [css[i:i + size]
+                                  for i in range(0, len(css), size)]
+                        self.assertEqual(expected,
+                                         list(tokenizer.tokenizeChunks(chunks,
+                                                                fullsheet)))
+
 
     # --------------
 
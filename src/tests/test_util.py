@@ -16,9 +16,35 @@ except ImportError:
     print "install minimock with ``easy_install minimock`` to run all tests"
 
 import basetest
+import cssutils
 import encutils
+import pickle
+
+from cssutils.util import Base, ListSeq, Seq, Item, _readUrl, _defaultFetcher
+
+class SeqTestCase(basetest.BaseTestCase):
+
+    def test_slots(self):
+        "util.Seq and objects created per token have no __dict__"
+        seq = Seq(readonly=False)
+        seq.append(u'a', 'IDENT', 1, 2)
+        p = cssutils.css.Property(u'background', u'url(x) #fff 1px var(y)')
+        objects = [seq, seq[0], p, p.propertyValue,
+                   cssutils.css.Selector(u'a > b')]
+        objects.extend(p.propertyValue)
+        objects.append(cssutils.css.Value(u'x'))
+        for obj in objects:
+            self.assertFalse(hasattr(obj, '__dict__'), obj)
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            seq2 = pickle.loads(pickle.dumps(seq, protocol))
+            self.assertEqual((u'a', 'IDENT', 1, 2),
+                    (seq2[0].value, seq2[0].type, seq2[0].line, seq2[0].col))
+            p2 = pickle.loads(pickle.dumps(p, protocol))
+            self.assertEqual(p.cssText, p2.cssText)
+            self.assertEqual(p2, p2.propertyValue.parent)
+            self.assertEqual(u'y', p2.propertyValue[3].name)
 
-from cssutils.util import Base, ListSeq, _readUrl, _defaultFetcher
 
 class ListSeqTestCase(basetest.BaseTestCase):
 
@@ -131,6 +157,58 @@ class BaseTestCase(basetest.BaseTestCase):
             res = u''.join([t[1] for t in restokens])
             self.assertEqual(exp, res)
 
+        # a shared tokenizer is consumed upto the end token only
+        tokenizer = iter(maketokens(u'a(;);b;'))
+        for exp in (u'a(;);', u'b;', u''):
+            restokens = b._tokensupto2(tokenizer)
+            self.assertEqual(exp, u''.join([t[1] for t in restokens]))
+
+    def test_tokensview(self):
+        "Base._tokensview()"
+        b = Base()
+
+        def maketokens(values):
+            return [('TYPE', v, 0, 0) for v in values]
+
+        def text(tokens):
+            return u''.join([t[1] for t in tokens])
+
+        # ends like _tokensupto2
+        for values, exp in ((u'a[{1}]({2}) { } NOT', u'a[{1}]({2}) { }'),
+                            (u'a[;](;) ; NOT', u'a[;](;) ;'),
+                            (u'a EOF', u'a E')):
+            tokens = maketokens(values)
+            if u'EOF' in values:
+                tokens[2] = ('EOF', u'E', 0, 0)
+            source = iter(tokens)
+            view = b._tokensview(source)
+            self.assertEqual(exp, text(view))
+            self.assertEqual(exp, text(view.tokens()))
+            self.assertEqual(values[len(exp):], text(source))
+
+        # views nested in a view share its tokens and end with it
+        source = iter(maketokens(u'@m{a{1}b;}NOT'))
+        outer = b._tokensview(source, source.next())
+        self.assertEqual(u'@m{', text([outer.next(), outer.next(),
+                                        outer.next()]))
+        inner = b._tokensview(outer, mediaendonly=True, separateEnd=True)
+        first = b._tokensview(inner, inner.next())
+        self.assertEqual(u'a{1}', text(first))
+        second = b._tokensview(inner, inner.next())
+        self.assertEqual(u'b', second.next()[1])
+        second.drain()
+        self.assertEqual([], list(inner))
+        self.assertEqual(u'}', inner.end[1])
+        self.assertEqual([], list(outer))
+        self.assertEqual(u'N', source.next()[1])
+        self.assertTrue(first._tape is outer._tape)
+        self.assertTrue(second._tape is outer._tape)
+        self.assertEqual(u'@m{a{1}b;}', text(outer.tokens()))
+        self.assertEqual(u'a{1}b;', text(inner.tokens()))
+        self.assertEqual(u'a{1}', text(first.tokens()))
+        self.assertEqual(u'b;', text(second.tokens()))
+        self.assertEqual(u'b;', b._valuestr(second))
+
 
 class _readUrl_TestCase(basetest.BaseTestCase):
     """needs minimock install with easy_install minimock"""
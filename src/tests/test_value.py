@@ -285,6 +285,30 @@ class PropertyValueTestCase(basetest.BaseTestCase):
             v = s.cssRules[0].style.background
             self.assertEqual(v, exp)
 
+    def test_productions(self):
+        "PropertyValue productions shared by all values"
+        from cssutils.css import value
+        v1 = cssutils.css.PropertyValue(u'a f(1, g(2, h(3)), #fff) 1px')
+        productions = value._shared[cssutils.css.PropertyValue][0]
+        # an error leaves the shared productions in any state
+        self.assertRaises(xml.dom.SyntaxErr, cssutils.css.PropertyValue,
+                          u'a f(1, ]')
+        v2 = cssutils.css.PropertyValue(u'b rgb(1, 2, 3) f(1, g(2, h(3)))')
+        self.assertEqual(productions,
+                         value._shared[cssutils.css.PropertyValue][0])
+        self.assertEqual(u'a f(1, g(2, h(3)), #fff) 1px', v1.cssText)
+        self.assertEqual(u'b rgb(1, 2, 3) f(1, g(2, h(3)))', v2.cssText)
+        # parents are the values parsed, also for nested functions
+        for v in (v1, v2):
+            self.assertEqual([v] * v.length, [x.parent for x in v])
+        f = v2[2]
+        self.assertEqual(f, f.seq[1].value.parent)
+        g = f.seq[3].value
+        self.assertEqual(g, g.seq[3].value.parent)
+        self.assertEqual(v2[1], v2[1].seq[1].value.parent)
+        for productions, parsed in value._shared.values():
+            self.assertEqual([], parsed)
+
     def test_readonly(self):
         "PropertyValue._readonly"
         v = cssutils.css.PropertyValue(cssText='inherit')